@@ -6,17 +6,16 @@ from flask import Flask, render_template, redirect, url_for, request, jsonify
 from flask_login import login_required
 from flask_migrate import Migrate
 from flask_mail import Mail
-from flask_caching import Cache
 from datetime import datetime
 import os
 
 # Import configuration and logging
 from config import config
 from logging_config import setup_logging
+from database import cache
 
 # Initialize extensions
 mail = Mail()
-cache = Cache()
 migrate = Migrate()
 
 def create_app(config_name=None):
@@ -44,6 +43,38 @@ def create_app(config_name=None):
     with app.app_context():
         db.create_all()
     
+    # Full-text search index (kept current on every commit)
+    from utils.search_index import init_search
+    init_search(app)
+    
+    # Car inventory facet counts (kept current on every commit)
+    from utils.facets import init_facets
+    init_facets(app)
+    
+    # Photo shown per car in the list grid (kept current on every flush)
+    from utils.car_photos import init_car_photos
+    init_car_photos(app)
+    
+    # Sales report fact tables (re-aggregated on every sale change)
+    from utils.sales_facts import init_sales_facts
+    init_sales_facts(app)
+    
+    # Shared HTTP client for listing pages (pooled, rate limited, cached on disk)
+    from utils.http_client import init_http_client
+    init_http_client(app)
+    
+    # Offline town/postal code index for transport distances (memory-mapped)
+    from utils.gazetteer import init_gazetteer
+    init_gazetteer(app)
+    
+    # Advertisement parsing runs as background jobs
+    from utils.parse_jobs import init_parse_jobs
+    init_parse_jobs(app)
+    
+    # Drop tagged cache entries when the rows they depend on are committed
+    from utils.cache_utils import init_cache_tags
+    init_cache_tags(app)
+    
     # Register error handlers
     register_error_handlers(app)
     
@@ -66,32 +97,26 @@ def create_app(config_name=None):
     def index():
         """Dashboard homepage"""
         from models.car import Car
-        from models.customer import Customer
-        from models.sale import Sale
         from models.user import User
+        from utils.dashboard_stats import get_stats
+        from utils.projections import fetch, CarSummary
     
-        # Get statistics
-        total_cars = Car.query.count()
-        available_cars = Car.query.filter_by(status='available').count()
-        total_customers = Customer.query.count()
-        active_sales = Sale.query.filter(Sale.status.in_(['lead', 'offer_sent', 'negotiation', 'contract_signed', 'payment_pending'])).count()
+        # Get statistics (single aggregate query, cached)
+        stats = get_stats()
     
         # Get recent cars for dashboard
-        recent_cars = Car.query.order_by(Car.updated_at.desc()).limit(10).all()
-    
-        # Get recent sales
-        recent_sales = Sale.query.order_by(Sale.created_at.desc()).limit(5).all()
+        recent_cars = fetch(Car.query.order_by(Car.updated_at.desc()).limit(10), CarSummary,
+                            total_cost=Car.total_cost())
         
         # Get users for sidebar
         users = User.query.order_by(User.full_name).limit(5).all()
     
         return render_template('dashboard.html',
-                             total_cars=total_cars,
-                             available_cars=available_cars,
-                             total_customers=total_customers,
-                             active_sales=active_sales,
+                             total_cars=stats['inventory']['total'],
+                             available_cars=stats['inventory']['available'],
+                             total_customers=stats['customers']['total'],
+                             active_sales=stats['sales']['active'],
                              recent=recent_cars,
-                             recent_sales=recent_sales,
                              users=users)
     
     @app.route('/dashboard')
@@ -104,22 +129,45 @@ def create_app(config_name=None):
     @login_required
     def search():
         """Search page"""
+        from flask_login import current_user
+        from utils.search_index import search as search_index
+        
         query = request.args.get('q', '').strip()
         results = {
             'cars': [],
             'customers': [],
+            'invoices': [],
+            'communications': [],
             'docs': []
         }
-        try:
+        if query:
             from models.car import Car
-            if query:
-                results['cars'] = Car.query.filter(
-                    (Car.make.ilike(f"%{query}%")) |
-                    (Car.model.ilike(f"%{query}%")) |
-                    (Car.vin.ilike(f"%{query}%"))
-                ).limit(25).all()
-        except Exception:
-            pass
+            from models.customer import Customer
+            from models.invoice import Invoice
+            from models.document import Document, Communication
+            
+            # Invoices are admin-only elsewhere, so keep them out of search for other roles
+            entity_types = ['car', 'customer', 'communication', 'document']
+            if current_user.is_admin():
+                entity_types.append('invoice')
+            
+            # One index query per type, so a type with many strong hits cannot crowd out the others;
+            # the matched rows are then loaded in one query each, keeping rank order
+            targets = {
+                'car': ('cars', Car),
+                'customer': ('customers', Customer),
+                'invoice': ('invoices', Invoice),
+                'communication': ('communications', Communication),
+                'document': ('docs', Document)
+            }
+            for entity_type, (key, model) in targets.items():
+                if entity_type not in entity_types:
+                    continue
+                type_hits = search_index(query, entity_types=[entity_type], limit=25)
+                if not type_hits:
+                    continue
+                objects = {o.id: o for o in model.query.filter(model.id.in_([h['entity_id'] for h in type_hits])).all()}
+                results[key] = [dict(h, obj=objects[h['entity_id']]) for h in type_hits if h['entity_id'] in objects]
         return render_template('search.html', q=query, results=results)
     
     @app.context_processor
@@ -0,0 +1,301 @@
+"""
+Benchmark: AdParser timings, memory and field accuracy on the versioned corpus
+
+Usage:
+    python benchmarks/ad_parser.py --json results.json
+    python benchmarks/ad_parser.py --kind text --kind html --repeat 20
+    python benchmarks/ad_parser.py --json new.json --compare old.json
+
+Runs fully offline: listing pages are served from benchmarks/corpus/html by
+the stub server on a free local port, and screenshots and PDFs are read
+from disk. Per case it reports the median time of each stage
+
+    text   extraction (_parse_text)
+    html   fetch, structured (embedded JSON), html_to_text, extraction
+    image  load, preprocess, ocr (language probe included), extraction
+    pdf    total only (pages are OCR'd in pool workers)
+
+plus the end-to-end parse (parse_url / parse_image / parse_pdf), the peak of
+Python heap allocations during one end-to-end parse (tracemalloc; memory
+held by Tesseract and poppler is not included) and which expected fields
+were extracted. Image and PDF cases are skipped when no OCR engine or
+pdf2image is installed.
+
+The JSON results carry the corpus version and git commit, so runs of two
+commits can be compared with --compare.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, PROJECT_ROOT)
+
+from stub_server import make_server
+from utils import http_client
+from utils.listing_data import extract_listing
+from utils.ocr_parser import AdParser, _ocr_image, get_ocr_engine
+from utils.ocr_preprocess import preprocess
+
+DEFAULT_CORPUS = os.path.join(BENCHMARKS_DIR, 'corpus')
+KINDS = ('text', 'html', 'image', 'pdf')
+
+
+def _same(actual, expected):
+    if actual is None:
+        return False
+    if isinstance(expected, (int, float)):
+        try:
+            return float(actual) == float(expected)
+        except (TypeError, ValueError):
+            return False
+    return str(actual).strip().lower() == str(expected).strip().lower()
+
+
+def _timed(stages, name, function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    stages.setdefault(name, []).append(time.perf_counter() - start)
+    return result
+
+
+def stages_text(case, content):
+    stages = {}
+    _timed(stages, 'extraction', AdParser._parse_text, content.decode('utf-8'))
+    return stages
+
+
+def stages_html(case, content):
+    stages = {}
+    response = _timed(stages, 'fetch', http_client.get_client().get, case['url'],
+                      headers=AdParser.DEFAULT_HEADERS)
+    _timed(stages, 'structured', extract_listing, response.content, case['url'])
+    text = _timed(stages, 'html_to_text', AdParser._html_to_text, response.content)
+    _timed(stages, 'extraction', AdParser._parse_text, text)
+    return stages
+
+
+def stages_image(case, content):
+    from PIL import Image
+    stages = {}
+    image = _timed(stages, 'load', lambda: Image.open(io.BytesIO(content)).convert('RGB'))
+    prepared = _timed(stages, 'preprocess', preprocess, image, 'screenshot')
+    text, _ = _timed(stages, 'ocr', _ocr_image, get_ocr_engine(), prepared)
+    _timed(stages, 'extraction', AdParser._parse_text, text)
+    return stages
+
+
+PARSERS = {
+    'text': lambda case, content: AdParser._parse_text(content.decode('utf-8')),
+    'html': lambda case, content: AdParser.parse_url(case['url']),
+    'image': lambda case, content: AdParser.parse_image(content),
+    'pdf': lambda case, content: AdParser.parse_pdf(content),
+}
+STAGES = {'text': stages_text, 'html': stages_html, 'image': stages_image, 'pdf': None}
+
+
+def unavailable(kind):
+    """Why a kind of case cannot run here, or None"""
+    if kind in ('image', 'pdf') and get_ocr_engine() is None:
+        return 'no OCR engine (tesserocr or pytesseract)'
+    if kind == 'pdf':
+        try:
+            import pdf2image  # noqa: F401
+        except ImportError:
+            return 'pdf2image not installed'
+    return None
+
+
+def run_case(case, content, repeat):
+    parse = PARSERS[case['kind']]
+    stage_runner = STAGES[case['kind']]
+    # Warm-up: imports, OCR models, connection pool
+    parse(case, content)
+
+    stages, totals = {}, []
+    for _ in range(repeat):
+        if stage_runner:
+            for name, times in stage_runner(case, content).items():
+                stages.setdefault(name, []).extend(times)
+        start = time.perf_counter()
+        result = parse(case, content)
+        totals.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    parse(case, content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    fields = {name: _same(result.get(name), value) for name, value in case['expected'].items()}
+    return {
+        'id': case['id'],
+        'kind': case['kind'],
+        'stages_s': {name: statistics.median(times) for name, times in stages.items()},
+        'total_s': statistics.median(totals),
+        'total_min_s': min(totals),
+        'peak_kib': round(peak / 1024),
+        'matched': sum(fields.values()),
+        'expected': len(fields),
+        'fields': fields,
+        'error': result.get('error'),
+        'mismatches': {name: result.get(name) for name, ok in fields.items() if not ok},
+    }
+
+
+def summarize(rows, skipped):
+    summary = {}
+    for kind in KINDS:
+        kind_rows = [row for row in rows if row['kind'] == kind]
+        if not kind_rows:
+            continue
+        total = sum(row['total_s'] for row in kind_rows)
+        stage_names = sorted({name for row in kind_rows for name in row['stages_s']})
+        summary[kind] = {
+            'cases': len(kind_rows),
+            'total_s': total,
+            'throughput_per_s': len(kind_rows) / total if total else None,
+            'stages_s': {name: sum(row['stages_s'].get(name, 0) for row in kind_rows) for name in stage_names},
+            'peak_kib_max': max(row['peak_kib'] for row in kind_rows),
+            'matched': sum(row['matched'] for row in kind_rows),
+            'expected': sum(row['expected'] for row in kind_rows),
+        }
+    fields = {}
+    for row in rows:
+        for name, ok in row['fields'].items():
+            counts = fields.setdefault(name, [0, 0])
+            counts[0] += ok
+            counts[1] += 1
+    return {'kinds': summary, 'fields': fields, 'skipped': skipped}
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=PROJECT_ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return commit + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old, new):
+    """Print per-kind and per-case changes between two result files"""
+    print(f"\nCompared with {old['meta'].get('commit')} (corpus v{old['meta'].get('corpus_version')})")
+    if old['meta'].get('corpus_version') != new['meta'].get('corpus_version'):
+        print('  corpus versions differ; accuracy is not directly comparable')
+    for kind, data in new['summary']['kinds'].items():
+        before = old['summary']['kinds'].get(kind)
+        if not before:
+            continue
+        change = (data['total_s'] / before['total_s'] - 1) * 100 if before['total_s'] else 0
+        print(f"  {kind:6} time {before['total_s']:.4f}s -> {data['total_s']:.4f}s ({change:+.1f}%), "
+              f"fields {before['matched']}/{before['expected']} -> {data['matched']}/{data['expected']}")
+    old_cases = {row['id']: row for row in old['cases']}
+    for row in new['cases']:
+        before = old_cases.get(row['id'])
+        if not before:
+            continue
+        lost = [name for name, ok in before['fields'].items() if ok and not row['fields'].get(name)]
+        gained = [name for name, ok in row['fields'].items() if ok and not before['fields'].get(name)]
+        if lost or gained:
+            print(f"  {row['id']}: " + ', '.join([f'-{name}' for name in lost] + [f'+{name}' for name in gained]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS)
+    parser.add_argument('--kind', action='append', choices=KINDS, help='case kind to run (repeatable, default: all)')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per case (median is reported)')
+    parser.add_argument('--json', dest='json_path', help='write the results to this file')
+    parser.add_argument('--compare', help='results file of an earlier run to compare with')
+    args = parser.parse_args()
+
+    with open(os.path.join(args.corpus, 'manifest.json'), encoding='utf-8') as f:
+        manifest = json.load(f)
+    kinds = args.kind or KINDS
+
+    server = make_server(os.path.join(args.corpus, 'html'))
+    server.RequestHandlerClass.log_message = lambda *_: None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    # No response cache: every repeat must fetch (and time) the page from the stub
+    http_client.configure({'stub_url': f'http://127.0.0.1:{server.server_port}', 'cache_dir': None,
+                           'min_interval': 0, 'retries': 0, 'max_per_host': 8})
+
+    skipped = {kind: unavailable(kind) for kind in kinds if unavailable(kind)}
+    rows = []
+    print(f"{'case':30} {'total ms':>9} {'peak KiB':>9} {'fields':>7}  stages (ms)")
+    try:
+        for case in manifest['cases']:
+            if case['kind'] not in kinds or case['kind'] in skipped:
+                continue
+            with open(os.path.join(args.corpus, case['file']), 'rb') as f:
+                content = f.read()
+            # The parser reports progress with print; keep the table readable
+            with contextlib.redirect_stdout(sys.stderr):
+                row = run_case(case, content, args.repeat)
+            rows.append(row)
+            stages = ' '.join(f"{name}={seconds * 1000:.2f}" for name, seconds in row['stages_s'].items())
+            print(f"{row['id'][:30]:30} {row['total_s'] * 1000:>9.2f} {row['peak_kib']:>9} "
+                  f"{row['matched']:>3}/{row['expected']:<3}  {stages}")
+    finally:
+        server.shutdown()
+
+    for kind, reason in skipped.items():
+        print(f"skipped {kind}: {reason}")
+
+    summary = summarize(rows, skipped)
+    print()
+    for kind, data in summary['kinds'].items():
+        throughput = f"{data['throughput_per_s']:.1f}/s" if data['throughput_per_s'] else '-'
+        print(f"{kind:6} {data['cases']:>2} cases  {data['total_s'] * 1000:9.2f} ms  {throughput:>10}  "
+              f"fields {data['matched']}/{data['expected']}")
+    weak = {name: counts for name, counts in summary['fields'].items() if counts[0] < counts[1]}
+    if weak:
+        print('Fields missed: ' + ', '.join(f"{name} {hit}/{total}" for name, (hit, total) in sorted(weak.items())))
+
+    engine = get_ocr_engine()
+    results = {
+        'meta': {
+            'corpus_version': manifest['version'],
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'ocr_engine': engine.name if engine else None,
+            'repeat': args.repeat,
+            'max_rss_kib': _max_rss_kib(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        },
+        'cases': rows,
+        'summary': summary,
+    }
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(json.load(f), results)
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False, default=str)
+
+
+def _max_rss_kib():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, KiB elsewhere
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+if __name__ == '__main__':
+    main()
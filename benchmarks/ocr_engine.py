@@ -0,0 +1,120 @@
+"""
+Benchmark: per-image OCR latency of each installed OCR engine
+
+Usage:
+    python benchmarks/ocr_engine.py screenshots/*.png
+    python benchmarks/ocr_engine.py --synthetic 20 --json results.json
+
+"cold" is the first image through a freshly created engine (for tesserocr
+this includes loading the traineddata); "warm" is the median of the
+following images. Without image files, --synthetic renders ad-like text
+images to OCR.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw, ImageFont
+from utils.ocr_parser import OCR_ENGINES, OCR_LANGUAGES, create_ocr_engine
+
+SYNTHETIC_LINES = [
+    'BMW 320d Touring', 'Erstzulassung 03/2019', 'Kilometerstand 84.500 km',
+    'Diesel  Automatik  140 kW (190 PS)', 'Preis 21.990 EUR',
+    'Autohaus Beispiel GmbH, 80331 München',
+]
+
+
+def synthetic_images(count):
+    """Screenshot-sized images with a few lines of ad text each"""
+    try:
+        font = ImageFont.load_default(size=28)
+    except TypeError:
+        font = ImageFont.load_default()
+    images = []
+    for i in range(count):
+        image = Image.new('RGB', (1200, 400), 'white')
+        draw = ImageDraw.Draw(image)
+        for n, line in enumerate(SYNTHETIC_LINES):
+            draw.text((40, 30 + n * 55), line.replace('320d', f'{320 + i % 10}d'), fill='black', font=font)
+        images.append(image)
+    return images
+
+
+def run_engine(name, images, lang):
+    """Cold and warm per-image latency of one engine"""
+    start = time.perf_counter()
+    engine = create_ocr_engine(name)
+    if engine is None:
+        raise RuntimeError(f'{name} is not installed')
+    create_s = time.perf_counter() - start
+    times, chars = [], 0
+    try:
+        for image in images:
+            began = time.perf_counter()
+            chars += len(engine.image_to_string(image, lang=lang))
+            times.append(time.perf_counter() - began)
+    finally:
+        engine.close()
+    warm = times[1:] or times
+    return {
+        'engine': name,
+        'images': len(times),
+        'create_s': create_s,
+        'cold_s': times[0],
+        'warm_median_s': statistics.median(warm),
+        'warm_p95_s': sorted(warm)[max(0, int(len(warm) * 0.95) - 1)],
+        'total_s': sum(times),
+        'chars': chars,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('images', nargs='*')
+    parser.add_argument('--synthetic', type=int, default=10, help='images to render when no files are given')
+    parser.add_argument('--engine', action='append', choices=sorted(OCR_ENGINES),
+                        help='engine to run (repeatable, default: all installed)')
+    parser.add_argument('--lang', default=OCR_LANGUAGES)
+    parser.add_argument('--json', dest='json_path', help='also write the results to this file')
+    args = parser.parse_args()
+
+    if args.images:
+        images = []
+        for path in args.images:
+            with Image.open(path) as image:
+                images.append(image.convert('RGB'))
+    else:
+        images = synthetic_images(args.synthetic)
+
+    names = args.engine or sorted(OCR_ENGINES)
+    rows = []
+    print(f"{'engine':12} {'images':>6} {'cold s':>8} {'warm s':>8} {'p95 s':>8} {'total s':>8}")
+    for name in names:
+        try:
+            row = run_engine(name, images, args.lang)
+        except (ImportError, RuntimeError) as e:
+            print(f"{name:12} not available ({e.__class__.__name__}: {e})")
+            continue
+        rows.append(row)
+        print(f"{name:12} {row['images']:>6} {row['cold_s']:>8.3f} {row['warm_median_s']:>8.3f} "
+              f"{row['warm_p95_s']:>8.3f} {row['total_s']:>8.2f}")
+
+    if len(rows) > 1:
+        fastest = min(rows, key=lambda r: r['warm_median_s'])
+        for row in rows:
+            if row is not fastest:
+                print(f"\n{fastest['engine']} is {row['warm_median_s'] / fastest['warm_median_s']:.1f}x faster "
+                      f"per warm image than {row['engine']}")
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump({'lang': args.lang, 'results': rows}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark: parse time and fields with all OCR languages vs. a detected single language
+
+Usage:
+    python benchmarks/ocr_language.py corpus/ --expected expected.json
+    python benchmarks/ocr_language.py corpus/ --json results.json
+
+The corpus directory holds one subdirectory of screenshots per source, e.g.
+corpus/mobile.de/*.png, corpus/blocket/*.png, corpus/bilbasen/*.png. The
+expected file maps image file names to the fields the parser should
+extract, e.g. {"bmw_320d.png": {"make": "BMW", "year": 2019, "price": 150000}}.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+from utils.ocr_language import detect_image_language
+from utils.ocr_parser import AdParser, OCR_LANGUAGES, get_ocr_engine
+from utils.ocr_preprocess import preprocess
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.bmp', '.gif')
+MODES = {'all': OCR_LANGUAGES, 'detected': None}
+
+
+def _same(actual, expected):
+    if actual is None:
+        return False
+    if isinstance(expected, (int, float)):
+        try:
+            return float(actual) == float(expected)
+        except (TypeError, ValueError):
+            return False
+    return str(actual).strip().lower() == str(expected).strip().lower()
+
+
+def corpus_images(root):
+    """(source, path) for every image in the corpus' source subdirectories"""
+    for source in sorted(os.listdir(root)):
+        directory = os.path.join(root, source)
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                yield source, os.path.join(directory, name)
+
+
+def run_image(path, repeat):
+    """Median parse time and fields per mode, and the language detected for the image"""
+    with open(path, 'rb') as f:
+        content = f.read()
+    results = {}
+    for mode, languages in MODES.items():
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fields = AdParser.parse_image(content, languages=languages)
+            times.append(time.perf_counter() - start)
+        results[mode] = {'parse_s': statistics.median(times), 'fields': fields}
+    with Image.open(path) as image:
+        detected = detect_image_language(preprocess(image, 'screenshot'), get_ocr_engine())
+    return results, detected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('corpus', help='directory with one subdirectory of screenshots per source')
+    parser.add_argument('--expected', help='JSON file with expected fields per image file name')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per image and mode (median is reported)')
+    parser.add_argument('--json', dest='json_path', help='also write the results to this file')
+    args = parser.parse_args()
+
+    if get_ocr_engine() is None:
+        sys.exit('No OCR engine installed (tesserocr or pytesseract)')
+    expected = {}
+    if args.expected:
+        with open(args.expected, encoding='utf-8') as f:
+            expected = json.load(f)
+
+    rows = []
+    print(f"{'source':12} {'image':30} {'lang':5} {'all s':>8} {'det. s':>8} {'fields':>11}")
+    for source, path in corpus_images(args.corpus):
+        name = os.path.basename(path)
+        result, detected = run_image(path, args.repeat)
+        row = {'source': source, 'image': name, 'detected': detected}
+        scores = []
+        for mode, data in result.items():
+            wanted = expected.get(name, {})
+            hit = sum(_same(data['fields'].get(field), value) for field, value in wanted.items())
+            row[mode] = {'parse_s': data['parse_s'], 'matched': hit, 'expected': len(wanted)}
+            scores.append(f"{hit}/{len(wanted)}" if wanted else '-')
+        rows.append(row)
+        print(f"{source[:12]:12} {name[:30]:30} {detected or '-':5} {row['all']['parse_s']:>8.3f} "
+              f"{row['detected']['parse_s']:>8.3f} {' '.join(scores):>11}")
+
+    summary = {}
+    for source in sorted({row['source'] for row in rows}) + ['total']:
+        source_rows = [row for row in rows if source in ('total', row['source'])]
+        summary[source] = {mode: {
+            'total_s': sum(row[mode]['parse_s'] for row in source_rows),
+            'matched': sum(row[mode]['matched'] for row in source_rows),
+            'expected': sum(row[mode]['expected'] for row in source_rows),
+        } for mode in MODES}
+        summary[source]['detected'] = sum(1 for row in source_rows if row['detected'])
+        summary[source]['images'] = len(source_rows)
+
+    print()
+    for source, data in summary.items():
+        full, narrow = data['all'], data['detected']
+        speedup = f"{full['total_s'] / narrow['total_s']:.1f}x" if narrow['total_s'] else '-'
+        line = (f"{source:12} {data['images']:>3} images, language found for {data['detected']}: "
+                f"all {full['total_s']:.2f}s, detected {narrow['total_s']:.2f}s ({speedup})")
+        if full['expected']:
+            line += f", fields {full['matched']}/{full['expected']} vs {narrow['matched']}/{narrow['expected']}"
+        print(line)
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump({'repeat': args.repeat, 'images': rows, 'summary': summary}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
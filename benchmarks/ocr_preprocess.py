@@ -0,0 +1,116 @@
+"""
+Benchmark: OCR time and field accuracy with image preprocessing off and on
+
+Usage:
+    python benchmarks/ocr_preprocess.py screenshots/*.png --expected expected.json
+    python benchmarks/ocr_preprocess.py scans/*.png --profile scan --json results.json
+
+The expected file maps image file names to the fields the parser should
+extract, e.g. {"bmw_320d.png": {"make": "BMW", "year": 2019, "price": 150000}}.
+Without it only timings are reported.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+from utils.ocr_parser import AdParser, OCR_LANGUAGES, pytesseract
+from utils.ocr_preprocess import PROFILES, preprocess
+
+
+def _same(actual, expected):
+    if actual is None:
+        return False
+    if isinstance(expected, (int, float)):
+        try:
+            return float(actual) == float(expected)
+        except (TypeError, ValueError):
+            return False
+    return str(actual).strip().lower() == str(expected).strip().lower()
+
+
+def run_image(path, profile, repeat):
+    """Median timings and extracted fields for one image, per mode"""
+    results = {}
+    for mode in ('off', 'on'):
+        prep_times, ocr_times = [], []
+        for _ in range(repeat):
+            with Image.open(path) as original:
+                original.load()
+                start = time.perf_counter()
+                image = preprocess(original, profile) if mode == 'on' else original.convert('RGB')
+                prepared = time.perf_counter()
+                text = pytesseract.image_to_string(image, lang=OCR_LANGUAGES)
+                done = time.perf_counter()
+            prep_times.append(prepared - start)
+            ocr_times.append(done - prepared)
+        results[mode] = {
+            'preprocess_s': statistics.median(prep_times),
+            'ocr_s': statistics.median(ocr_times),
+            'pixels': image.width * image.height,
+            'fields': AdParser._parse_text(text),
+        }
+    return results
+
+
+def accuracy(fields, expected):
+    matched = [name for name, value in expected.items() if _same(fields.get(name), value)]
+    return len(matched), len(expected)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('images', nargs='+')
+    parser.add_argument('--profile', default='screenshot', choices=sorted(PROFILES))
+    parser.add_argument('--expected', help='JSON file with expected fields per image file name')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per image and mode (median is reported)')
+    parser.add_argument('--json', dest='json_path', help='also write the results to this file')
+    args = parser.parse_args()
+
+    if pytesseract is None:
+        sys.exit('pytesseract is not installed')
+    expected = {}
+    if args.expected:
+        with open(args.expected, encoding='utf-8') as f:
+            expected = json.load(f)
+
+    rows = []
+    print(f"{'image':30} {'mode':4} {'pixels':>10} {'prep s':>8} {'ocr s':>8} {'fields':>8}")
+    for path in args.images:
+        name = os.path.basename(path)
+        result = run_image(path, args.profile, args.repeat)
+        for mode, data in result.items():
+            hit, total = accuracy(data['fields'], expected.get(name, {}))
+            score = f"{hit}/{total}" if total else '-'
+            print(f"{name[:30]:30} {mode:4} {data['pixels']:>10} {data['preprocess_s']:>8.3f} "
+                  f"{data['ocr_s']:>8.3f} {score:>8}")
+            rows.append({'image': name, 'mode': mode, 'matched': hit, 'expected': total,
+                         **{k: v for k, v in data.items() if k != 'fields'}})
+
+    summary = {}
+    for mode in ('off', 'on'):
+        mode_rows = [r for r in rows if r['mode'] == mode]
+        summary[mode] = {
+            'total_s': sum(r['preprocess_s'] + r['ocr_s'] for r in mode_rows),
+            'matched': sum(r['matched'] for r in mode_rows),
+            'expected': sum(r['expected'] for r in mode_rows),
+        }
+    off, on = summary['off'], summary['on']
+    print(f"\nTotal time: off {off['total_s']:.2f}s, on {on['total_s']:.2f}s "
+          f"({off['total_s'] / on['total_s']:.1f}x)" if on['total_s'] else '')
+    if off['expected']:
+        print(f"Fields matched: off {off['matched']}/{off['expected']}, on {on['matched']}/{on['expected']}")
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump({'profile': args.profile, 'repeat': args.repeat, 'images': rows, 'summary': summary},
+                      f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Render the corpus' screenshot and scanned-PDF cases from their listing texts
+
+Usage:
+    python benchmarks/render_corpus.py [benchmarks/corpus]
+
+Every manifest case of kind "image" or "pdf" with a "render" entry is drawn
+from the text file it names, so the binary fixtures can be rebuilt (and
+reviewed) from plain text. Rendering is deterministic for a given Pillow
+version; the rendered files are committed with the corpus.
+"""
+import json
+import os
+import sys
+
+from PIL import Image, ImageDraw, ImageFont
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus')
+
+# Per style: font size (px), page width (px), colours, and the save resolution for PDFs
+STYLES = {
+    # Phone screenshot, light theme
+    'screenshot': {'font_size': 30, 'width': 1080, 'background': 'white', 'ink': (33, 33, 33)},
+    # Phone screenshot, dark theme
+    'dark': {'font_size': 30, 'width': 1080, 'background': (18, 18, 18), 'ink': (235, 235, 235)},
+    # A4 page scanned at 300 dpi, slightly grey paper
+    'scan': {'font_size': 42, 'width': 2480, 'height': 3508, 'background': (245, 245, 240), 'ink': (20, 20, 20),
+             'dpi': 300},
+}
+MARGIN = 60
+LINE_SPACING = 1.6
+
+
+def render(text, style):
+    """Image of the text's lines in a style of STYLES"""
+    settings = STYLES[style]
+    font = ImageFont.load_default(size=settings['font_size'])
+    lines = text.splitlines()
+    line_height = round(settings['font_size'] * LINE_SPACING)
+    height = settings.get('height') or 2 * MARGIN + line_height * len(lines)
+    image = Image.new('RGB', (settings['width'], height), settings['background'])
+    draw = ImageDraw.Draw(image)
+    for number, line in enumerate(lines):
+        draw.text((MARGIN, MARGIN + number * line_height), line, fill=settings['ink'], font=font)
+    return image
+
+
+def main():
+    root = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_CORPUS
+    with open(os.path.join(root, 'manifest.json'), encoding='utf-8') as f:
+        manifest = json.load(f)
+    for case in manifest['cases']:
+        if case['kind'] not in ('image', 'pdf') or 'render' not in case:
+            continue
+        with open(os.path.join(root, case['render']['text']), encoding='utf-8') as f:
+            text = f.read()
+        style = case['render']['style']
+        # Stored in grayscale to keep the corpus small
+        image = render(text, style).convert('L')
+        path = os.path.join(root, case['file'])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if case['kind'] == 'pdf':
+            image.save(path, 'PDF', resolution=STYLES[style].get('dpi', 300))
+        else:
+            image.save(path, optimize=True)
+        print(f"{case['id']}: {case['file']} ({os.path.getsize(path)} bytes)")
+
+
+if __name__ == '__main__':
+    main()
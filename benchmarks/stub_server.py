@@ -0,0 +1,178 @@
+"""
+Local stub server replaying recorded listing pages
+
+Usage:
+    python benchmarks/stub_server.py record recordings/ https://suchen.mobile.de/... https://www.blocket.se/...
+    python benchmarks/stub_server.py serve recordings/ --port 8765 [--latency 0.2] [--fail-every 3] [--max-age 0]
+    HTTP_STUB_URL=http://127.0.0.1:8765 flask --app app run
+
+With HTTP_STUB_URL set, utils.http_client sends https://host/path?query to
+http://127.0.0.1:8765/host/path?query, so mobile.de, autoscout24 and blocket
+listings can be parsed offline. Pages are stored as <host>/<hash>.html plus an
+index.json of their original URLs and content types; files placed by hand at
+<host>/<path> are served too.
+
+Responses carry an ETag and Last-Modified, and conditional requests get a
+304, which exercises the client's revalidation. --fail-every N answers every
+Nth request with a 503 (for the retry path) and --latency delays every
+response.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+INDEX_FILE = 'index.json'
+
+
+def _key(host, path, query):
+    return f"{host}{path or '/'}" + (f'?{query}' if query else '')
+
+
+def load_index(root):
+    try:
+        with open(os.path.join(root, INDEX_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def record(root, urls):
+    """Fetch pages once (without the client's cache) and add them to the recordings"""
+    import requests
+    from utils.ocr_parser import AdParser
+
+    index = load_index(root)
+    session = requests.Session()
+    for url in urls:
+        parts = urlsplit(url)
+        headers = AdParser.MOBILE_DE_HEADERS if 'mobile.de' in parts.netloc else AdParser.DEFAULT_HEADERS
+        response = session.get(url, headers=headers, timeout=30)
+        key = _key(parts.netloc, parts.path, parts.query)
+        name = os.path.join(parts.netloc, hashlib.sha1(key.encode()).hexdigest()[:16] + '.html')
+        os.makedirs(os.path.join(root, parts.netloc), exist_ok=True)
+        with open(os.path.join(root, name), 'wb') as f:
+            f.write(response.content)
+        index[key] = {'file': name, 'status': response.status_code,
+                      'content_type': response.headers.get('Content-Type', 'text/html; charset=utf-8')}
+        print(f"{response.status_code} {url} -> {name} ({len(response.content)} bytes)")
+    with open(os.path.join(root, INDEX_FILE), 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=2, sort_keys=True)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    root = '.'
+    index = {}
+    latency = 0.0
+    fail_every = 0
+    max_age = None
+    requests_seen = 0
+    counter_lock = threading.Lock()
+
+    def _lookup(self):
+        host, _, rest = self.path.lstrip('/').partition('/')
+        parts = urlsplit('/' + rest)
+        entry = self.index.get(_key(host, parts.path, parts.query))
+        if entry:
+            return os.path.join(self.root, entry['file']), entry
+        path = os.path.normpath(os.path.join(self.root, host, parts.path.lstrip('/')))
+        if path.startswith(os.path.abspath(self.root)) and os.path.isfile(path):
+            return path, {'status': 200, 'content_type': 'text/html; charset=utf-8'}
+        return None, None
+
+    def do_GET(self):
+        with self.counter_lock:
+            StubHandler.requests_seen += 1
+            count = StubHandler.requests_seen
+        if self.latency:
+            time.sleep(self.latency)
+        if self.fail_every and count % self.fail_every == 0:
+            self.send_response(503)
+            self.send_header('Retry-After', '0')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        path, entry = self._lookup()
+        if not path:
+            self.send_error(404)
+            return
+        with open(path, 'rb') as f:
+            body = f.read()
+        etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+        modified = os.path.getmtime(path)
+
+        not_modified = False
+        if 'If-None-Match' in self.headers:
+            not_modified = etag in [tag.strip() for tag in self.headers['If-None-Match'].split(',')]
+        elif 'If-Modified-Since' in self.headers:
+            try:
+                not_modified = int(modified) <= parsedate_to_datetime(self.headers['If-Modified-Since']).timestamp()
+            except (TypeError, ValueError):
+                pass
+
+        self.send_response(304 if not_modified else entry.get('status', 200))
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', formatdate(modified, usegmt=True))
+        if self.max_age is not None:
+            self.send_header('Cache-Control', f'max-age={self.max_age}')
+        if not_modified:
+            self.end_headers()
+            return
+        self.send_header('Content-Type', entry.get('content_type', 'text/html; charset=utf-8'))
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def make_server(root, host='127.0.0.1', port=0, latency=0.0, fail_every=0, max_age=None):
+    """Stub server for a recordings directory (port 0 picks a free port)"""
+    handler = type('Handler', (StubHandler,), {
+        'root': os.path.abspath(root), 'index': load_index(root),
+        'latency': latency, 'fail_every': fail_every, 'max_age': max_age,
+    })
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def serve(root, host, port, latency=0.0, fail_every=0, max_age=None):
+    server = make_server(root, host, port, latency, fail_every, max_age)
+    print(f"Serving {len(server.RequestHandlerClass.index)} recorded pages from {root} on http://{host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    record_parser = commands.add_parser('record', help='fetch listing pages into a recordings directory')
+    record_parser.add_argument('root')
+    record_parser.add_argument('urls', nargs='+')
+    serve_parser = commands.add_parser('serve', help='serve a recordings directory')
+    serve_parser.add_argument('root')
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8765)
+    serve_parser.add_argument('--latency', type=float, default=0.0, help='seconds to delay every response')
+    serve_parser.add_argument('--fail-every', type=int, default=0, help='answer every Nth request with 503')
+    serve_parser.add_argument('--max-age', type=int, help='send Cache-Control: max-age with every page')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        record(args.root, args.urls)
+    else:
+        serve(args.root, args.host, args.port, args.latency, args.fail_every, args.max_age)
+
+
+if __name__ == '__main__':
+    main()
@@ -8,6 +8,18 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
+# Flask-Caching 2 only accepts class names; keep the short names used in .env files working
+CACHE_TYPE_ALIASES = {
+    'simple': 'SimpleCache',
+    'redis': 'RedisCache',
+    'null': 'NullCache',
+    'filesystem': 'FileSystemCache',
+}
+
+def cache_type(value):
+    """Map legacy CACHE_TYPE names to Flask-Caching backend names"""
+    return CACHE_TYPE_ALIASES.get(value.lower(), value)
+
 class Config:
     """Base configuration"""
     SECRET_KEY = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
@@ -23,7 +35,40 @@ class Config:
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', 'static/uploads')
     MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 16 * 1024 * 1024))
     ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg', 'gif', 'doc', 'docx', 'xls', 'xlsx'}
-    
+
+    # Advertisement parse jobs (workers are capped at the CPU count)
+    PARSE_JOB_WORKERS = int(os.environ.get('PARSE_JOB_WORKERS', 0)) or None
+    PARSE_JOB_TIMEOUT = int(os.environ.get('PARSE_JOB_TIMEOUT', 120))
+    # URL jobs mostly wait on the network, so more of them run at once
+    PARSE_JOB_FETCH_WORKERS = int(os.environ.get('PARSE_JOB_FETCH_WORKERS', 8))
+    # Parse children are reused for this many jobs and stopped after this many idle seconds
+    PARSE_JOB_WORKER_MAX_JOBS = int(os.environ.get('PARSE_JOB_WORKER_MAX_JOBS', 50))
+    PARSE_JOB_WORKER_IDLE = int(os.environ.get('PARSE_JOB_WORKER_IDLE', 300))
+    BULK_IMPORT_MAX_ITEMS = int(os.environ.get('BULK_IMPORT_MAX_ITEMS', 50))
+    # Seconds one bulk import stream segment waits for jobs before handing the client a
+    # resume cursor. 0 (poll) suits the single sync gunicorn worker; raise it with threaded workers
+    BULK_IMPORT_SEGMENT = int(os.environ.get('BULK_IMPORT_SEGMENT', 0))
+    # Uploads up to this size are parsed from memory; larger ones are stored in UPLOAD_FOLDER
+    PARSE_UPLOAD_MEMORY_MAX_BYTES = int(os.environ.get('PARSE_UPLOAD_MEMORY_MAX_BYTES', 8 * 1024 * 1024))
+    # Compiled gazetteer index (default: data/gazetteer.bin, built from data/gazetteer_seed.tsv)
+    GAZETTEER_PATH = os.environ.get('GAZETTEER_PATH')
+    # Parse result cache (default: <instance>/parse_cache)
+    PARSE_CACHE_DIR = os.environ.get('PARSE_CACHE_DIR')
+    PARSE_CACHE_MAX_BYTES = int(os.environ.get('PARSE_CACHE_MAX_BYTES', 100 * 1024 * 1024))
+
+    # HTTP client for listing pages (default cache: <instance>/http_cache)
+    HTTP_CACHE_DIR = os.environ.get('HTTP_CACHE_DIR')
+    HTTP_CACHE_MAX_BYTES = int(os.environ.get('HTTP_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+    HTTP_TIMEOUT = int(os.environ.get('HTTP_TIMEOUT', 15))
+    HTTP_RETRIES = int(os.environ.get('HTTP_RETRIES', 3))
+    HTTP_BACKOFF = float(os.environ.get('HTTP_BACKOFF', 0.5))
+    HTTP_MAX_PER_HOST = int(os.environ.get('HTTP_MAX_PER_HOST', 2))
+    HTTP_MIN_INTERVAL = float(os.environ.get('HTTP_MIN_INTERVAL', 1.0))
+    # Stricter limits per domain (subdomains included)
+    HTTP_HOST_LIMITS = {'mobile.de': {'max_per_host': 1, 'min_interval': 3.0}}
+    # Send all listing requests to a local stub server (benchmarks/stub_server.py)
+    HTTP_STUB_URL = os.environ.get('HTTP_STUB_URL')
+
     # Email configuration
     MAIL_SERVER = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
     MAIL_PORT = int(os.environ.get('MAIL_PORT', 587))
@@ -37,9 +82,11 @@ class Config:
     REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
     
     # Cache
-    CACHE_TYPE = os.environ.get('CACHE_TYPE', 'simple')
+    CACHE_TYPE = cache_type(os.environ.get('CACHE_TYPE', 'simple'))
     CACHE_REDIS_URL = REDIS_URL
     CACHE_DEFAULT_TIMEOUT = int(os.environ.get('CACHE_DEFAULT_TIMEOUT', 300))
+    # Part of every response ETag, so a deploy does not answer 304 for pages rendered by old code
+    RELEASE = os.environ.get('RELEASE') or os.environ.get('RENDER_GIT_COMMIT', '')
     
     # CSRF
     WTF_CSRF_ENABLED = True
@@ -56,7 +103,7 @@ class DevelopmentConfig(Config):
     DEBUG = True
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL_DEV', 'sqlite:///greenmotion.db')
     SQLALCHEMY_ECHO = True
-    CACHE_TYPE = 'simple'
+    CACHE_TYPE = 'SimpleCache'
 
 class ProductionConfig(Config):
     """Production configuration"""
@@ -88,7 +135,7 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
-    CACHE_TYPE = 'simple'
+    CACHE_TYPE = 'SimpleCache'
 
 # Configuration dictionary
 config = {
@@ -3,11 +3,13 @@ Database initialization
 """
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
+from flask_caching import Cache
 
 # Initialize extensions
 db = SQLAlchemy()
 login_manager = LoginManager()
 login_manager.login_view = 'auth.login'
+cache = Cache()
 
 @login_manager.user_loader
 def load_user(user_id):
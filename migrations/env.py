@@ -51,6 +51,23 @@ def get_metadata():
     return target_db.metadata
 
 
+# Schema objects created with raw SQL rather than from the models: the
+# full-text search index (utils.search_index, with the FTS5 shadow tables on
+# SQLite) and expression/operator-class indexes. Autogenerate would otherwise
+# emit drops for them.
+EXCLUDED_TABLES = ('search_index',)
+EXCLUDED_INDEXES = ('ix_sales_sale_number_pattern',)
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    if type_ == 'table' and (name in EXCLUDED_TABLES or name.startswith(
+            tuple(f'{table}_' for table in EXCLUDED_TABLES))):
+        return False
+    if type_ == 'index' and name in EXCLUDED_INDEXES:
+        return False
+    return True
+
+
 def run_migrations_offline():
     """Run migrations in 'offline' mode.
 
@@ -65,7 +82,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=get_metadata(), literal_binds=True
+        url=url, target_metadata=get_metadata(), literal_binds=True,
+        include_object=include_object
     )
 
     with context.begin_transaction():
@@ -93,6 +111,7 @@ def run_migrations_online():
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    conf_args.setdefault("include_object", include_object)
 
     connectable = get_engine()
 
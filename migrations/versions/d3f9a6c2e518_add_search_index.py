@@ -0,0 +1,42 @@
+"""Add the full-text search index table
+
+Revision ID: d3f9a6c2e518
+Revises: c786443b2218
+Create Date: 2026-10-16 08:47:19.530118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3f9a6c2e518'
+down_revision = 'c786443b2218'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Same schema as utils.search_index.create_schema, which the application
+    # also runs on startup; fill it with `flask search-reindex`
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+                   "entity_type UNINDEXED, entity_id UNINDEXED, title, body, "
+                   "tokenize = 'unicode61 remove_diacritics 2')")
+    elif dialect == 'postgresql':
+        op.execute("CREATE TABLE IF NOT EXISTS search_index ("
+                   "entity_type VARCHAR(20) NOT NULL, "
+                   "entity_id INTEGER NOT NULL, "
+                   "title TEXT, "
+                   "body TEXT, "
+                   "document TSVECTOR, "
+                   "PRIMARY KEY (entity_type, entity_id))")
+        op.execute("CREATE INDEX IF NOT EXISTS ix_search_index_document "
+                   "ON search_index USING GIN (document)")
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_search_index_document")
+    op.execute("DROP TABLE IF EXISTS search_index")
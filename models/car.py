@@ -2,6 +2,8 @@
 Car model for vehicle inventory management
 """
 from datetime import datetime
+from sqlalchemy import case, cast, func, or_
+from sqlalchemy.ext.hybrid import hybrid_method
 from database import db
 
 class Car(db.Model):
@@ -13,7 +15,7 @@ class Car(db.Model):
     
     # Basic information
     make = db.Column(db.String(50), nullable=False, index=True)
-    model = db.Column(db.String(100), nullable=False)
+    model = db.Column(db.String(100), nullable=False, index=True)
     year = db.Column(db.Integer, nullable=False, index=True)
     color = db.Column(db.String(50))
     mileage = db.Column(db.Integer)
@@ -90,11 +92,34 @@ class Car(db.Model):
     market_price = db.Column(db.Numeric(10, 2))  # Markedspris fra Bilbasen
     market_price_updated = db.Column(db.DateTime)  # Hvornår blev prisen opdateret
     
+    # Photo shown in the list grid; kept current by utils.car_photos
+    primary_photo_id = db.Column(db.Integer, db.ForeignKey('documents.id', use_alter=True, ondelete='SET NULL',
+                                                           name='fk_cars_primary_photo_id'))
+    
     # Relationships
-    documents = db.relationship('Document', backref='car', lazy='dynamic', cascade='all, delete-orphan')
+    documents = db.relationship('Document', backref='car', lazy='dynamic', cascade='all, delete-orphan',
+                                foreign_keys='Document.car_id')
     logistics = db.relationship('LogisticsEntry', backref='car', lazy='dynamic', cascade='all, delete-orphan')
     sales = db.relationship('Sale', backref='car', lazy='dynamic')
     
+    # Read-only lists of the same rows; unlike the dynamic relationships above
+    # these can be eager-loaded (see utils.loaders)
+    all_documents = db.relationship('Document', foreign_keys='Document.car_id', order_by='Document.id', viewonly=True)
+    primary_photo = db.relationship('Document', foreign_keys=[primary_photo_id], viewonly=True)
+    
+    # VAT rates for imported cars, matched on import_country (lowercase)
+    VAT_RATES = (
+        (('tyskland', 'germany'), 0.19),  # 19% German VAT
+        (('sverige', 'sweden'), 0.25),  # 25% Swedish VAT
+    )
+    
+    # Exchange rates to DKK
+    EXCHANGE_RATES = {
+        'EUR': 7.4685,
+        'SEK': 0.685,
+    }
+    
+    @hybrid_method
     def net_purchase_price(self):
         """Calculate net purchase price (excluding VAT) based on import country"""
         gross_price = float(self.purchase_price or 0)
@@ -107,10 +132,10 @@ class Car(db.Model):
         vat_rate = 0
         if self.import_country:
             country = self.import_country.lower()
-            if 'tyskland' in country or 'germany' in country:
-                vat_rate = 0.19  # 19% German VAT
-            elif 'sverige' in country or 'sweden' in country:
-                vat_rate = 0.25  # 25% Swedish VAT
+            for names, rate in self.VAT_RATES:
+                if any(name in country for name in names):
+                    vat_rate = rate
+                    break
         
         # Calculate net price (remove VAT)
         if vat_rate > 0:
@@ -120,20 +145,43 @@ class Car(db.Model):
         
         return net_price
     
+    @net_purchase_price.expression
+    def net_purchase_price(cls):
+        """SQL expression for net purchase price (excluding VAT)"""
+        price_after_discount = (func.coalesce(cls.purchase_price, 0) -
+                                func.coalesce(cls.discount, 0))
+        country = func.lower(func.coalesce(cls.import_country, ''))
+        vat_divisor = case(
+            *[(or_(*[country.like(f'%{name}%') for name in names]), 1 + rate)
+              for names, rate in cls.VAT_RATES],
+            else_=1.0
+        )
+        return cast(price_after_discount, db.Float) / vat_divisor
+    
+    @hybrid_method
     def net_price_dkk(self):
         """Calculate net purchase price in DKK"""
         rate = 1.0
-        if self.purchase_currency and self.purchase_currency.upper() == 'EUR':
-            rate = 7.4685
-        elif self.purchase_currency and self.purchase_currency.upper() == 'SEK':
-            rate = 0.685
+        if self.purchase_currency:
+            rate = self.EXCHANGE_RATES.get(self.purchase_currency.upper(), 1.0)
         
         return self.net_purchase_price() * rate
     
+    @net_price_dkk.expression
+    def net_price_dkk(cls):
+        """SQL expression for net purchase price in DKK"""
+        currency = func.upper(func.coalesce(cls.purchase_currency, 'DKK'))
+        rate = case(
+            *[(currency == code, rate) for code, rate in cls.EXCHANGE_RATES.items()],
+            else_=1.0
+        )
+        return cls.net_purchase_price() * rate
+    
+    @hybrid_method
     def total_additional_costs(self):
         """Calculate total additional costs in DKK (excluding purchase price)"""
         # Invoice fee is in EUR, convert to DKK
-        invoice_fee_dkk = float(self.invoice_fee or 0) * 7.4685
+        invoice_fee_dkk = float(self.invoice_fee or 0) * self.EXCHANGE_RATES['EUR']
         
         return (float(self.transport_cost or 0) + 
                 float(self.transport_surcharge or 0) +
@@ -142,10 +190,24 @@ class Car(db.Model):
                 float(self.preparation_cost or 0) + 
                 float(self.other_costs or 0))
     
+    @total_additional_costs.expression
+    def total_additional_costs(cls):
+        """SQL expression for total additional costs in DKK"""
+        invoice_fee_dkk = cast(func.coalesce(cls.invoice_fee, 0), db.Float) * cls.EXCHANGE_RATES['EUR']
+        
+        return (cast(func.coalesce(cls.transport_cost, 0), db.Float) +
+                func.coalesce(cls.transport_surcharge, 0) +
+                func.coalesce(cls.customs_cost, 0) +
+                invoice_fee_dkk +
+                func.coalesce(cls.preparation_cost, 0) +
+                func.coalesce(cls.other_costs, 0))
+    
+    @hybrid_method
     def total_cost(self):
         """Calculate total cost of car using net purchase price"""
         return self.net_price_dkk() + self.total_additional_costs()
     
+    @hybrid_method
     def profit_margin(self, selling_price=None):
         """Calculate profit margin"""
         price = selling_price or self.selling_price
@@ -153,6 +215,13 @@ class Car(db.Model):
             return None
         return float(price) - self.total_cost()
     
+    @profit_margin.expression
+    def profit_margin(cls, selling_price=None):
+        """SQL expression for profit margin (NULL when no or a zero selling price, as in Python)"""
+        price = selling_price if selling_price is not None else cls.selling_price
+        return cast(func.nullif(price, 0), db.Float) - cls.total_cost()
+    
+    @hybrid_method
     def profit_percentage(self, selling_price=None):
         """Calculate profit percentage"""
         margin = self.profit_margin(selling_price)
@@ -163,6 +232,11 @@ class Car(db.Model):
             return None
         return (margin / total) * 100
     
+    @profit_percentage.expression
+    def profit_percentage(cls, selling_price=None):
+        """SQL expression for profit percentage (NULL when cost is zero)"""
+        return cls.profit_margin(selling_price) / func.nullif(cls.total_cost(), 0) * 100
+    
     @property
     def parsed_notes(self):
         """Parse condition_notes into a list of dicts"""
@@ -0,0 +1,26 @@
+"""
+Car facet count model for the inventory filters
+"""
+from database import db
+
+class CarFacetCount(db.Model):
+    """Number of cars per combination of filterable values"""
+    __tablename__ = 'car_facet_counts'
+    __table_args__ = (
+        db.UniqueConstraint('status', 'make', 'import_country', 'fuel_type', 'year',
+                            name='uq_car_facet_counts_values'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    # Facet values (fuel_type is stored as '' when the car has none)
+    status = db.Column(db.String(30), nullable=False)
+    make = db.Column(db.String(50), nullable=False)
+    import_country = db.Column(db.String(50), nullable=False)
+    fuel_type = db.Column(db.String(30), nullable=False, default='')
+    year = db.Column(db.Integer, nullable=False)
+
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<CarFacetCount {self.status}/{self.make}/{self.year}: {self.count}>'
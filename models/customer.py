@@ -17,7 +17,7 @@ class Customer(db.Model):
     name = db.Column(db.String(120), nullable=False, index=True)
     contact_person = db.Column(db.String(120))  # For dealers
     email = db.Column(db.String(120), nullable=False, index=True)
-    phone = db.Column(db.String(20), nullable=False)
+    phone = db.Column(db.String(20), nullable=False, index=True)
     secondary_phone = db.Column(db.String(20))
     
     # Business information (for dealers)
@@ -51,9 +51,17 @@ class Customer(db.Model):
     # Relationships
     sales = db.relationship('Sale', backref='customer', lazy='dynamic')
     communications = db.relationship('Communication', backref='customer', lazy='dynamic', cascade='all, delete-orphan')
+    # Read-only and eager-loadable (see utils.loaders)
+    completed_sales = db.relationship('Sale', primaryjoin="and_(Customer.id == Sale.customer_id, "
+                                                          "Sale.status == 'completed')", viewonly=True)
+    all_sales = db.relationship('Sale', order_by='Sale.created_at.desc()', viewonly=True)
+    all_communications = db.relationship('Communication', order_by='Communication.created_at.desc()', viewonly=True)
+    all_documents = db.relationship('Document', order_by='Document.id', viewonly=True)
     
     def total_purchases(self):
         """Calculate total number of purchases"""
+        if 'completed_sales' not in db.inspect(self).unloaded:
+            return len(self.completed_sales)
         return self.sales.filter_by(status='completed').count()
     
     def total_revenue(self):
@@ -63,6 +63,8 @@ class Invoice(db.Model):
     sale = db.relationship('Sale', backref=db.backref('invoices', lazy='dynamic'))
     line_items = db.relationship('InvoiceLineItem', backref='invoice', lazy='dynamic', cascade='all, delete-orphan')
     issuing_company = db.relationship('CompanySettings', backref=db.backref('invoices', lazy='dynamic'))
+    # Read-only and eager-loadable (see utils.loaders)
+    all_line_items = db.relationship('InvoiceLineItem', order_by='InvoiceLineItem.sort_order', viewonly=True)
     
     def __init__(self, **kwargs):
         super(Invoice, self).__init__(**kwargs)
@@ -0,0 +1,58 @@
+"""
+Background jobs for advertisement parsing (OCR and URL fetch)
+"""
+import json
+from datetime import datetime
+from database import db
+
+class ParseJob(db.Model):
+    """One advertisement parse request, run outside the web request"""
+    __tablename__ = 'parse_jobs'
+
+    # Job states; the last four are final
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    TIMEOUT = 'timeout'
+    CANCELLED = 'cancelled'
+    FINAL_STATES = (DONE, FAILED, TIMEOUT, CANCELLED)
+
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    kind = db.Column(db.String(20), nullable=False)  # upload, url
+    source = db.Column(db.String(500), nullable=False)  # File name or URL
+    input_path = db.Column(db.String(500))  # Stored upload, removed when the job ends
+    status = db.Column(db.String(20), nullable=False, default=QUEUED, index=True)
+    result_json = db.Column(db.Text)
+    error = db.Column(db.Text)
+    batch_id = db.Column(db.String(32), index=True)  # Set for jobs of one bulk import
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    @property
+    def result(self):
+        return json.loads(self.result_json) if self.result_json else None
+
+    @property
+    def is_final(self):
+        return self.status in self.FINAL_STATES
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'source': self.source,
+            'batch_id': self.batch_id,
+            'status': self.status,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    def __repr__(self):
+        return f'<ParseJob {self.id} {self.kind} {self.status}>'
@@ -2,6 +2,8 @@
 Sale model for managing sales pipeline and transactions
 """
 from datetime import datetime
+from sqlalchemy import cast, select
+from sqlalchemy.ext.hybrid import hybrid_method
 from database import db
 
 class Sale(db.Model):
@@ -60,11 +62,19 @@ class Sale(db.Model):
         """Check if sale is fully paid"""
         return self.remaining_payment() <= 0
     
+    @hybrid_method
     def profit(self):
         """Calculate profit from this sale"""
         if self.final_price and hasattr(self, 'car') and self.car:
             return float(self.final_price) - self.car.total_cost()
         return None
     
+    @profit.expression
+    def profit(cls):
+        """SQL expression for profit (correlated on the sold car's total cost)"""
+        from models.car import Car
+        car_cost = select(Car.total_cost()).where(Car.id == cls.car_id).scalar_subquery()
+        return cast(cls.final_price, db.Float) - car_cost
+    
     def __repr__(self):
         return f'<Sale {self.sale_number} ({self.status})>'
@@ -0,0 +1,40 @@
+"""
+Sales fact tables for reports
+"""
+from database import db
+
+class SalesDailyFact(db.Model):
+    """Completed sales rolled up per day, salesperson and car make"""
+    __tablename__ = 'sales_daily_facts'
+    __table_args__ = (
+        db.UniqueConstraint('day', 'salesperson_id', 'make', name='uq_sales_daily_facts_key'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    # Dimensions
+    day = db.Column(db.Date, nullable=False, index=True)
+    salesperson_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    make = db.Column(db.String(50), nullable=False)
+
+    # Measures (cost and profit only cover sales with a final price)
+    sale_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    cost = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    profit = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<SalesDailyFact {self.day} {self.salesperson_id} {self.make}>'
+
+
+class CustomerSalesTotal(db.Model):
+    """Completed sales rolled up per customer"""
+    __tablename__ = 'customer_sales_totals'
+
+    customer_id = db.Column(db.Integer, db.ForeignKey('customers.id'), primary_key=True)
+    purchase_count = db.Column(db.Integer, nullable=False, default=0)
+    total_revenue = db.Column(db.Numeric(14, 2), nullable=False, default=0, index=True)
+    last_purchase_date = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<CustomerSalesTotal {self.customer_id}: {self.total_revenue}>'
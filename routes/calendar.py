@@ -1,10 +1,8 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
 from database import db
+from utils.cache_utils import cached_response
 from models.calendar_event import CalendarEvent
-from models.car import Car
-from models.customer import Customer
-from models.sale import Sale
 from datetime import datetime, timedelta
 from calendar import monthrange
 
@@ -102,19 +100,11 @@ def add_event():
         flash('Begivenhed oprettet!', 'success')
         return redirect(url_for('calendar.index'))
     
-    # Get data for dropdowns
-    cars = Car.query.filter_by(status='available').all()
-    customers = Customer.query.all()
-    sales = Sale.query.filter(Sale.status.in_(['lead', 'offer_sent', 'negotiation'])).all()
-    
     # Get date from query param if provided
     default_date = request.args.get('date', datetime.now().strftime('%Y-%m-%d'))
     
-    return render_template('calendar/add.html', 
-                         cars=cars, 
-                         customers=customers, 
-                         sales=sales,
-                         default_date=default_date)
+    # Cars, customers and sales are picked through the lookup endpoints
+    return render_template('calendar/add.html', default_date=default_date)
 
 @calendar_bp.route('/<int:event_id>')
 @login_required
@@ -174,6 +164,7 @@ def delete_event(event_id):
 
 @calendar_bp.route('/api/events')
 @login_required
+@cached_response(['calendar:events'], vary='role')
 def api_events():
     """API endpoint for getting events as JSON"""
     start = request.args.get('start')
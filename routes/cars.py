@@ -1,73 +1,180 @@
 """
 Car inventory management routes
 """
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+from flask import (Blueprint, render_template, redirect, url_for, flash, request, jsonify, abort,
+                   current_app, Response, stream_with_context)
 from flask_login import login_required, current_user
 from models.car import Car
 from models.document import Document
 from database import db
+from utils.search_index import matching_ids
+from utils.pagination import order_by_keys, wants_keyset, paginate_request
+from utils.facets import FACET_FIELDS, facet_counts
+from utils.dashboard_stats import get_stats
+from utils.cache_utils import cached_response
+from utils.loaders import loader_options, with_profile
+from utils.lookup import lookup
+from utils.projections import CarOption
 from datetime import datetime
-from sqlalchemy import or_, and_
+from sqlalchemy import or_, and_, func
+import json
 
 bp = Blueprint('cars', __name__, url_prefix='/cars')
 
+# File types accepted for advertisement parsing
+AD_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp', 'webp', 'pdf'}
+
+# Sort options as (expression, descending) keys; the id tie-breaker keeps keyset cursors unique.
+# Cars without a selling price have no margin and sort as the lowest margin.
+NO_MARGIN = -1e15
+
+def _sort_keys(sort):
+    """Sort keys for the car list (cost and margin are computed in SQL)"""
+    margin = func.coalesce(Car.profit_margin(), NO_MARGIN)
+    sort_options = {
+        'cost_asc': [(Car.total_cost(), False), (Car.id, False)],
+        'cost_desc': [(Car.total_cost(), True), (Car.id, True)],
+        'margin_desc': [(margin, True), (Car.id, True)],
+        'margin_asc': [(margin, False), (Car.id, False)],
+    }
+    return sort_options.get(sort, [(Car.created_at, True), (Car.id, True)])
+
+def _search_criterion(search):
+    """SQL criterion for the free-text car search (None when no search)"""
+    if not search:
+        return None
+    matches = matching_ids('car', search)
+    if matches is not None:
+        return Car.id.in_(matches)
+    return or_(
+        Car.vin.ilike(f'%{search}%'),
+        Car.model.ilike(f'%{search}%'),
+        Car.registration_number.ilike(f'%{search}%')
+    )
+
+def _facet_filters():
+    """Selected facet filters from the current request"""
+    return {field: request.args.get(field, '', type=int if field == 'year' else str)
+            for field in FACET_FIELDS}
+
+def _filtered_cars_query(filters, criterion):
+    """Car query with the facet filters and search criterion of the current request applied"""
+    query = Car.query
+    
+    # Apply filters
+    for field, value in filters.items():
+        if value:
+            query = query.filter(getattr(Car, field) == value)
+    if criterion is not None:
+        query = query.filter(criterion)
+    return query
+
+def _per_page():
+    """Per-page selector (defaults to 20, safe bounds 5-200)"""
+    per_page = request.args.get('per_page', 20, type=int)
+    try:
+        return max(5, min(per_page, 200))
+    except Exception:
+        return 20
+
 @bp.route('/')
 @login_required
+@cached_response(['cars:list'])
 def list_cars():
     """List all cars with filtering"""
     page = request.args.get('page', 1, type=int)
-    # Per-page selector (defaults to 20, safe bounds 5-200)
-    per_page = request.args.get('per_page', 20, type=int)
-    try:
-        per_page = max(5, min(per_page, 200))
-    except Exception:
-        per_page = 20
-    status = request.args.get('status', '')
-    make = request.args.get('make', '')
-    search = request.args.get('search', '')
-    import_country = request.args.get('import_country', '')
-    
-    query = Car.query
-    
-    # Apply filters
-    if status:
-        query = query.filter_by(status=status)
-    if make:
-        query = query.filter_by(make=make)
-    if import_country:
-        query = query.filter_by(import_country=import_country)
-    if search:
-        query = query.filter(
-            or_(
-                Car.vin.ilike(f'%{search}%'),
-                Car.model.ilike(f'%{search}%'),
-                Car.registration_number.ilike(f'%{search}%')
-            )
-        )
-    
-    cars = query.order_by(Car.created_at.desc()).paginate(page=page, per_page=per_page, error_out=False)
+    per_page = _per_page()
+    sort = request.args.get('sort', '')
+    
+    # Built once; the search may query the index, and the facet counts need it too
+    filters = _facet_filters()
+    criterion = _search_criterion(request.args.get('search', ''))
+    query = _filtered_cars_query(filters, criterion)
+    keys = _sort_keys(sort)
+    # Grid cards show each car's primary photo
+    query = with_profile(query, 'grid' if request.args.get('view') == 'grid' else 'list')
+    
+    if wants_keyset():
+        cars = paginate_request(query, keys, per_page=per_page)
+    else:
+        cars = order_by_keys(query, keys).paginate(page=page, per_page=per_page, error_out=False)
     
-    # Get unique makes for filter dropdown
-    makes = db.session.query(Car.make).distinct().order_by(Car.make).all()
-    makes = [m[0] for m in makes]
+    # Per-value counts for the filter dropdowns (served from the facet cache)
+    facets = facet_counts(filters, criterion)
     
     # Preserve current query params for pagination links
     # Build a dict of current filters excluding page
     current_params = {
-        'status': status,
-        'make': make,
-        'search': search,
-        'import_country': import_country,
+        'status': request.args.get('status', ''),
+        'make': request.args.get('make', ''),
+        'search': request.args.get('search', ''),
+        'import_country': request.args.get('import_country', ''),
+        'fuel_type': request.args.get('fuel_type', ''),
+        'year': request.args.get('year', ''),
+        'sort': sort,
         'per_page': per_page,
         'view': request.args.get('view', '')
     }
-    return render_template('cars/list.html', cars=cars, makes=makes, current_params=current_params)
+    return render_template('cars/list.html', cars=cars, facets=facets, current_params=current_params)
+
+@bp.route('/api/list')
+@login_required
+def api_list():
+    """JSON car list with keyset cursors (for infinite scroll)"""
+    query = _filtered_cars_query(_facet_filters(), _search_criterion(request.args.get('search', '')))
+    cars = paginate_request(with_profile(query, 'list'), _sort_keys(request.args.get('sort', '')),
+                            per_page=_per_page())
+    
+    return jsonify({
+        'items': [{
+            'id': car.id,
+            'vin': car.vin,
+            'make': car.make,
+            'model': car.model,
+            'year': car.year,
+            'status': car.status,
+            'import_country': car.import_country,
+            'registration_number': car.registration_number,
+            'selling_price': float(car.selling_price) if car.selling_price is not None else None,
+            'total_cost': round(car.total_cost(), 2),
+            'created_at': car.created_at.isoformat() if car.created_at else None
+        } for car in cars.items],
+        'pagination': cars.to_dict()
+    })
+
+@bp.route('/api/lookup')
+@login_required
+@cached_response(['cars:list'], vary='role')
+def api_lookup():
+    """Typeahead: cars by VIN, registration number or make/model (optionally ?status=...)"""
+    query = Car.query.order_by(Car.make, Car.model, Car.id)
+    statuses = request.args.getlist('status')
+    if statuses:
+        query = query.filter(Car.status.in_(statuses))
+    cars = lookup(query, 'car', (Car.vin, Car.registration_number, Car.make, Car.model),
+                  request.args.get('q', ''), CarOption)
+    
+    return jsonify({
+        'items': [{
+            'id': car.id,
+            'label': f'{car.make} {car.model}',
+            'detail': ' · '.join(filter(None, [car.vin, car.registration_number]))
+        } for car in cars]
+    })
+
+@bp.route('/api/facets')
+@login_required
+def api_facets():
+    """Per-value car counts for the list filters"""
+    facets = facet_counts(_facet_filters(), _search_criterion(request.args.get('search', '')))
+    return jsonify({field: [{'value': value, 'count': count} for value, count in counts.items()]
+                    for field, counts in facets.items()})
 
 @bp.route('/<int:car_id>')
 @login_required
 def view_car(car_id):
     """View car details"""
-    car = Car.query.get_or_404(car_id)
+    car = Car.query.options(*loader_options(Car, 'detail')).get_or_404(car_id)
     return render_template('cars/view.html', car=car)
 
 @bp.route('/add', methods=['GET', 'POST'])
@@ -124,16 +231,7 @@ def add_car():
             # Store ad URL as a document for easy access, if provided
             if ad_url:
                 try:
-                    doc = Document(
-                        car_id=car.id,
-                        name='Annonce Link',
-                        document_type='ad_link',
-                        filename=ad_url,
-                        file_path=ad_url,
-                        mime_type='text/uri-list',
-                        description='Direkte link til annoncen'
-                    )
-                    db.session.add(doc)
+                    db.session.add(_ad_link_document(car, ad_url))
                     db.session.commit()
                 except Exception:
                     db.session.rollback()
@@ -152,6 +250,18 @@ def add_car():
     
     return render_template('cars/add.html')
 
+def _ad_link_document(car, ad_url):
+    """Document keeping the advertisement link with the car"""
+    return Document(
+        car_id=car.id,
+        name='Annonce Link',
+        document_type='ad_link',
+        filename=ad_url,
+        file_path=ad_url,
+        mime_type='text/uri-list',
+        description='Direkte link til annoncen'
+    )
+
 @bp.route('/<int:car_id>/edit', methods=['GET', 'POST'])
 @login_required
 def edit_car(car_id):
@@ -472,36 +582,29 @@ def delete_document(car_id, doc_id):
 
 @bp.route('/api/stats')
 @login_required
+@cached_response(['reports:dashboard'], vary='role')
 def api_stats():
     """API endpoint for car statistics"""
-    total = Car.query.count()
-    available = Car.query.filter_by(status='available').count()
-    sold = Car.query.filter_by(status='sold').count()
-    in_transit = Car.query.filter_by(status='in_transit').count()
+    inventory = get_stats()['inventory']
     
     return jsonify({
-        'total': total,
-        'available': available,
-        'sold': sold,
-        'in_transit': in_transit
+        'total': inventory['total'],
+        'available': inventory['available'],
+        'sold': inventory['sold'],
+        'in_transit': inventory['in_transit']
     })
 
 @bp.route('/parse-ad', methods=['POST'])
 @login_required
 def parse_ad():
-    """Parse advertisement image/PDF or URL and extract car data"""
-    from utils.ocr_parser import AdParser
+    """Queue an advertisement image/PDF or URL for parsing; returns the job id"""
+    from utils.parse_jobs import submit_upload, submit_url
     
     # Check for URL first
     ad_url = request.form.get('ad_url')
     if ad_url:
-        try:
-            data = AdParser.parse_url(ad_url)
-            if 'error' in data:
-                return jsonify({'error': data['error']}), 500
-            return jsonify(data)
-        except Exception as e:
-            return jsonify({'error': str(e)}), 500
+        job = submit_url(ad_url, current_user.id)
+        return _parse_job_response(job), 202
     
     # Check for file upload
     if 'ad_image' not in request.files:
@@ -513,18 +616,233 @@ def parse_ad():
         return jsonify({'error': 'Ingen fil valgt'}), 400
     
     # Check file type
-    allowed_extensions = {'png', 'jpg', 'jpeg', 'gif', 'bmp', 'webp', 'pdf'}
-    if not '.' in file.filename or file.filename.rsplit('.', 1)[1].lower() not in allowed_extensions:
+    if not _is_ad_file(file.filename):
         return jsonify({'error': 'Ugyldig filtype. Brug PNG, JPG, PDF eller andre billedformater'}), 400
     
     try:
-        # Parse the advertisement
-        data = AdParser.parse_from_upload(file)
-        
-        if 'error' in data:
-            return jsonify({'error': data['error']}), 500
-        
-        return jsonify(data)
-        
+        job = submit_upload(file, current_user.id)
+        return _parse_job_response(job), 202
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _is_ad_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in AD_EXTENSIONS
+
+def _parse_job_response(job):
+    data = job.to_dict()
+    data['status_url'] = url_for('cars.parse_job_status', job_id=job.id)
+    data['cancel_url'] = url_for('cars.cancel_parse_job', job_id=job.id)
+    return jsonify(data)
+
+def _get_parse_job(job_id):
+    from models.parse_job import ParseJob
+    job = ParseJob.query.get_or_404(job_id)
+    if job.user_id != current_user.id and not current_user.is_admin():
+        abort(404)
+    return job
+
+@bp.route('/parse-ad/<job_id>')
+@login_required
+def parse_job_status(job_id):
+    """Status of a parse job, with the extracted data once it is done"""
+    from utils.parse_jobs import get_runner
+    
+    job = _get_parse_job(job_id)
+    if not job.is_final:
+        # Make sure this process runs jobs (e.g. left queued by a restart)
+        get_runner()
+    return _parse_job_response(job)
+
+@bp.route('/parse-ad/<job_id>/cancel', methods=['POST'])
+@login_required
+def cancel_parse_job(job_id):
+    """Cancel a queued or running parse job"""
+    from utils.parse_jobs import cancel
+    
+    job = _get_parse_job(job_id)
+    cancel(job)
+    return _parse_job_response(job)
+
+@bp.route('/bulk-import', methods=['GET', 'POST'])
+@login_required
+def bulk_import():
+    """Review screen for many advertisements; POST queues one parse job per link or file"""
+    if request.method == 'GET':
+        return render_template('cars/bulk_import.html',
+                               max_items=current_app.config.get('BULK_IMPORT_MAX_ITEMS', 50))
+    
+    import uuid
+    from utils.parse_jobs import submit_upload, submit_url
+    
+    urls = [line.strip() for line in request.form.get('urls', '').splitlines() if line.strip()]
+    files = [file for file in request.files.getlist('files') if file.filename]
+    if not urls and not files:
+        return jsonify({'error': 'Ingen links eller filer angivet'}), 400
+    max_items = current_app.config.get('BULK_IMPORT_MAX_ITEMS', 50)
+    if len(urls) + len(files) > max_items:
+        return jsonify({'error': f'Højst {max_items} annoncer ad gangen'}), 400
+    invalid = [url for url in urls if not url.lower().startswith(('http://', 'https://'))]
+    invalid += [file.filename for file in files if not _is_ad_file(file.filename)]
+    if invalid:
+        return jsonify({'error': 'Ugyldige links eller filtyper: ' + ', '.join(invalid)}), 400
+    
+    batch_id = uuid.uuid4().hex
+    try:
+        jobs = [submit_url(url, current_user.id, batch_id) for url in urls]
+        jobs += [submit_upload(file, current_user.id, batch_id) for file in files]
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+    return jsonify({
+        'batch_id': batch_id,
+        'jobs': [job.to_dict() for job in jobs],
+        'stream_url': url_for('cars.bulk_import_stream', batch_id=batch_id),
+    }), 202
+
+@bp.route('/bulk-import/<batch_id>/stream')
+@login_required
+def bulk_import_stream(batch_id):
+    """
+    Parse results of a bulk import, each sent as soon as its job ends
+    
+    NDJSON (one job per line) by default; Server-Sent Events ("job" events,
+    then "end") with ?format=sse or Accept: text/event-stream.
+    
+    A response is one short segment (BULK_IMPORT_SEGMENT seconds), so it
+    never holds a worker for long. It ends with {"cursor", "next_url"}
+    (the "end" event's data with SSE); while jobs are still running the
+    client fetches next_url to resume with them.
+    """
+    from models.parse_job import ParseJob
+    from utils.parse_jobs import get_runner, iter_finished
+    
+    query = db.session.query(ParseJob.id).filter(ParseJob.batch_id == batch_id)
+    if not current_user.is_admin():
+        query = query.filter(ParseJob.user_id == current_user.id)
+    job_ids = [job_id for (job_id,) in query.order_by(ParseJob.created_at, ParseJob.id)]
+    if not job_ids:
+        abort(404)
+    # Make sure this process runs jobs (e.g. left queued by a restart)
+    get_runner()
+    
+    # The cursor lists the positions (in job_ids) of the jobs not sent yet
+    pending = job_ids
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            positions = {int(position) for position in cursor.split('.')}
+        except ValueError:
+            return jsonify({'error': 'Ugyldig cursor'}), 400
+        pending = [job_id for position, job_id in enumerate(job_ids) if position in positions]
+    
+    sse = request.args.get('format') == 'sse' or request.accept_mimetypes.best == 'text/event-stream'
+    segment = current_app.config.get('BULK_IMPORT_SEGMENT', 0)
+    
+    def generate():
+        remaining = set(pending)
+        for job in iter_finished(pending, timeout=segment):
+            remaining.discard(job.id)
+            data = json.dumps(job.to_dict(), default=str)
+            yield f'event: job\ndata: {data}\n\n' if sse else data + '\n'
+        next_cursor = '.'.join(str(position) for position, job_id in enumerate(job_ids) if job_id in remaining)
+        end = {'cursor': next_cursor or None, 'next_url': None}
+        if next_cursor:
+            end['next_url'] = url_for('cars.bulk_import_stream', batch_id=batch_id, cursor=next_cursor,
+                                      **({'format': 'sse'} if sse else {}))
+        data = json.dumps(end)
+        yield f'event: end\ndata: {data}\n\n' if sse else data + '\n'
+    
+    return Response(stream_with_context(generate()),
+                    mimetype='text/event-stream' if sse else 'application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def _car_from_import(row):
+    """
+    Car (not yet added) from one reviewed bulk import row
+    
+    Raises:
+        ValueError: With a message for the user when a field is missing or invalid
+    """
+    def number(name, convert=float, default=None):
+        value = row.get(name)
+        if value in (None, ''):
+            return default
+        try:
+            return convert(str(value).replace(' ', '').replace(',', '.'))
+        except ValueError:
+            raise ValueError(f'Ugyldig værdi for {name}: {value}')
+    
+    vin = (row.get('vin') or '').strip().upper()
+    for field, label in (('make', 'Mærke'), ('model', 'Model'), ('import_country', 'Importland')):
+        if not (row.get(field) or '').strip():
+            raise ValueError(f'{label} mangler')
+    if not vin:
+        raise ValueError('VIN mangler')
+    year = number('year', int)
+    price = number('purchase_price')
+    if year is None:
+        raise ValueError('Årgang mangler')
+    if price is None:
+        raise ValueError('Købspris mangler')
+    
+    return Car(
+        vin=vin,
+        make=row['make'].strip(),
+        model=row['model'].strip(),
+        year=year,
+        color=row.get('color') or None,
+        mileage=number('mileage', int, 0),
+        fuel_type=row.get('fuel_type') or None,
+        transmission=row.get('transmission') or None,
+        import_country=row['import_country'].strip(),
+        dealer_name=row.get('dealer_name') or None,
+        dealer_location=row.get('dealer_location') or None,
+        distance_km=number('distance_km', int),
+        purchase_price=price,
+        purchase_currency=row.get('purchase_currency') or 'DKK',
+        transport_cost=number('transport_cost', default=0),
+        preparation_cost=number('preparation_cost', default=0),
+        status='ordered',
+        equipment=row.get('equipment') or None,
+    )
+
+@bp.route('/bulk-create', methods=['POST'])
+@login_required
+def bulk_create():
+    """Create the cars reviewed on the bulk import screen, all in one transaction"""
+    rows = (request.get_json(silent=True) or {}).get('cars') or []
+    if not rows:
+        return jsonify({'error': 'Ingen biler valgt'}), 400
+    
+    # (row index, car, ad link) of every valid row; errors are keyed by row index
+    cars, errors = [], {}
+    for index, row in enumerate(rows):
+        try:
+            cars.append((index, _car_from_import(row), (row.get('ad_url') or '').strip()))
+        except ValueError as e:
+            errors[index] = str(e)
+    
+    # VINs must be new and unique within the batch
+    vins = [car.vin for _, car, _ in cars]
+    existing = {vin for (vin,) in db.session.query(Car.vin).filter(Car.vin.in_(vins))}
+    seen = set()
+    for index, car, _ in cars:
+        if car.vin in existing:
+            errors[index] = f'VIN {car.vin} findes allerede i systemet'
+        elif car.vin in seen:
+            errors[index] = f'VIN {car.vin} står flere gange'
+        seen.add(car.vin)
+    if errors:
+        return jsonify({'error': 'Ret fejlene og prøv igen', 'errors': errors}), 400
+    
+    try:
+        db.session.add_all([car for _, car, _ in cars])
+        db.session.flush()
+        db.session.add_all([_ad_link_document(car, ad_url) for _, car, ad_url in cars if ad_url])
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Fejl ved oprettelse: {str(e)}'}), 500
+    
+    flash(f'{len(cars)} biler tilføjet', 'success')
+    return jsonify({'created': [car.id for _, car, _ in cars], 'redirect_url': url_for('cars.list_cars')})
+
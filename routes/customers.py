@@ -6,16 +6,22 @@ from flask_login import login_required, current_user
 from models.customer import Customer
 from models.document import Communication
 from database import db
+from utils.search_index import matching_ids
+from utils.pagination import wants_keyset, paginate_request
+from utils.cache_utils import cached_response
+from utils.loaders import loader_options, with_profile
+from utils.lookup import lookup
+from utils.projections import CustomerOption
 from datetime import datetime
 from sqlalchemy import or_
 
 bp = Blueprint('customers', __name__, url_prefix='/customers')
 
-@bp.route('/')
-@login_required
-def list_customers():
-    """List all customers"""
-    page = request.args.get('page', 1, type=int)
+# Sort keys as (expression, descending); the id tie-breaker keeps keyset cursors unique
+LIST_SORT_KEYS = [(Customer.name, False), (Customer.id, False)]
+
+def _filtered_customers_query():
+    """Customer query with the list filters from the current request applied"""
     customer_type = request.args.get('type', '')
     search = request.args.get('search', '')
     
@@ -25,30 +31,84 @@ def list_customers():
     if customer_type:
         query = query.filter_by(customer_type=customer_type)
     if search:
-        query = query.filter(
-            or_(
-                Customer.name.ilike(f'%{search}%'),
-                Customer.email.ilike(f'%{search}%'),
-                Customer.company_name.ilike(f'%{search}%'),
-                Customer.cvr.ilike(f'%{search}%')
+        matches = matching_ids('customer', search)
+        if matches is not None:
+            query = query.filter(Customer.id.in_(matches))
+        else:
+            query = query.filter(
+                or_(
+                    Customer.name.ilike(f'%{search}%'),
+                    Customer.email.ilike(f'%{search}%'),
+                    Customer.company_name.ilike(f'%{search}%'),
+                    Customer.cvr.ilike(f'%{search}%')
+                )
             )
-        )
+    return query
+
+@bp.route('/')
+@login_required
+@cached_response(['customers:list', 'sales:list'])
+def list_customers():
+    """List all customers"""
+    page = request.args.get('page', 1, type=int)
+    query = with_profile(_filtered_customers_query(), 'list')
     
-    customers = query.order_by(Customer.name).paginate(page=page, per_page=20, error_out=False)
+    if wants_keyset():
+        customers = paginate_request(query, LIST_SORT_KEYS)
+    else:
+        customers = query.order_by(Customer.name, Customer.id).paginate(page=page, per_page=20, error_out=False)
     
     return render_template('customers/list.html', customers=customers)
 
+@bp.route('/api/list')
+@login_required
+def api_list():
+    """JSON customer list with keyset cursors (for infinite scroll)"""
+    customers = paginate_request(_filtered_customers_query(), LIST_SORT_KEYS)
+    
+    return jsonify({
+        'items': [{
+            'id': customer.id,
+            'name': customer.name,
+            'customer_type': customer.customer_type,
+            'company_name': customer.company_name,
+            'email': customer.email,
+            'phone': customer.phone,
+            'city': customer.city,
+            'is_active': customer.is_active
+        } for customer in customers.items],
+        'pagination': customers.to_dict()
+    })
+
+@bp.route('/api/lookup')
+@login_required
+@cached_response(['customers:list'], vary='role')
+def api_lookup():
+    """Typeahead: customers by name, CVR, email or phone (?active=1 for active ones only)"""
+    query = Customer.query.order_by(Customer.name, Customer.id)
+    if request.args.get('active'):
+        query = query.filter_by(is_active=True)
+    customers = lookup(query, 'customer', (Customer.name, Customer.cvr, Customer.email, Customer.phone),
+                       request.args.get('q', ''), CustomerOption)
+    
+    return jsonify({
+        'items': [{
+            'id': customer.id,
+            'label': customer.name,
+            'detail': ' · '.join(filter(None, [f'CVR: {customer.cvr}' if customer.cvr else None,
+                                               customer.email, customer.phone]))
+        } for customer in customers]
+    })
+
 @bp.route('/<int:customer_id>')
 @login_required
 def view_customer(customer_id):
     """View customer details"""
-    customer = Customer.query.get_or_404(customer_id)
-    
-    # Get customer communications
-    communications = customer.communications.order_by(Communication.created_at.desc()).limit(10).all()
+    customer = Customer.query.options(*loader_options(Customer, 'detail')).get_or_404(customer_id)
     
-    # Get customer sales
-    sales = customer.sales.order_by('created_at desc').limit(10).all()
+    # Newest first, loaded with the customer
+    communications = customer.all_communications[:10]
+    sales = customer.all_sales[:10]
     
     return render_template('customers/view.html', 
                          customer=customer,
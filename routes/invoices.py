@@ -6,6 +6,10 @@ from flask_login import login_required, current_user
 from datetime import datetime, timedelta
 from functools import wraps
 from database import db
+from utils.search_index import matching_ids
+from utils.pagination import wants_keyset, paginate_request
+from utils.cache_utils import cached_response
+from utils.loaders import loader_options, with_profile
 from models.invoice import Invoice, InvoiceLineItem
 from models.customer import Customer
 from models.sale import Sale
@@ -43,12 +47,11 @@ def generate_invoice_number():
     
     return f"{prefix}{new_num:04d}"
 
-@bp.route('/')
-@login_required
-@admin_required
-def list_invoices():
-    """List all invoices"""
-    page = request.args.get('page', 1, type=int)
+# Sort keys as (expression, descending); the id tie-breaker keeps keyset cursors unique
+LIST_SORT_KEYS = [(Invoice.invoice_date, True), (Invoice.id, True)]
+
+def _filtered_invoices_query():
+    """Invoice query with the list filters from the current request applied"""
     status_filter = request.args.get('status', '')
     search = request.args.get('search', '')
     
@@ -59,17 +62,37 @@ def list_invoices():
         query = query.filter_by(status=status_filter)
     
     if search:
-        query = query.filter(
-            db.or_(
-                Invoice.invoice_number.ilike(f'%{search}%'),
-                Invoice.customer_name.ilike(f'%{search}%')
+        matches = matching_ids('invoice', search)
+        if matches is not None:
+            query = query.filter(Invoice.id.in_(matches))
+        else:
+            query = query.filter(
+                db.or_(
+                    Invoice.invoice_number.ilike(f'%{search}%'),
+                    Invoice.customer_name.ilike(f'%{search}%')
+                )
             )
-        )
+    return query
+
+@bp.route('/')
+@login_required
+@admin_required
+@cached_response(['invoices:list', 'customers:list'])
+def list_invoices():
+    """List all invoices"""
+    page = request.args.get('page', 1, type=int)
+    status_filter = request.args.get('status', '')
+    search = request.args.get('search', '')
+    
+    query = with_profile(_filtered_invoices_query(), 'list')
     
     # Pagination
-    invoices = query.order_by(Invoice.invoice_date.desc()).paginate(
-        page=page, per_page=20, error_out=False
-    )
+    if wants_keyset():
+        invoices = paginate_request(query, LIST_SORT_KEYS)
+    else:
+        invoices = query.order_by(Invoice.invoice_date.desc(), Invoice.id.desc()).paginate(
+            page=page, per_page=20, error_out=False
+        )
     
     # Calculate statistics
     stats = {
@@ -89,6 +112,27 @@ def list_invoices():
                          status_filter=status_filter,
                          search=search)
 
+@bp.route('/api/list')
+@login_required
+@admin_required
+def api_list():
+    """JSON invoice list with keyset cursors (for infinite scroll)"""
+    invoices = paginate_request(with_profile(_filtered_invoices_query(), 'list'), LIST_SORT_KEYS)
+    
+    return jsonify({
+        'items': [{
+            'id': invoice.id,
+            'invoice_number': invoice.invoice_number,
+            'customer_name': invoice.get_customer_name(),
+            'invoice_date': invoice.invoice_date.isoformat() if invoice.invoice_date else None,
+            'due_date': invoice.due_date.isoformat() if invoice.due_date else None,
+            'status': invoice.status,
+            'total_amount': float(invoice.total_amount or 0),
+            'currency': invoice.purchase_currency
+        } for invoice in invoices.items],
+        'pagination': invoices.to_dict()
+    })
+
 @bp.route('/create', methods=['GET', 'POST'])
 @login_required
 @admin_required
@@ -167,7 +211,6 @@ def create_invoice():
             flash(f'Fejl ved oprettelse af faktura: {str(e)}', 'danger')
     
     # GET request
-    customers = Customer.query.filter_by(is_active=True).order_by(Customer.name).all()
     settings = CompanySettings.get_settings()
     companies = CompanySettings.query.order_by(CompanySettings.company_name).all()
     # Determine default company (prefer one named like 'GreenMotion')
@@ -179,7 +222,6 @@ def create_invoice():
     today = datetime.utcnow().date()
     
     return render_template('invoices/create.html', 
-                         customers=customers,
                          settings=settings,
                          companies=companies,
                          default_company_id=default_company_id,
@@ -190,8 +232,8 @@ def create_invoice():
 @admin_required
 def invoice_detail(id):
     """View invoice details"""
-    invoice = Invoice.query.get_or_404(id)
-    line_items = invoice.line_items.order_by(InvoiceLineItem.sort_order).all()
+    invoice = Invoice.query.options(*loader_options(Invoice, 'detail')).get_or_404(id)
+    line_items = invoice.all_line_items
     
     return render_template('invoices/detail.html', 
                          invoice=invoice,
@@ -273,14 +315,12 @@ def edit_invoice(id):
             flash(f'Fejl ved opdatering: {str(e)}', 'danger')
     
     # GET request
-    customers = Customer.query.filter_by(is_active=True).order_by(Customer.name).all()
     line_items = invoice.line_items.order_by(InvoiceLineItem.sort_order).all()
     companies = CompanySettings.query.order_by(CompanySettings.company_name).all()
     
     return render_template('invoices/edit.html', 
                          invoice=invoice,
                          line_items=line_items,
-                         customers=customers,
                          companies=companies)
 
 @bp.route('/<int:id>/delete', methods=['POST'])
@@ -334,12 +374,10 @@ def update_status(id, status):
 @admin_required
 def print_invoice(id):
     """Print-friendly invoice view"""
-    invoice = Invoice.query.get_or_404(id)
-    line_items = invoice.line_items.order_by(InvoiceLineItem.sort_order).all()
+    invoice = Invoice.query.options(*loader_options(Invoice, 'detail')).get_or_404(id)
+    line_items = invoice.all_line_items
     settings = CompanySettings.get_settings()
-    selected_company = None
-    if invoice.issuing_company_id:
-        selected_company = CompanySettings.query.get(invoice.issuing_company_id)
+    selected_company = invoice.issuing_company
     
     return render_template('invoices/print.html', 
                          invoice=invoice,
@@ -1,31 +1,65 @@
 """
 Import logistics tracking routes
 """
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required
 from models.logistics import LogisticsEntry
 from models.car import Car
 from database import db
-from datetime import datetime
+from utils.pagination import order_by_keys, wants_keyset, paginate_request
+from utils.cache_utils import cached_response
+from datetime import datetime, date
+from sqlalchemy import func
 
 bp = Blueprint('logistics', __name__, url_prefix='/logistics')
 
-@bp.route('/')
-@login_required
-def list_logistics():
-    """List all logistics entries"""
-    page = request.args.get('page', 1, type=int)
+# Sort keys as (expression, descending); entries without an ETA sort last
+LIST_SORT_KEYS = [(func.coalesce(LogisticsEntry.estimated_arrival, date.max), False), (LogisticsEntry.id, False)]
+
+def _filtered_logistics_query():
+    """Logistics query with the list filters from the current request applied"""
     status = request.args.get('status', '')
     
     query = LogisticsEntry.query
     
     if status:
         query = query.filter_by(status=status)
+    return query
+
+@bp.route('/')
+@login_required
+@cached_response(['logistics:list', 'cars:list'])
+def list_logistics():
+    """List all logistics entries"""
+    page = request.args.get('page', 1, type=int)
+    query = _filtered_logistics_query()
     
-    entries = query.order_by(LogisticsEntry.estimated_arrival).paginate(page=page, per_page=20, error_out=False)
+    if wants_keyset():
+        entries = paginate_request(query, LIST_SORT_KEYS)
+    else:
+        entries = order_by_keys(query, LIST_SORT_KEYS).paginate(page=page, per_page=20, error_out=False)
     
     return render_template('logistics/list.html', entries=entries)
 
+@bp.route('/api/list')
+@login_required
+def api_list():
+    """JSON logistics list with keyset cursors (for infinite scroll)"""
+    entries = paginate_request(_filtered_logistics_query(), LIST_SORT_KEYS)
+    
+    return jsonify({
+        'items': [{
+            'id': entry.id,
+            'car_id': entry.car_id,
+            'transport_company': entry.transport_company,
+            'tracking_number': entry.tracking_number,
+            'origin_location': entry.origin_location,
+            'estimated_arrival': entry.estimated_arrival.isoformat() if entry.estimated_arrival else None,
+            'status': entry.status
+        } for entry in entries.items],
+        'pagination': entries.to_dict()
+    })
+
 @bp.route('/<int:logistics_id>')
 @login_required
 def view_logistics(logistics_id):
@@ -128,9 +162,9 @@ def edit_logistics(logistics_id):
 @login_required
 def tracking_overview():
     """Overview of all shipments in transit"""
-    in_transit = LogisticsEntry.query.filter(
+    in_transit = order_by_keys(LogisticsEntry.query.filter(
         LogisticsEntry.status.in_(['picked_up', 'in_transit', 'customs'])
-    ).order_by(LogisticsEntry.estimated_arrival).all()
+    ), LIST_SORT_KEYS).all()
     
     # Separate delayed shipments
     delayed = [entry for entry in in_transit if entry.is_delayed()]
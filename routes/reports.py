@@ -6,12 +6,19 @@ from flask_login import login_required
 from models.car import Car
 from models.customer import Customer
 from models.sale import Sale
+from models.sales_fact import SalesDailyFact, CustomerSalesTotal
 from database import db
-from sqlalchemy import func, extract
+from utils.dashboard_stats import get_stats
+from utils.cache_utils import cached_response
+from utils.inventory_ageing import AGE_BUCKETS, days_to_sell_stats, stock_age_stats, stock_age_buckets
+from sqlalchemy import func, extract, case
 from datetime import datetime, timedelta
+from collections import namedtuple
 
 bp = Blueprint('reports', __name__, url_prefix='/reports')
 
+MonthlySales = namedtuple('MonthlySales', ['year', 'month', 'count', 'revenue'])
+
 @bp.route('/')
 @login_required
 def dashboard():
@@ -23,11 +30,7 @@ def dashboard():
 def inventory_report():
     """Inventory analysis report"""
     # Total inventory value
-    total_value = db.session.query(func.sum(Car.purchase_price + 
-                                            Car.transport_cost + 
-                                            Car.customs_cost + 
-                                            Car.preparation_cost + 
-                                            Car.other_costs)).filter(Car.status != 'sold').scalar() or 0
+    total_value = db.session.query(func.sum(Car.total_cost())).filter(Car.status != 'sold').scalar() or 0
     
     # Cars by status
     by_status = db.session.query(
@@ -48,19 +51,22 @@ def inventory_report():
         func.count(Car.id).label('count')
     ).group_by(Car.import_country).all()
     
-    # Average time to sell
-    sold_cars = Car.query.filter(Car.status == 'sold', Car.sold_date.isnot(None)).all()
-    avg_days_to_sell = 0
-    if sold_cars:
-        total_days = sum([(car.sold_date - car.created_at).days for car in sold_cars])
-        avg_days_to_sell = total_days / len(sold_cars)
+    # Time to sell and age of current stock (aggregated in SQL)
+    days_to_sell = days_to_sell_stats()
+    stock_age = stock_age_stats()
+    age_buckets = stock_age_buckets()
+    avg_days_to_sell = days_to_sell['mean'] or 0
     
     return render_template('reports/inventory.html',
                          total_value=total_value,
                          by_status=by_status,
                          by_make=by_make,
                          by_country=by_country,
-                         avg_days_to_sell=avg_days_to_sell)
+                         avg_days_to_sell=avg_days_to_sell,
+                         days_to_sell=days_to_sell,
+                         stock_age=stock_age,
+                         age_buckets=age_buckets,
+                         bucket_labels=[label for label, _, _ in AGE_BUCKETS])
 
 @bp.route('/sales')
 @login_required
@@ -70,40 +76,27 @@ def sales_report():
     period = request.args.get('period', '30')  # days
     start_date = datetime.utcnow() - timedelta(days=int(period))
     
-    # Total sales
-    total_sales = Sale.query.filter(
-        Sale.status == 'completed',
-        Sale.completed_date >= start_date
-    ).count()
-    
-    # Total revenue
-    total_revenue = db.session.query(
-        func.sum(Sale.final_price)
-    ).filter(
-        Sale.status == 'completed',
-        Sale.completed_date >= start_date
-    ).scalar() or 0
-    
-    # Total profit
-    completed_sales = Sale.query.filter(
-        Sale.status == 'completed',
-        Sale.completed_date >= start_date
-    ).all()
-    
-    total_profit = sum([sale.profit() or 0 for sale in completed_sales])
+    # Totals from the daily sales facts (one row per day, salesperson and make)
+    totals = db.session.query(
+        func.coalesce(func.sum(SalesDailyFact.sale_count), 0),
+        func.coalesce(func.sum(SalesDailyFact.revenue), 0),
+        func.coalesce(func.sum(SalesDailyFact.profit), 0)
+    ).filter(SalesDailyFact.day >= start_date.date()).one()
+    total_sales = int(totals[0])
+    total_revenue = float(totals[1])
+    total_profit = float(totals[2])
     
     # Average profit margin
     avg_margin = (total_profit / total_revenue * 100) if total_revenue > 0 else 0
     
     # Sales by salesperson
     by_salesperson = db.session.query(
-        Sale.salesperson_id,
-        func.count(Sale.id).label('count'),
-        func.sum(Sale.final_price).label('revenue')
+        SalesDailyFact.salesperson_id,
+        func.sum(SalesDailyFact.sale_count).label('count'),
+        func.sum(SalesDailyFact.revenue).label('revenue')
     ).filter(
-        Sale.status == 'completed',
-        Sale.completed_date >= start_date
-    ).group_by(Sale.salesperson_id).all()
+        SalesDailyFact.day >= start_date.date()
+    ).group_by(SalesDailyFact.salesperson_id).all()
     
     # Sales pipeline
     pipeline_counts = db.session.query(
@@ -112,16 +105,21 @@ def sales_report():
         func.sum(Sale.offered_price).label('potential_value')
     ).filter(Sale.status != 'completed', Sale.status != 'cancelled').group_by(Sale.status).all()
     
-    # Sales by month (last 12 months)
-    monthly_sales = db.session.query(
-        extract('year', Sale.completed_date).label('year'),
-        extract('month', Sale.completed_date).label('month'),
-        func.count(Sale.id).label('count'),
-        func.sum(Sale.final_price).label('revenue')
+    # Sales by month (last 12 months), rolled up from at most 366 daily rows
+    daily = db.session.query(
+        SalesDailyFact.day,
+        func.sum(SalesDailyFact.sale_count),
+        func.sum(SalesDailyFact.revenue)
     ).filter(
-        Sale.status == 'completed',
-        Sale.completed_date >= datetime.utcnow() - timedelta(days=365)
-    ).group_by('year', 'month').order_by('year', 'month').all()
+        SalesDailyFact.day >= (datetime.utcnow() - timedelta(days=365)).date()
+    ).group_by(SalesDailyFact.day).order_by(SalesDailyFact.day).all()
+    months = {}
+    for day, count, revenue in daily:
+        month = months.setdefault((day.year, day.month), {'count': 0, 'revenue': 0})
+        month['count'] += count
+        month['revenue'] += float(revenue or 0)
+    monthly_sales = [MonthlySales(year, month, values['count'], values['revenue'])
+                     for (year, month), values in months.items()]
     
     return render_template('reports/sales.html',
                          total_sales=total_sales,
@@ -137,22 +135,22 @@ def sales_report():
 @login_required
 def customer_report():
     """Customer analysis report"""
-    # Total customers
-    total_customers = Customer.query.count()
-    dealers = Customer.query.filter_by(customer_type='dealer').count()
-    private = Customer.query.filter_by(customer_type='private').count()
-    
-    # Top customers by revenue
+    # Customer counts in one pass
+    total_customers, dealers, private = db.session.query(
+        func.count(Customer.id),
+        func.count(case((Customer.customer_type == 'dealer', 1))),
+        func.count(case((Customer.customer_type == 'private', 1)))
+    ).one()
+    
+    # Top customers by revenue (from the per-customer sales totals)
     top_customers = db.session.query(
         Customer.id,
         Customer.name,
         Customer.customer_type,
-        func.count(Sale.id).label('purchase_count'),
-        func.sum(Sale.final_price).label('total_revenue')
-    ).join(Sale).filter(
-        Sale.status == 'completed'
-    ).group_by(Customer.id, Customer.name, Customer.customer_type).order_by(
-        func.sum(Sale.final_price).desc()
+        CustomerSalesTotal.purchase_count,
+        CustomerSalesTotal.total_revenue
+    ).join(CustomerSalesTotal, CustomerSalesTotal.customer_id == Customer.id).order_by(
+        CustomerSalesTotal.total_revenue.desc()
     ).limit(20).all()
     
     # Customer acquisition by month
@@ -173,28 +171,19 @@ def customer_report():
 
 @bp.route('/api/dashboard-stats')
 @login_required
+@cached_response(['reports:dashboard'], vary='role')
 def api_dashboard_stats():
     """API endpoint for dashboard statistics"""
-    # Current month
-    now = datetime.utcnow()
-    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    stats = get_stats()
+    inventory = stats['inventory']
     
-    stats = {
+    return jsonify({
         'inventory': {
-            'total': Car.query.count(),
-            'available': Car.query.filter_by(status='available').count(),
-            'in_transit': Car.query.filter_by(status='in_transit').count(),
-            'sold_this_month': Car.query.filter(Car.sold_date >= month_start).count()
+            'total': inventory['total'],
+            'available': inventory['available'],
+            'in_transit': inventory['in_transit'],
+            'sold_this_month': inventory['sold_this_month']
         },
-        'sales': {
-            'active': Sale.query.filter(Sale.status.in_(['lead', 'offer_sent', 'negotiation', 'contract_signed', 'payment_pending'])).count(),
-            'completed_this_month': Sale.query.filter(Sale.completed_date >= month_start).count(),
-            'revenue_this_month': db.session.query(func.sum(Sale.final_price)).filter(Sale.completed_date >= month_start).scalar() or 0
-        },
-        'customers': {
-            'total': Customer.query.count(),
-            'new_this_month': Customer.query.filter(Customer.created_at >= month_start).count()
-        }
-    }
-    
-    return jsonify(stats)
+        'sales': stats['sales'],
+        'customers': stats['customers']
+    })
@@ -7,39 +7,105 @@ from models.sale import Sale
 from models.car import Car
 from models.customer import Customer
 from database import db
+from utils.pagination import wants_keyset, paginate_request
+from utils.cache_utils import cached_response
+from utils.loaders import loader_options, with_profile
+from utils.lookup import LIMIT as LOOKUP_LIMIT, match_criterion
+from utils.projections import fetch, SaleOption
 from datetime import datetime
+from sqlalchemy import or_
 
 bp = Blueprint('sales', __name__, url_prefix='/sales')
 
+SALE_NUMBER_FORMAT = 'SALE-{:06d}'
+
 def generate_sale_number():
     """Generate unique sale number"""
     last_sale = Sale.query.order_by(Sale.id.desc()).first()
     if last_sale:
         last_num = int(last_sale.sale_number.split('-')[1])
-        return f'SALE-{last_num + 1:06d}'
-    return 'SALE-000001'
+        return SALE_NUMBER_FORMAT.format(last_num + 1)
+    return SALE_NUMBER_FORMAT.format(1)
 
-@bp.route('/')
-@login_required
-def list_sales():
-    """List all sales"""
-    page = request.args.get('page', 1, type=int)
+# Sort keys as (expression, descending); the id tie-breaker keeps keyset cursors unique
+LIST_SORT_KEYS = [(Sale.created_at, True), (Sale.id, True)]
+
+def _filtered_sales_query():
+    """Sale query with the list filters from the current request applied"""
     status = request.args.get('status', '')
     
     query = Sale.query
     
     if status:
         query = query.filter_by(status=status)
+    return query
+
+@bp.route('/')
+@login_required
+@cached_response(['sales:list', 'cars:list', 'customers:list'])
+def list_sales():
+    """List all sales"""
+    page = request.args.get('page', 1, type=int)
+    query = with_profile(_filtered_sales_query(), 'list')
     
-    sales = query.order_by(Sale.created_at.desc()).paginate(page=page, per_page=20, error_out=False)
+    if wants_keyset():
+        sales = paginate_request(query, LIST_SORT_KEYS)
+    else:
+        sales = query.order_by(Sale.created_at.desc(), Sale.id.desc()).paginate(page=page, per_page=20, error_out=False)
     
     return render_template('sales/list.html', sales=sales)
 
+@bp.route('/api/list')
+@login_required
+def api_list():
+    """JSON sales list with keyset cursors (for infinite scroll)"""
+    sales = paginate_request(_filtered_sales_query(), LIST_SORT_KEYS)
+    
+    return jsonify({
+        'items': [{
+            'id': sale.id,
+            'sale_number': sale.sale_number,
+            'status': sale.status,
+            'car_id': sale.car_id,
+            'customer_id': sale.customer_id,
+            'price': float(sale.final_price or sale.offered_price or sale.list_price or 0),
+            'created_at': sale.created_at.isoformat() if sale.created_at else None
+        } for sale in sales.items],
+        'pagination': sales.to_dict()
+    })
+
+@bp.route('/api/lookup')
+@login_required
+@cached_response(['sales:list', 'cars:list', 'customers:list'], vary='role')
+def api_lookup():
+    """Typeahead: sales by number, customer or car (optionally ?status=...)"""
+    text = request.args.get('q', '').strip()
+    query = Sale.query.join(Sale.customer).join(Sale.car).order_by(Sale.created_at.desc(), Sale.id.desc())
+    statuses = request.args.getlist('status')
+    if statuses:
+        query = query.filter(Sale.status.in_(statuses))
+    if text:
+        criteria = [Sale.sale_number.startswith(text.upper(), autoescape=True)]
+        if text.isdigit():
+            # "123" finds SALE-000123
+            criteria.append(Sale.sale_number == SALE_NUMBER_FORMAT.format(int(text)))
+        for id_column, entity_type, columns in ((Sale.customer_id, 'customer', (Customer.name,)),
+                                                (Sale.car_id, 'car', (Car.make, Car.model, Car.vin))):
+            criterion = match_criterion(id_column, entity_type, columns, text)
+            if criterion is not None:
+                criteria.append(criterion)
+        query = query.filter(or_(*criteria))
+    sales = fetch(query.limit(LOOKUP_LIMIT), SaleOption, customer_name=Customer.name)
+    
+    return jsonify({
+        'items': [{'id': sale.id, 'label': sale.sale_number, 'detail': sale.customer_name} for sale in sales]
+    })
+
 @bp.route('/<int:sale_id>')
 @login_required
 def view_sale(sale_id):
     """View sale details"""
-    sale = Sale.query.get_or_404(sale_id)
+    sale = Sale.query.options(*loader_options(Sale, 'detail')).get_or_404(sale_id)
     return render_template('sales/view.html', sale=sale)
 
 @bp.route('/add', methods=['GET', 'POST'])
@@ -87,11 +153,8 @@ def add_sale():
             db.session.rollback()
             flash(f'Fejl ved oprettelse af salg: {str(e)}', 'danger')
     
-    # Get available cars and customers for form
-    cars = Car.query.filter(Car.status.in_(['available', 'reserved'])).all()
-    customers = Customer.query.filter_by(is_active=True).order_by(Customer.name).all()
-    
-    return render_template('sales/add.html', cars=cars, customers=customers)
+    # Cars and customers are picked through the lookup endpoints
+    return render_template('sales/add.html')
 
 @bp.route('/<int:sale_id>/edit', methods=['GET', 'POST'])
 @login_required
@@ -188,11 +251,12 @@ def record_payment(sale_id):
 @login_required
 def pipeline():
     """Sales pipeline view"""
-    leads = Sale.query.filter_by(status='lead').order_by(Sale.created_at.desc()).all()
-    offers = Sale.query.filter_by(status='offer_sent').order_by(Sale.offer_date.desc()).all()
-    negotiations = Sale.query.filter_by(status='negotiation').order_by(Sale.created_at.desc()).all()
-    contracts = Sale.query.filter_by(status='contract_signed').order_by(Sale.contract_date.desc()).all()
-    pending = Sale.query.filter_by(status='payment_pending').order_by(Sale.created_at.desc()).all()
+    pipeline_query = with_profile(Sale.query, 'list')
+    leads = pipeline_query.filter_by(status='lead').order_by(Sale.created_at.desc()).all()
+    offers = pipeline_query.filter_by(status='offer_sent').order_by(Sale.offer_date.desc()).all()
+    negotiations = pipeline_query.filter_by(status='negotiation').order_by(Sale.created_at.desc()).all()
+    contracts = pipeline_query.filter_by(status='contract_signed').order_by(Sale.contract_date.desc()).all()
+    pending = pipeline_query.filter_by(status='payment_pending').order_by(Sale.created_at.desc()).all()
     
     return render_template('sales/pipeline.html',
                          leads=leads,
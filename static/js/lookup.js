@@ -0,0 +1,111 @@
+// Typeahead fields from templates/_lookup.html: the visible box searches the
+// field's /api/lookup endpoint, the hidden input holds the chosen id.
+(function(){
+  const DELAY = 200;
+
+  function init(root){
+    const hidden = root.querySelector('input[type=hidden]');
+    const input = root.querySelector('.lookup-input');
+    const results = root.querySelector('.lookup-results');
+    let chosenLabel = input.value;
+    let timer = null;
+    let controller = null;
+    let active = -1;
+
+    function validate(){
+      const missing = root.hasAttribute('data-required') && !hidden.value;
+      input.setCustomValidity(missing ? 'Vælg en post fra listen' : '');
+    }
+
+    function close(){
+      results.innerHTML = '';
+      active = -1;
+    }
+
+    function choose(item){
+      hidden.value = item.id;
+      chosenLabel = input.value = item.label;
+      close();
+      validate();
+      hidden.dispatchEvent(new Event('change'));
+    }
+
+    function highlight(index){
+      const buttons = results.querySelectorAll('button');
+      if(!buttons.length) return;
+      active = (index + buttons.length) % buttons.length;
+      buttons.forEach((button, i) => button.classList.toggle('active', i === active));
+    }
+
+    function render(items){
+      close();
+      if(!items.length){
+        const empty = document.createElement('div');
+        empty.className = 'list-group-item text-muted small';
+        empty.textContent = 'Ingen resultater';
+        results.appendChild(empty);
+        return;
+      }
+      items.forEach(item => {
+        const button = document.createElement('button');
+        button.type = 'button';
+        button.className = 'list-group-item list-group-item-action';
+        button.textContent = item.label;
+        if(item.detail){
+          const detail = document.createElement('small');
+          detail.className = 'd-block text-muted';
+          detail.textContent = item.detail;
+          button.appendChild(detail);
+        }
+        // mousedown fires before the input's blur closes the list
+        button.addEventListener('mousedown', event => {
+          event.preventDefault();
+          choose(item);
+        });
+        results.appendChild(button);
+      });
+    }
+
+    function search(){
+      if(controller) controller.abort();
+      controller = new AbortController();
+      const url = new URL(root.dataset.lookupUrl, window.location.origin);
+      url.searchParams.set('q', input.value.trim());
+      fetch(url, {signal: controller.signal, credentials: 'same-origin'})
+        .then(response => response.json())
+        .then(data => { if(document.activeElement === input) render(data.items); })
+        .catch(() => {});
+    }
+
+    input.addEventListener('input', () => {
+      // Editing the text drops the earlier choice
+      if(hidden.value && input.value !== chosenLabel){
+        hidden.value = '';
+        hidden.dispatchEvent(new Event('change'));
+      }
+      validate();
+      clearTimeout(timer);
+      timer = setTimeout(search, DELAY);
+    });
+    input.addEventListener('focus', search);
+    input.addEventListener('blur', close);
+    input.addEventListener('keydown', event => {
+      const buttons = results.querySelectorAll('button');
+      if(event.key === 'ArrowDown'){
+        event.preventDefault();
+        highlight(active + 1);
+      } else if(event.key === 'ArrowUp'){
+        event.preventDefault();
+        highlight(active - 1);
+      } else if(event.key === 'Enter' && active >= 0 && buttons[active]){
+        event.preventDefault();
+        buttons[active].dispatchEvent(new Event('mousedown'));
+      } else if(event.key === 'Escape'){
+        close();
+      }
+    });
+    validate();
+  }
+
+  document.querySelectorAll('.lookup').forEach(init);
+})();
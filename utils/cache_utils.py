@@ -1,25 +1,207 @@
 """
 Caching utilities and decorators
+
+Cache entries can carry tags such as ``car:123``, ``cars:list`` or
+``reports:dashboard``. When a transaction that changed a model commits, the
+tags for the changed rows are invalidated, deleting only the entries that
+depend on them. Tags may be invalidated by pattern (``reports:*``).
+
+With a Redis cache the tag -> keys index lives in Redis sets, shared by all
+workers; with other backends it is kept in process.
+
+``cached_response`` builds on this for views: it stores the rendered body per
+user (or role) and answers ``If-None-Match`` with 304 Not Modified. Every tag
+also has a version token, replaced whenever the tag is invalidated; a
+response's ETag is derived from the versions of its tags, so a 304 needs
+neither the cached body nor a render.
 """
+from fnmatch import fnmatchcase
 from functools import wraps
-from flask import request
-from app import cache
+import hashlib
+import threading
+import time
+import uuid
+from flask import current_app, request, session, make_response
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from database import cache
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Redis tag sets outlive the entries they point to; stale keys are harmless
+TAG_SET_TTL = 24 * 3600
+
+# Session.info key collecting the tags touched by the current transaction
+_PENDING_TAGS = 'cache_tags'
+
+# Cache key prefix of the per-tag version tokens
+VERSION_PREFIX = 'tagver:'
+
+class LocalTagIndex:
+    """In-process tag index (SimpleCache and other per-process backends)"""
+
+    def __init__(self):
+        self._tags = {}
+        self._lock = threading.Lock()
+
+    def add(self, key, tags):
+        with self._lock:
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+
+    def pop(self, patterns):
+        """Remove the given tags (or tag patterns) and return their keys"""
+        keys = set()
+        with self._lock:
+            for pattern in patterns:
+                for tag in [t for t in self._tags if fnmatchcase(t, pattern)]:
+                    keys |= self._tags.pop(tag)
+        return keys
+
+    def clear(self):
+        with self._lock:
+            self._tags.clear()
+
+class RedisTagIndex:
+    """Tag index stored as one Redis set of cache keys per tag"""
+
+    def __init__(self, backend):
+        self._client = backend._write_client
+        self._prefix = f"{backend.key_prefix or ''}tag:"
+
+    def add(self, key, tags):
+        pipe = self._client.pipeline()
+        for tag in tags:
+            pipe.sadd(self._prefix + tag, key)
+            pipe.expire(self._prefix + tag, TAG_SET_TTL)
+        pipe.execute()
+
+    def pop(self, patterns):
+        """Remove the given tags (or tag patterns) and return their keys"""
+        set_keys = set()
+        for pattern in patterns:
+            if any(c in pattern for c in '*?['):
+                set_keys.update(self._client.scan_iter(match=self._prefix + pattern))
+            else:
+                set_keys.add(self._prefix + pattern)
+        if not set_keys:
+            return set()
+
+        pipe = self._client.pipeline()
+        for set_key in set_keys:
+            pipe.smembers(set_key)
+        members = pipe.execute()
+        self._client.delete(*set_keys)
+        return {k.decode() if isinstance(k, bytes) else k for group in members for k in group}
+
+    def clear(self):
+        keys = list(self._client.scan_iter(match=self._prefix + '*'))
+        if keys:
+            self._client.delete(*keys)
+
+def _tag_index():
+    """Tag index for the current app (created on first use)"""
+    index = current_app.extensions.get('cache_tags')
+    if index is None:
+        backend = cache.cache
+        if 'redis' in str(current_app.config.get('CACHE_TYPE', '')).lower() and hasattr(backend, '_write_client'):
+            index = RedisTagIndex(backend)
+        else:
+            index = LocalTagIndex()
+        current_app.extensions['cache_tags'] = index
+    return index
+
+def set_tagged(key, value, tags=(), timeout=None):
+    """
+    Store a value in the cache and register it under the given tags
+
+    Args:
+        key: Cache key
+        value: Value to cache
+        tags: Iterable of tags the value depends on
+        timeout: Cache timeout in seconds (None = CACHE_DEFAULT_TIMEOUT)
+
+    Returns:
+        True if the value was stored
+    """
+    try:
+        cache.set(key, value, timeout=timeout)
+        if tags:
+            _tag_index().add(key, tags)
+        return True
+    except Exception as e:
+        logger.warning(f"Cache set failed: {str(e)}")
+        return False
+
+def invalidate_tags(*tags):
+    """
+    Delete all cache entries registered under the given tags
+
+    Args:
+        tags: Tags or tag patterns (e.g. 'car:12', 'reports:*')
+
+    Returns:
+        Number of deleted keys
+    """
+    if not tags:
+        return 0
+    try:
+        _bump_versions(tags)
+        keys = _tag_index().pop(tags)
+        if keys:
+            cache.delete_many(*keys)
+        logger.debug(f"Invalidated {len(keys)} cache keys for tags {sorted(tags)}")
+        return len(keys)
+    except Exception as e:
+        logger.error(f"Cache invalidation failed for {tags}: {str(e)}")
+        return 0
+
+def _version_names(tags):
+    """Versions a response with these tags depends on: each tag, its 'namespace:*' and '*'"""
+    names = {'*'}
+    for tag in tags:
+        names.add(tag)
+        if ':' in tag:
+            names.add(tag.split(':', 1)[0] + ':*')
+    return sorted(names)
+
+def _bump_versions(tags):
+    """Replace the version tokens of invalidated tags"""
+    for tag in tags:
+        namespace = tag[:-2] if tag.endswith(':*') else tag
+        if any(c in namespace for c in '*?['):
+            # Any other pattern could match any tag
+            tag = '*'
+        # Random rather than counted, so a version lost from the cache never comes back
+        cache.set(VERSION_PREFIX + tag, uuid.uuid4().hex, timeout=0)
+
+def tag_versions(tags):
+    """Current version tokens for a list of tags (missing ones are created)"""
+    keys = [VERSION_PREFIX + name for name in _version_names(tags)]
+    versions = []
+    for key, version in zip(keys, cache.get_many(*keys)):
+        if version is None:
+            # add() keeps the token of a worker that got there first
+            cache.add(key, uuid.uuid4().hex, timeout=0)
+            version = cache.get(key) or ''
+        versions.append(version)
+    return versions
+
 def cache_key_prefix():
     """Generate cache key prefix based on current user"""
     # Include user-specific info if needed for personalized caching
     return f"view_{request.endpoint}_{request.args.to_dict()}"
 
-def cached(timeout=300, key_prefix=None):
+def cached(timeout=300, key_prefix=None, tags=None):
     """
     Caching decorator for view functions
-    
+
     Args:
         timeout: Cache timeout in seconds (default: 300 = 5 minutes)
         key_prefix: Custom cache key prefix (default: auto-generated)
+        tags: Tags the cached value depends on (e.g. ['cars:list'])
     """
     def decorator(f):
         @wraps(f)
@@ -29,7 +211,7 @@ def cached(timeout=300, key_prefix=None):
                 cache_key = f"{key_prefix}_{args}_{kwargs}"
             else:
                 cache_key = cache_key_prefix()
-            
+
             # Try to get from cache
             try:
                 rv = cache.get(cache_key)
@@ -38,36 +220,129 @@ def cached(timeout=300, key_prefix=None):
                     return rv
             except Exception as e:
                 logger.warning(f"Cache get failed: {str(e)}")
-            
+
             # Cache miss - execute function
             logger.debug(f"Cache miss: {cache_key}")
             rv = f(*args, **kwargs)
-            
+
             # Store in cache
+            set_tagged(cache_key, rv, tags or (), timeout=timeout)
+
+            return rv
+        return decorated_function
+    return decorator
+
+# Response headers kept with a cached body (never cookies)
+RESPONSE_HEADERS = ('Content-Type',)
+
+def _response_cache_key(vary):
+    """Cache key for the current GET request, per user or per role"""
+    if not current_user.is_authenticated:
+        who = 'anonymous'
+    elif vary == 'role':
+        who = f"role:{current_user.role}"
+    else:
+        who = f"user:{current_user.get_id()}"
+    args = sorted(request.args.items(multi=True))
+    digest = hashlib.sha1(repr(args).encode()).hexdigest()
+    return f"response:{request.endpoint}:{who}:{digest}"
+
+def _response_etag(cache_key, tags, timeout):
+    """
+    Strong ETag of a cached view's response, from its tags' versions
+
+    The cache key covers the endpoint, arguments and user or role. The
+    timeout window is part of it too, so pages that also show the time (ages,
+    "today") are re-rendered as often as the cache would expire them.
+    """
+    window = int(time.time() // timeout) if timeout else 0
+    parts = [cache_key, current_app.config.get('RELEASE', ''), str(window)] + tag_versions(tags)
+    return hashlib.sha1('\0'.join(parts).encode()).hexdigest()
+
+def _finish(response, etag):
+    response.set_etag(etag)
+    # Browsers must revalidate, but may reuse their copy after a 304
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    return response
+
+def _conditional_response(entry):
+    """Build a response from a cache entry; 304 when the client's ETag matches"""
+    response = make_response(entry['body'])
+    for name, value in entry['headers']:
+        response.headers[name] = value
+    return _finish(response, entry['etag']).make_conditional(request)
+
+def cached_response(tags, timeout=300, vary='user'):
+    """
+    Response cache for GET views behind @login_required
+
+    Stores the serialized body and content type (not the response object) per
+    user, or per role for data every user of a role sees alike. The strong
+    ETag comes from the versions of the tags, so a client revalidating with
+    If-None-Match gets a 304 before the cache entry is even read, and the
+    view only renders after one of its tags was invalidated.
+
+    Args:
+        tags: Cache tags the response depends on (e.g. ['cars:list'])
+        timeout: Cache timeout in seconds
+        vary: 'user' (default) or 'role'
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            # Pending flash messages are rendered once, so those pages are never cached
+            if request.method != 'GET' or session.get('_flashes'):
+                return f(*args, **kwargs)
+
+            cache_key = _response_cache_key(vary)
             try:
-                cache.set(cache_key, rv, timeout=timeout)
+                etag = _response_etag(cache_key, tags, timeout)
             except Exception as e:
-                logger.warning(f"Cache set failed: {str(e)}")
-            
-            return rv
+                logger.warning(f"Cache get failed: {str(e)}")
+                return f(*args, **kwargs)
+            if etag in request.if_none_match:
+                return _finish(make_response('', 304), etag)
+
+            try:
+                entry = cache.get(cache_key)
+            except Exception as e:
+                logger.warning(f"Cache get failed: {str(e)}")
+                entry = None
+
+            # An entry rendered before the last invalidation of its tags carries an older ETag
+            if entry is None or entry.get('etag') != etag:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200 or response.direct_passthrough:
+                    return response
+                body = response.get_data()
+                entry = {
+                    'body': body,
+                    'headers': [(name, response.headers[name]) for name in RESPONSE_HEADERS
+                                if name in response.headers],
+                    'etag': etag
+                }
+                set_tagged(cache_key, entry, tags, timeout=timeout)
+
+            return _conditional_response(entry)
         return decorated_function
     return decorator
 
 def invalidate_cache(key_pattern=None):
     """
     Invalidate cache entries
-    
+
     Args:
-        key_pattern: Pattern to match cache keys (None = clear all)
+        key_pattern: Tag or tag pattern to invalidate, e.g. 'car:12' or
+                     'reports:*' (None = clear all)
     """
     try:
         if key_pattern:
-            # For Redis backend, we could use pattern matching
-            # For simple backend, just clear all
-            cache.clear()
-            logger.info(f"Cache cleared for pattern: {key_pattern}")
+            count = invalidate_tags(key_pattern)
+            logger.info(f"Cache invalidated for pattern: {key_pattern} ({count} keys)")
         else:
             cache.clear()
+            _tag_index().clear()
             logger.info("All cache cleared")
         return True
     except Exception as e:
@@ -86,3 +361,57 @@ def cache_stats():
     except Exception as e:
         logger.error(f"Failed to get cache stats: {str(e)}")
         return {}
+
+def _model_tags():
+    """Map model classes to a function returning the cache tags a row affects"""
+    from models.car import Car
+    from models.customer import Customer
+    from models.sale import Sale
+    from models.logistics import LogisticsEntry
+    from models.document import Document, Communication
+    from models.invoice import Invoice, InvoiceLineItem
+    from models.calendar_event import CalendarEvent
+    from models.user import User
+    return {
+        Car: lambda car: [f'car:{car.id}', 'cars:list', 'cars:facets', 'reports:*'],
+        Sale: lambda sale: [f'sale:{sale.id}', 'sales:list', 'sales:pipeline', f'car:{sale.car_id}',
+                            f'customer:{sale.customer_id}', 'reports:*'],
+        Customer: lambda customer: [f'customer:{customer.id}', 'customers:list', 'reports:*'],
+        LogisticsEntry: lambda entry: [f'car:{entry.car_id}', 'logistics:list'],
+        # Car photos are shown in the car list grid
+        Document: lambda doc: [f'car:{doc.car_id}', f'customer:{doc.customer_id}', 'cars:list'],
+        Communication: lambda comm: [f'customer:{comm.customer_id}'],
+        Invoice: lambda invoice: [f'invoice:{invoice.id}', 'invoices:list'],
+        InvoiceLineItem: lambda item: [f'invoice:{item.invoice_id}', 'invoices:list'],
+        CalendarEvent: lambda event: ['calendar:events'],
+        User: lambda user: [f'user:{user.id}', 'calendar:events'],
+    }
+
+def tags_for(obj, model_tags=None):
+    """Cache tags affected by a change to a model instance"""
+    tagger = (model_tags or _model_tags()).get(type(obj))
+    if tagger is None:
+        return []
+    return [tag for tag in tagger(obj) if not tag.endswith(':None')]
+
+def _after_flush(session, flush_context):
+    """Collect the tags of flushed rows; they are invalidated once the transaction commits"""
+    model_tags = _model_tags()
+    pending = session.info.setdefault(_PENDING_TAGS, set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        pending.update(tags_for(obj, model_tags))
+
+def _after_commit(session):
+    tags = session.info.pop(_PENDING_TAGS, None)
+    if tags:
+        invalidate_tags(*tags)
+
+def _after_rollback(session):
+    session.info.pop(_PENDING_TAGS, None)
+
+def init_cache_tags(app):
+    """Register the session hooks that invalidate tagged cache entries on commit"""
+    if not event.contains(Session, 'after_flush', _after_flush):
+        event.listen(Session, 'after_flush', _after_flush)
+        event.listen(Session, 'after_commit', _after_commit)
+        event.listen(Session, 'after_rollback', _after_rollback)
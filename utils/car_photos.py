@@ -0,0 +1,103 @@
+"""
+Primary photo per car
+
+The list grid shows one photo per car. Rather than loading every car's
+documents to pick one, ``cars.primary_photo_id`` points at the photo to show:
+the car's first document of type ``photo``, or failing that its first
+``image``. It is recomputed from a session ``after_flush`` hook for every car
+whose documents were added, changed or deleted, so the grid can eager-load
+exactly one document per car (see utils.loaders).
+"""
+import logging
+from sqlalchemy import case, event, select, update
+from sqlalchemy.orm import Session
+from database import db
+from utils.flush_hooks import in_savepoint
+
+logger = logging.getLogger(__name__)
+
+# Document types that can be shown as a car's photo, in order of preference
+PHOTO_TYPES = ('photo', 'image')
+
+
+def _primary_photo_subquery():
+    """Correlated scalar subquery: id of the photo to show for cars.id"""
+    from models.car import Car
+    from models.document import Document
+
+    preference = case(
+        *[(Document.document_type == kind, rank) for rank, kind in enumerate(PHOTO_TYPES)],
+        else_=len(PHOTO_TYPES)
+    )
+    return (
+        select(Document.id)
+        .where(Document.car_id == Car.id, Document.document_type.in_(PHOTO_TYPES))
+        .order_by(preference, Document.id)
+        .limit(1)
+        .scalar_subquery()
+    )
+
+
+def _update_statement(car_ids=None):
+    from models.car import Car
+
+    cars = Car.__table__
+    # Setting updated_at to itself keeps its onupdate from re-stamping the car
+    statement = update(cars).values(primary_photo_id=_primary_photo_subquery(), updated_at=cars.c.updated_at)
+    if car_ids is not None:
+        statement = statement.where(cars.c.id.in_(car_ids))
+    return statement
+
+
+def _committed_car_id(document):
+    """car_id of a document as it was before the pending changes"""
+    history = db.inspect(document).attrs.car_id.history
+    return history.deleted[0] if history.deleted else None
+
+
+def _after_flush(session, flush_context):
+    """Recompute the primary photo of cars whose documents were flushed"""
+    from models.car import Car
+    from models.document import Document
+
+    car_ids = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Document):
+            car_ids.update((obj.car_id, _committed_car_id(obj)))
+    car_ids.discard(None)
+    if not car_ids:
+        return
+
+    if not in_savepoint(session, 'Primary photo update',
+                        lambda connection: connection.execute(_update_statement(sorted(car_ids)))):
+        return
+
+    # The update bypassed the ORM; reload the new value on the next access
+    for car_id in car_ids:
+        car = session.identity_map.get(session.identity_key(Car, car_id))
+        if car is not None:
+            session.expire(car, ['primary_photo_id', 'primary_photo'])
+
+
+def rebuild_primary_photos():
+    """
+    Recompute the primary photo of every car
+
+    Returns:
+        Number of cars updated
+    """
+    with db.engine.begin() as connection:
+        count = connection.execute(_update_statement()).rowcount
+    logger.info(f"Primary photos recomputed for {count} cars")
+    return count
+
+
+def init_car_photos(app):
+    """Register the session hook and the rebuild command"""
+    if not event.contains(Session, 'after_flush', _after_flush):
+        event.listen(Session, 'after_flush', _after_flush)
+
+    @app.cli.command('car-photos-rebuild')
+    def car_photos_rebuild():
+        """Recompute the photo shown for each car in the list grid"""
+        print(f"Updated {rebuild_primary_photos()} cars")
@@ -0,0 +1,115 @@
+"""
+Dashboard statistics aggregator
+
+All KPIs shown on the dashboard and returned by the stats APIs come from one
+statement: a conditional aggregation per table (cars, sales, customers), each
+producing a single row, joined together. The result is cached under the
+``reports:dashboard`` tag, which is invalidated whenever a car, sale or
+customer is committed.
+"""
+import logging
+from datetime import datetime
+from sqlalchemy import case, func, select, true
+from database import db, cache
+from utils.cache_utils import set_tagged, invalidate_tags
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_SALE_STATUSES = ['lead', 'offer_sent', 'negotiation', 'contract_signed', 'payment_pending']
+
+CACHE_KEY = 'dashboard_stats'
+CACHE_TAG = 'reports:dashboard'
+CACHE_TIMEOUT = 600
+
+
+def _count_if(condition):
+    return func.count(case((condition, 1)))
+
+
+def _month_start(now):
+    return now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def compute_stats(now=None):
+    """
+    Compute all dashboard KPIs in a single query
+
+    Args:
+        now: Reference time for the "this month" figures (default: utcnow)
+
+    Returns:
+        Dict with 'inventory', 'sales' and 'customers' sections
+    """
+    from models.car import Car
+    from models.customer import Customer
+    from models.sale import Sale
+
+    month_start = _month_start(now or datetime.utcnow())
+
+    cars = select(
+        func.count().label('total'),
+        _count_if(Car.status == 'available').label('available'),
+        _count_if(Car.status == 'in_transit').label('in_transit'),
+        _count_if(Car.status == 'sold').label('sold'),
+        _count_if(Car.sold_date >= month_start).label('sold_this_month'),
+    ).select_from(Car).subquery()
+
+    sales = select(
+        _count_if(Sale.status.in_(ACTIVE_SALE_STATUSES)).label('active'),
+        _count_if(Sale.completed_date >= month_start).label('completed_this_month'),
+        func.coalesce(func.sum(case((Sale.completed_date >= month_start, Sale.final_price))), 0)
+            .label('revenue_this_month'),
+    ).select_from(Sale).subquery()
+
+    customers = select(
+        func.count().label('total'),
+        _count_if(Customer.created_at >= month_start).label('new_this_month'),
+    ).select_from(Customer).subquery()
+
+    # Each subquery is one row, so the join is a single row as well
+    row = db.session.execute(
+        select(cars, sales, customers)
+        .select_from(cars.join(sales, true()).join(customers, true()))
+    ).one()
+    values = list(row)
+
+    return {
+        'inventory': {
+            'total': values[0],
+            'available': values[1],
+            'in_transit': values[2],
+            'sold': values[3],
+            'sold_this_month': values[4]
+        },
+        'sales': {
+            'active': values[5],
+            'completed_this_month': values[6],
+            'revenue_this_month': float(values[7] or 0)
+        },
+        'customers': {
+            'total': values[8],
+            'new_this_month': values[9]
+        }
+    }
+
+
+def get_stats():
+    """Dashboard KPIs, served from cache when possible"""
+    now = datetime.utcnow()
+    # The month is part of the key so "this month" figures roll over on the 1st
+    key = f"{CACHE_KEY}:{now:%Y-%m}"
+    try:
+        stats = cache.get(key)
+        if stats is not None:
+            return stats
+    except Exception as e:
+        logger.warning(f"Stats cache get failed: {str(e)}")
+
+    stats = compute_stats(now)
+    set_tagged(key, stats, [CACHE_TAG], timeout=CACHE_TIMEOUT)
+    return stats
+
+
+def invalidate():
+    """Drop the cached dashboard KPIs"""
+    invalidate_tags(CACHE_TAG)
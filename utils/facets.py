@@ -0,0 +1,259 @@
+"""
+Facet counts for the car inventory filters
+
+Keeps the number of cars per combination of status, make, import country,
+fuel type and year in the ``car_facet_counts`` table. The counts are adjusted
+from a session ``after_flush`` hook whenever a car is inserted, updated or
+deleted, and the (small) table is cached as a whole under the ``cars:facets``
+tag, so the filter sidebar can show counts for any combination of filters
+without scanning the cars table.
+"""
+import logging
+from collections import Counter
+from sqlalchemy import and_, delete, event, func, insert, literal_column, select, update
+from sqlalchemy.orm import Session
+from database import db, cache
+from utils.cache_utils import set_tagged, invalidate_tags
+from utils.flush_hooks import in_savepoint, keep_history
+
+logger = logging.getLogger(__name__)
+
+FACET_FIELDS = ('status', 'make', 'import_country', 'fuel_type', 'year')
+
+CACHE_KEY = 'car_facets'
+CACHE_TAG = 'cars:facets'
+CACHE_TIMEOUT = 3600
+
+
+def _table():
+    from models.car_facet import CarFacetCount
+    return CarFacetCount.__table__
+
+
+def _normalize(field, value):
+    """Value as stored in the facet table (no NULLs, integer years)"""
+    if field == 'year':
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return 0
+    return value or ''
+
+
+def _key(values):
+    return tuple(_normalize(field, value) for field, value in zip(FACET_FIELDS, values))
+
+
+def _current_key(car):
+    return _key(getattr(car, field) for field in FACET_FIELDS)
+
+
+def _committed_key(car):
+    """Facet key of a car as it was before the pending changes"""
+    attrs = db.inspect(car).attrs
+    values = []
+    for field in FACET_FIELDS:
+        history = attrs[field].history
+        values.append(history.deleted[0] if history.deleted else getattr(car, field))
+    return _key(values)
+
+
+def _insert(dialect):
+    """INSERT construct with ON CONFLICT support for the connection's dialect, if any"""
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert
+
+
+def _apply_deltas(connection, deltas):
+    """Add per-key count deltas to the facet table"""
+    table = _table()
+    dialect_insert = _insert(connection.dialect.name)
+    for key, delta in deltas.items():
+        if not delta:
+            continue
+        values = dict(zip(FACET_FIELDS, key))
+        if delta > 0 and dialect_insert is not None:
+            # One atomic statement, so concurrent flushes cannot both insert the first row
+            stmt = dialect_insert(table).values(count=delta, **values)
+            connection.execute(stmt.on_conflict_do_update(
+                index_elements=list(FACET_FIELDS),
+                set_={'count': table.c.count + stmt.excluded.count},
+            ))
+            continue
+        match = and_(*[table.c[field] == value for field, value in values.items()])
+        result = connection.execute(
+            update(table).where(match).values(count=table.c.count + delta)
+        )
+        if result.rowcount == 0:
+            if delta > 0:
+                connection.execute(insert(table).values(count=delta, **values))
+            else:
+                logger.warning(f"Facet count missing for {key}; run facets-rebuild")
+    connection.execute(delete(table).where(table.c.count <= 0))
+
+
+def _after_flush(session, flush_context):
+    """Adjust facet counts for flushed car inserts, updates and deletes"""
+    from models.car import Car
+
+    deltas = Counter()
+    for obj in session.new:
+        if isinstance(obj, Car):
+            deltas[_current_key(obj)] += 1
+    for obj in session.dirty:
+        if isinstance(obj, Car) and obj not in session.deleted:
+            old, new = _committed_key(obj), _current_key(obj)
+            if old != new:
+                deltas[old] -= 1
+                deltas[new] += 1
+    for obj in session.deleted:
+        if isinstance(obj, Car):
+            deltas[_committed_key(obj)] -= 1
+
+    if not any(deltas.values()):
+        return
+
+    in_savepoint(session, 'Facet count update', lambda connection: _apply_deltas(connection, deltas))
+
+
+def invalidate():
+    """Drop the cached facet counts"""
+    invalidate_tags(CACHE_TAG)
+
+
+def rebuild_facets():
+    """
+    Recount all facets from the cars table
+
+    Returns:
+        Number of facet rows written
+    """
+    from models.car import Car
+
+    table = _table()
+    fuel_type = func.coalesce(Car.fuel_type, literal_column("''"))
+    grouped = select(
+        Car.status, Car.make, Car.import_country, fuel_type, Car.year, func.count()
+    ).group_by(Car.status, Car.make, Car.import_country, fuel_type, Car.year)
+
+    with db.engine.begin() as connection:
+        connection.execute(delete(table))
+        connection.execute(insert(table).from_select(list(FACET_FIELDS) + ['count'], grouped))
+        rows = connection.execute(select(func.count()).select_from(table)).scalar()
+    invalidate()
+    logger.info(f"Car facets rebuilt with {rows} rows")
+    return rows
+
+
+def _cube():
+    """All facet rows as (status, make, import_country, fuel_type, year, count) tuples"""
+    try:
+        rows = cache.get(CACHE_KEY)
+        if rows is not None:
+            return rows
+    except Exception as e:
+        logger.warning(f"Facet cache get failed: {str(e)}")
+
+    table = _table()
+    rows = [tuple(row) for row in db.session.execute(
+        select(*[table.c[field] for field in FACET_FIELDS], table.c.count).where(table.c.count > 0)
+    )]
+
+    set_tagged(CACHE_KEY, rows, [CACHE_TAG], timeout=CACHE_TIMEOUT)
+    return rows
+
+
+def _active_filters(filters):
+    return {field: _normalize(field, value)
+            for field, value in (filters or {}).items()
+            if field in FACET_FIELDS and value not in (None, '')}
+
+
+def _sorted_counts(field, counts):
+    items = sorted(counts.items(), key=lambda item: item[0], reverse=(field == 'year'))
+    return {value: count for value, count in items if value not in ('', 0)}
+
+
+def _counts_from_cube(active):
+    positions = {field: i for i, field in enumerate(FACET_FIELDS)}
+    counts = {field: Counter() for field in FACET_FIELDS}
+    for row in _cube():
+        misses = [field for field, value in active.items() if row[positions[field]] != value]
+        if len(misses) > 1:
+            continue
+        for field in FACET_FIELDS:
+            # A facet ignores its own filter, so the other values stay selectable
+            if not misses or misses == [field]:
+                counts[field][row[positions[field]]] += row[-1]
+    return counts
+
+
+def _counts_from_query(active, criterion):
+    from models.car import Car
+
+    counts = {}
+    for field in FACET_FIELDS:
+        column = getattr(Car, field)
+        others = [getattr(Car, f) == v for f, v in active.items() if f != field]
+        rows = db.session.query(column, func.count()).filter(criterion, *others).group_by(column).all()
+        counts[field] = Counter({_normalize(field, value): count for value, count in rows})
+    return counts
+
+
+def facet_counts(filters=None, criterion=None):
+    """
+    Per-value car counts for each facet, given the currently selected filters
+
+    Each facet is counted with all other filters applied but not its own, so
+    every option shows how many cars selecting it would give.
+
+    Args:
+        filters: Dict of selected facet values, e.g. {'status': 'available', 'year': 2021}
+        criterion: Optional extra SQL criterion on Car (e.g. a text search). The
+                   facet table cannot answer these, so counts are grouped in SQL
+                   over the matching cars instead.
+
+    Returns:
+        Dict mapping each facet field to an ordered {value: count} dict
+    """
+    active = _active_filters(filters)
+    if criterion is not None:
+        counts = _counts_from_query(active, criterion)
+    else:
+        counts = _counts_from_cube(active)
+
+    result = {field: _sorted_counts(field, counts[field]) for field in FACET_FIELDS}
+    # Keep selected values listed even when nothing matches them any more
+    for field, value in active.items():
+        result[field].setdefault(value, 0)
+    return result
+
+
+def init_facets(app):
+    """Create the facet table, fill it on first run and register the session hooks"""
+    with app.app_context():
+        try:
+            table = _table()
+            table.create(db.engine, checkfirst=True)
+            empty = db.session.execute(select(table.c.id).limit(1)).first() is None
+            db.session.remove()
+            if empty and db.inspect(db.engine).has_table('cars'):
+                rebuild_facets()
+        except Exception as e:
+            logger.error(f"Facet setup failed: {str(e)}")
+
+    # The cached table is dropped through its cache tag when a car change commits
+    if not event.contains(Session, 'after_flush', _after_flush):
+        from models.car import Car
+        event.listen(Session, 'after_flush', _after_flush)
+        keep_history(Car, FACET_FIELDS)
+
+    @app.cli.command('facets-rebuild')
+    def facets_rebuild():
+        """Recount the car inventory facets"""
+        print(f"Wrote {rebuild_facets()} facet rows")
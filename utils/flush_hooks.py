@@ -0,0 +1,56 @@
+"""
+Helpers for session ``after_flush`` hooks that maintain derived data
+
+Facet counts, the search index, sales facts and primary photos are written
+from flush hooks, in the same transaction as the change they derive from.
+The hooks compare old and new attribute values, and most of them must not
+abort the change itself when their own write fails.
+"""
+import logging
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+
+def _keep_history(target, value, oldvalue, initiator):
+    """No-op 'set' listener; registered with active_history so old values are loaded"""
+    return value
+
+
+def keep_history(model, fields):
+    """
+    Make assignments to the fields record their committed value
+
+    Setting an expired attribute otherwise leaves its history without the
+    old value, which the hooks need to move a row out of its old group.
+    """
+    for field in fields:
+        attribute = getattr(model, field)
+        if not event.contains(attribute, 'set', _keep_history):
+            event.listen(attribute, 'set', _keep_history, active_history=True)
+
+
+def in_savepoint(session, description, work):
+    """
+    Run work(connection) in a savepoint of the session's transaction
+
+    A failure rolls back only the savepoint and is logged, so the data change
+    that triggered the hook still commits; the derived data's rebuild command
+    repairs it.
+
+    Args:
+        session: Session being flushed
+        description: What work does, for the log (e.g. 'Facet count update')
+        work: Callable taking the session's connection
+
+    Returns:
+        True if work succeeded
+    """
+    try:
+        connection = session.connection()
+        with connection.begin_nested():
+            work(connection)
+        return True
+    except Exception as e:
+        logger.error(f"{description} failed: {str(e)}")
+        return False
@@ -0,0 +1,402 @@
+"""
+Offline gazetteer of German, Swedish and Danish towns and postal codes
+
+Used to estimate the road distance from a dealer's location to Aalborg
+without network access. The source is data/gazetteer_seed.tsv (two-digit
+postal regions, larger towns and hand-checked distances), optionally merged
+with GeoNames postal code dumps (https://download.geonames.org/export/zip/)
+by ``flask gazetteer-build``.
+
+The compiled index is one sorted array of fixed-width records::
+
+    header:  magic b'GZT1', record count (uint32)
+    record:  key (32 bytes, NUL padded), country (2 bytes),
+             latitude and longitude (int32, 1e-5 degrees), road km (uint16)
+
+Keys are ``P<country><postal code>`` and ``N<normalized name>``. The file is
+memory-mapped, so every process shares one copy in the page cache, and a
+lookup is a binary search on the mapped bytes (about 15 probes for the full
+GeoNames set). Postal codes match on their longest known prefix.
+
+Distances not given in the seed are estimated once at build time: great
+circle times a road factor, via the Little Belt bridge for the Danish
+islands and via the Øresund bridge or the Göteborg ferry for Sweden.
+"""
+import logging
+import mmap
+import os
+import re
+import struct
+import tempfile
+import threading
+import unicodedata
+from collections import namedtuple
+from math import asin, cos, radians, sin, sqrt
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEED_PATH = os.path.join(PROJECT_ROOT, 'data', 'gazetteer_seed.tsv')
+DEFAULT_PATH = os.path.join(PROJECT_ROOT, 'data', 'gazetteer.bin')
+
+MAGIC = b'GZT1'
+HEADER = struct.Struct('<4sI')
+RECORD = struct.Struct('<32s2siiH')
+KEY_SIZE = 32
+COORD_SCALE = 100000
+
+# Distances are measured to Aalborg
+ORIGIN = (57.0488, 9.9217)
+EARTH_RADIUS_KM = 6371.0
+
+# Road km per great-circle km
+ROAD_FACTOR = {'DE': 1.1, 'DK': 1.2, 'SE': 1.2}
+# Sweden is reached over the Øresund bridge or the Frederikshavn-Göteborg ferry:
+# (lat, lon, road km from Aalborg to the crossing's far side)
+SWEDEN_GATEWAYS = ((55.605, 13.004, 470), (57.709, 11.975, 330))
+# Funen, Zealand and the other islands (postal codes below 6000) over the Little Belt bridge
+DANISH_ISLANDS_GATEWAY = (55.506, 9.730, 215)
+
+COUNTRY_CODES = {'TYSKLAND': 'DE', 'GERMANY': 'DE', 'DEUTSCHLAND': 'DE',
+                 'SVERIGE': 'SE', 'SWEDEN': 'SE', 'DANMARK': 'DK', 'DENMARK': 'DK'}
+
+# "DE-57074", "D 57074", "598 21", "SE-598 21", "9000"
+POSTAL_PATTERN = re.compile(r'(?<![\d-])(?:\b([A-Z]{1,2})[-\s])?(\d{3}\s?\d{2}|\d{4})(?!\d)')
+POSTAL_PREFIXES = {'D': 'DE', 'DE': 'DE', 'S': 'SE', 'SE': 'SE', 'DK': 'DK'}
+
+Place = namedtuple('Place', ['country', 'lat', 'lon', 'distance_km'])
+
+_gazetteer = None
+_path = None
+_lock = threading.Lock()
+
+
+def normalize(name):
+    """
+    Lookup form of a place name
+
+    Upper case ASCII letters and digits separated by single spaces; umlauts
+    and their transliterations (Ä/AE, Ö/OE/Ø, Ü/UE) map to the same letter,
+    so "München", "Muenchen" and "Munchen" are one key.
+    """
+    text = name.upper().replace('ß', 'SS').replace('Æ', 'AE').replace('Ø', 'OE')
+    text = ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+    text = re.sub(r'[^A-Z0-9]+', ' ', text).strip()
+    return text.replace('AE', 'A').replace('OE', 'O').replace('UE', 'U')
+
+
+def country_code(country):
+    """ISO code for an import country name ('Tyskland', 'Sverige', ...) or code, else None"""
+    if not country:
+        return None
+    country = country.strip().upper()
+    return country if country in ROAD_FACTOR else COUNTRY_CODES.get(country)
+
+
+def great_circle_km(a, b):
+    lat1, lon1, lat2, lon2 = map(radians, (*a, *b))
+    h = sin((lat2 - lat1) / 2) ** 2 + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * asin(sqrt(h))
+
+
+def road_distance(country, lat, lon, postal_code=''):
+    """Estimated road km from Aalborg to a point"""
+    factor = ROAD_FACTOR.get(country, 1.2)
+    if country == 'SE':
+        return round(min(km + factor * great_circle_km(gateway, (lat, lon))
+                         for *gateway, km in SWEDEN_GATEWAYS))
+    if country == 'DK' and postal_code and postal_code[0] in '12345':
+        *gateway, km = DANISH_ISLANDS_GATEWAY
+        return round(km + factor * great_circle_km(gateway, (lat, lon)))
+    return round(factor * great_circle_km(ORIGIN, (lat, lon)))
+
+
+def _key(kind, text):
+    return (kind + text).encode('ascii', 'ignore')[:KEY_SIZE]
+
+
+def read_seed(path=SEED_PATH):
+    """
+    Rows of the seed file
+
+    Yields:
+        (country, [postal prefixes], [names], lat, lon, distance_km or None)
+    """
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip() or line.startswith('#'):
+                continue
+            fields = line.rstrip('\n').split('\t')
+            country, prefixes, names, lat, lon = fields[:5]
+            distance = fields[5] if len(fields) > 5 else ''
+            yield (country, [p for p in prefixes.split(',') if p], names.split(','),
+                   float(lat), float(lon), int(distance) if distance else None)
+
+
+def read_geonames(path):
+    """
+    Rows of a GeoNames postal code dump (tab separated: country, code, place, ..., lat, lon, accuracy)
+
+    Yields:
+        Rows in the read_seed format, one per postal code
+    """
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            fields = line.rstrip('\n').split('\t')
+            if len(fields) < 11 or not fields[9] or not fields[10]:
+                continue
+            yield (fields[0], [fields[1].replace(' ', '')], [fields[2]],
+                   float(fields[9]), float(fields[10]), None)
+
+
+def build(rows):
+    """
+    Compile gazetteer rows into the binary index
+
+    Earlier rows win when a key repeats within a country, so the seed
+    (with its checked distances) should come first.
+
+    Returns:
+        The index as bytes
+    """
+    records = {}
+    for country, prefixes, names, lat, lon, distance in rows:
+        lat_e5, lon_e5 = round(lat * COORD_SCALE), round(lon * COORD_SCALE)
+        keys = [_key('P', country + prefix) for prefix in prefixes]
+        keys += [_key('N', normalize(name)) for name in names if normalize(name)]
+        for key in keys:
+            if (key, country) in records:
+                continue
+            km = distance
+            if km is None:
+                km = road_distance(country, lat, lon, prefixes[0] if prefixes else '')
+            records[key, country] = (lat_e5, lon_e5, min(km, 0xFFFF))
+
+    out = bytearray(HEADER.pack(MAGIC, len(records)))
+    for (key, country), (lat_e5, lon_e5, km) in sorted(records.items()):
+        out += RECORD.pack(key, country.encode('ascii'), lat_e5, lon_e5, km)
+    return bytes(out)
+
+
+def write(data, path):
+    """Write an index atomically, so processes mapping the old file keep a consistent view"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, path)
+
+
+class Gazetteer:
+    """Lookups in a compiled index (a memory map or bytes)"""
+
+    def __init__(self, buffer):
+        magic, self.count = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError('Not a gazetteer index')
+        self.buffer = buffer
+
+    @classmethod
+    def open(cls, path):
+        with open(path, 'rb') as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def _key_at(self, index):
+        offset = HEADER.size + index * RECORD.size
+        return self.buffer[offset:offset + KEY_SIZE]
+
+    def _find(self, key):
+        """Records stored under a key (one per country)"""
+        padded = key.ljust(KEY_SIZE, b'\0')
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key_at(middle) < padded:
+                low = middle + 1
+            else:
+                high = middle
+        places = []
+        while low < self.count and self._key_at(low) == padded:
+            _, country, lat, lon, km = RECORD.unpack_from(self.buffer, HEADER.size + low * RECORD.size)
+            places.append(Place(country.decode('ascii'), lat / COORD_SCALE, lon / COORD_SCALE, km))
+            low += 1
+        return places
+
+    @staticmethod
+    def _pick(places, country):
+        for place in places:
+            if place.country == country:
+                return place
+        return places[0] if places else None
+
+    def by_name(self, name, country=None):
+        """Place with this name, preferring the given country code"""
+        key = normalize(name)
+        return self._pick(self._find(_key('N', key)), country) if key else None
+
+    def by_postal_code(self, code, country=None):
+        """
+        Place of the longest known prefix of a postal code
+
+        Without a country, five digits are tried as German and Swedish
+        and four as Danish.
+        """
+        code = re.sub(r'\D', '', code)
+        if country:
+            countries = [country]
+        else:
+            countries = ['DE', 'SE'] if len(code) == 5 else ['DK']
+        for length in range(len(code), 1, -1):
+            for candidate in countries:
+                places = self._find(_key('P', candidate + code[:length]))
+                if places:
+                    return places[0]
+        return None
+
+    def locate(self, location, country=None):
+        """
+        Best place for a location string from an advertisement
+
+        Tries the whole name and its leading words ("Hamburg Altona" ->
+        "Hamburg"), then the postal code in the string, then single words.
+
+        Args:
+            location: Town, optionally with postal code ("DE-57074 Siegen")
+            country: Country code or import country name, to break ties
+
+        Returns:
+            Place, or None when nothing matches
+        """
+        country = country_code(country)
+        postal = POSTAL_PATTERN.search(location.upper())
+        name = POSTAL_PATTERN.sub(' ', location.upper())
+
+        words = normalize(name).split()
+        for length in range(len(words), 0, -1):
+            place = self.by_name(' '.join(words[:length]), country)
+            if place:
+                return place
+        if postal:
+            prefix, code = postal.groups()
+            if prefix in POSTAL_PREFIXES:
+                code_country = POSTAL_PREFIXES[prefix]
+            elif ' ' in code:
+                code_country = 'SE'  # "598 21"
+            else:
+                code_country = country
+            # A bare four-digit number is more often a year than a Danish postal code
+            if len(code) == 5 or code_country == 'DK':
+                place = self.by_postal_code(code, code_country)
+                if place:
+                    return place
+        for word in words[1:]:
+            if len(word) >= 3:
+                place = self.by_name(word, country)
+                if place:
+                    return place
+        return None
+
+
+def configure(path):
+    """Use the index at this path (None: data/gazetteer.bin); it is opened on next use"""
+    global _gazetteer, _path
+    with _lock:
+        _path = path
+        _gazetteer = None
+
+
+def get_gazetteer():
+    """
+    Gazetteer for this process, memory-mapped on first use
+
+    A missing index is compiled from the seed first (kept in memory if it
+    cannot be written).
+    """
+    global _gazetteer
+    with _lock:
+        if _gazetteer is None:
+            path = _path or os.environ.get('GAZETTEER_PATH') or DEFAULT_PATH
+            if not os.path.exists(path):
+                data = build(read_seed())
+                try:
+                    write(data, path)
+                except OSError as e:
+                    logger.warning(f"Gazetteer index not written ({str(e)}); using it from memory")
+                    _gazetteer = Gazetteer(data)
+                    return _gazetteer
+            _gazetteer = Gazetteer.open(path)
+        return _gazetteer
+
+
+def fill_car_distances(overwrite=False):
+    """
+    Set Car.distance_km from the dealer location of every car without one
+
+    Each distinct (location, country) is looked up once and the cars are
+    updated with one executemany.
+
+    Args:
+        overwrite: Also recompute cars that already have a distance
+
+    Returns:
+        (cars updated, cars whose location was not found)
+    """
+    from sqlalchemy import update
+    from database import db
+    from models.car import Car
+    from utils.cache_utils import invalidate_tags
+
+    query = db.session.query(Car.id, Car.dealer_location, Car.import_country) \
+        .filter(Car.dealer_location.isnot(None), Car.dealer_location != '')
+    if not overwrite:
+        query = query.filter(Car.distance_km.is_(None))
+
+    gazetteer = get_gazetteer()
+    places, updates, missing = {}, [], 0
+    for car_id, location, country in query:
+        if (location, country) not in places:
+            places[location, country] = gazetteer.locate(location, country)
+        place = places[location, country]
+        if place:
+            updates.append({'id': car_id, 'distance_km': place.distance_km})
+        else:
+            missing += 1
+
+    if updates:
+        db.session.execute(update(Car), updates)
+        db.session.commit()
+        # Bulk updates bypass the per-object change tracking behind the cache tags
+        invalidate_tags('cars:list', 'car:*')
+    return len(updates), missing
+
+
+def init_gazetteer(app):
+    """Map the index at startup and register the gazetteer CLI commands"""
+    import click
+
+    configure(app.config.get('GAZETTEER_PATH'))
+    try:
+        get_gazetteer()
+    except Exception as e:
+        logger.error(f"Gazetteer setup failed: {str(e)}")
+
+    @app.cli.command('gazetteer-build')
+    @click.argument('geonames', nargs=-1, type=click.Path(exists=True, dir_okay=False))
+    def gazetteer_build(geonames):
+        """Compile the gazetteer from the seed and optional GeoNames postal code dumps"""
+        import itertools
+        rows = itertools.chain(read_seed(), *(read_geonames(path) for path in geonames))
+        data = build(rows)
+        path = app.config.get('GAZETTEER_PATH') or DEFAULT_PATH
+        write(data, path)
+        configure(path)
+        print(f"Wrote {(len(data) - HEADER.size) // RECORD.size} gazetteer entries to {path}")
+
+    @app.cli.command('cars-fill-distance')
+    @click.option('--overwrite', is_flag=True, help='Recompute distances that are already set')
+    def cars_fill_distance(overwrite):
+        """Fill Car.distance_km from the dealer location"""
+        updated, missing = fill_car_distances(overwrite)
+        print(f"Set distance for {updated} cars ({missing} locations not found)")
@@ -0,0 +1,498 @@
+"""
+Shared HTTP client for fetching advertisement pages
+
+One ``requests`` session per process keeps connections to each host alive
+between fetches. On top of it:
+
+- per-host limits: at most ``HTTP_MAX_PER_HOST`` concurrent requests and one
+  request per ``HTTP_MIN_INTERVAL`` seconds (``HTTP_HOST_LIMITS`` overrides
+  both per domain). Both are also kept across processes through small
+  state files next to the cache (a booked next-request time and one
+  flock'ed slot file per concurrent request), since every URL parse job
+  runs in its own child process.
+- retries with exponential backoff (``HTTP_RETRIES``, ``HTTP_BACKOFF``) on
+  connection errors, 429 and 5xx, honouring ``Retry-After``.
+- an on-disk response cache (``HTTP_CACHE_DIR``, bounded by
+  ``HTTP_CACHE_MAX_BYTES`` through a running size total, so the directory is
+  only walked when the total passes the limit or every EVICT_EVERY writes).
+  Responses are reused while ``Cache-Control: max-age``/``Expires`` says they
+  are fresh, then revalidated with ``If-None-Match``/``If-Modified-Since``; a
+  304 costs no download.
+
+``HTTP_STUB_URL`` sends every request to a local stub server instead (see
+benchmarks/stub_server.py), with the original host as the first path segment.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.util.retry import Retry
+
+try:
+    import fcntl
+except ImportError:  # Windows: the host limits only apply within a process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'cache_dir': None,
+    'cache_max_bytes': 200 * 1024 * 1024,
+    'timeout': 15,
+    'retries': 3,
+    'backoff': 0.5,
+    'max_per_host': 2,
+    'min_interval': 1.0,
+    'host_limits': {},
+    'stub_url': None,
+}
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Seconds between attempts to take a per-host slot held by other processes
+SLOT_POLL = 0.05
+
+# Request headers that select a different variant of a page, so they are part of the cache key
+CACHE_KEY_HEADERS = ('Accept-Language',)
+
+# Response headers not kept with cached bodies (bodies are stored decoded)
+UNCACHED_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'connection', 'set-cookie'}
+
+# Eviction trims the cache to this fraction of the limit
+EVICT_TO = 0.9
+
+# Body writes between directory walks that resynchronise the size index
+EVICT_EVERY = 500
+
+# Running "<bytes> <writes>" total of the cached bodies
+INDEX_NAME = 'size.idx'
+
+_settings = dict(DEFAULTS)
+_client = None
+_client_lock = threading.Lock()
+
+
+def _cache_control(headers):
+    directives = {}
+    for part in headers.get('Cache-Control', '').split(','):
+        name, _, value = part.strip().partition('=')
+        if name:
+            directives[name.lower()] = value.strip('"')
+    return directives
+
+
+def freshness(headers):
+    """
+    Seconds a response may be reused without revalidation
+
+    Returns:
+        Lifetime in seconds (0: revalidate on every use), or None if it must not be stored
+    """
+    directives = _cache_control(headers)
+    if 'no-store' in directives:
+        return None
+    if 'no-cache' in directives:
+        return 0
+    if 'max-age' in directives:
+        try:
+            return max(0, int(directives['max-age']))
+        except ValueError:
+            return 0
+    if 'Expires' in headers:
+        try:
+            expires = parsedate_to_datetime(headers['Expires']).timestamp()
+        except (TypeError, ValueError):
+            return 0
+        return max(0, int(expires - time.time()))
+    return 0
+
+
+class ResponseCache:
+    """Response bodies and metadata on disk, with size-bounded LRU eviction"""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(url, headers):
+        varying = '\0'.join(f"{name}={headers.get(name, '')}" for name in CACHE_KEY_HEADERS)
+        return hashlib.sha256(f"{url}\0{varying}".encode()).hexdigest()
+
+    def _paths(self, key):
+        base = os.path.join(self.directory, key[:2], key)
+        return base + '.json', base + '.body'
+
+    def _update_index(self, delta=0, total=None):
+        """
+        Add delta bytes and one write to the size index, or reset it to total
+
+        Returns:
+            (total bytes, writes) after the update; None when the index was
+            missing or unreadable, so the caller walks the directory instead
+        """
+        try:
+            with open(os.path.join(self.directory, INDEX_NAME), 'a+', encoding='utf-8') as f:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                f.seek(0)
+                try:
+                    size, writes = (int(part) for part in f.read().split())
+                    state = (size + delta, writes + 1)
+                except ValueError:
+                    state = None
+                if total is not None:
+                    state = (total, 0)
+                if state:
+                    f.seek(0)
+                    f.truncate()
+                    f.write(f'{max(0, state[0])} {state[1]}')
+                return state
+        except OSError:
+            return None
+
+    def get(self, key):
+        """(metadata, body), or None when missing or unreadable"""
+        meta_path, body_path = self._paths(key)
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(body_path, 'rb') as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(meta_path)  # Mark as recently used
+        except OSError:
+            pass
+        return meta, body
+
+    def _write(self, path, data):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def set(self, key, meta, body=None):
+        """Store metadata, and the body unless it is unchanged (None)"""
+        meta_path, body_path = self._paths(key)
+        old_size = 0
+        if body is not None:
+            try:
+                old_size = os.path.getsize(body_path)
+            except OSError:
+                pass
+        try:
+            os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+            if body is not None:
+                self._write(body_path, body)
+            self._write(meta_path, json.dumps(meta).encode())
+        except OSError as e:
+            logger.warning(f"HTTP cache write failed: {str(e)}")
+            return False
+        if body is not None:
+            state = self._update_index(len(body) - old_size)
+            if state is None or state[0] > self.max_bytes or state[1] >= EVICT_EVERY:
+                self.evict()
+        return True
+
+    def _entries(self):
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                meta_path = os.path.join(root, name)
+                body_path = meta_path[:-len('.json')] + '.body'
+                try:
+                    mtime = os.stat(meta_path).st_mtime
+                except OSError:
+                    continue
+                size = os.path.getsize(body_path) if os.path.exists(body_path) else 0
+                entries.append((mtime, size, meta_path, body_path))
+        return entries
+
+    def evict(self):
+        """Remove least recently used entries while the cache is over its size limit"""
+        entries = self._entries()
+        total = sum(size for _, size, _, _ in entries)
+        if total <= self.max_bytes:
+            self._update_index(total=total)
+            return 0
+        removed = 0
+        for _, size, meta_path, body_path in sorted(entries):
+            if total <= self.max_bytes * EVICT_TO:
+                break
+            for path in (meta_path, body_path):
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            total -= size
+            removed += 1
+        self._update_index(total=total)
+        logger.info(f"HTTP cache evicted {removed} entries")
+        return removed
+
+    def clear(self):
+        entries = self._entries()
+        for _, _, meta_path, body_path in entries:
+            for path in (meta_path, body_path):
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+        self._update_index(total=0)
+        return len(entries)
+
+
+class HostLimiter:
+    """Concurrency and request spacing for one host (or domain)"""
+
+    def __init__(self, key, max_concurrent, min_interval, state_dir=None):
+        self.key = key
+        self.max_concurrent = max(1, max_concurrent)
+        self.min_interval = min_interval
+        self.state_dir = state_dir if fcntl else None
+        self._semaphore = threading.BoundedSemaphore(self.max_concurrent)
+        self._lock = threading.Lock()
+        self._next = 0.0
+        self._slot = threading.local()
+
+    def _acquire_slot(self):
+        """Hold one of the host's slot files; flock conflicts across processes and threads alike"""
+        os.makedirs(self.state_dir, exist_ok=True)
+        while True:
+            for i in range(self.max_concurrent):
+                f = open(os.path.join(self.state_dir, f'{self.key}.slot{i}'), 'a')
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    f.close()
+                    continue
+                self._slot.file = f
+                return
+            time.sleep(SLOT_POLL)
+
+    def _release_slot(self):
+        f = self._slot.file
+        self._slot.file = None
+        fcntl.flock(f, fcntl.LOCK_UN)
+        f.close()
+
+    def _reserve(self):
+        """Book the next request time; returns the seconds to wait for it"""
+        now = time.time()
+        with self._lock:
+            if self.state_dir:
+                # Shared with the other processes fetching from this host
+                os.makedirs(self.state_dir, exist_ok=True)
+                with open(os.path.join(self.state_dir, f'{self.key}.next'), 'a+') as f:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                    f.seek(0)
+                    try:
+                        booked = float(f.read() or 0)
+                    except ValueError:
+                        booked = 0.0
+                    start = max(now, booked)
+                    f.seek(0)
+                    f.truncate()
+                    f.write(repr(start + self.min_interval))
+            else:
+                start = max(now, self._next)
+                self._next = start + self.min_interval
+        return start - now
+
+    def __enter__(self):
+        if self.state_dir:
+            self._acquire_slot()
+        else:
+            self._semaphore.acquire()
+        wait = self._reserve() if self.min_interval > 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+        return self
+
+    def __exit__(self, *exc):
+        if self.state_dir:
+            self._release_slot()
+        else:
+            self._semaphore.release()
+
+
+class HttpClient:
+    """Pooled session with per-host limits, retries and a revalidating response cache"""
+
+    def __init__(self, settings):
+        self.settings = {**DEFAULTS, **settings}
+        self.pid = os.getpid()
+        self.timeout = self.settings['timeout']
+        self.stub_url = (self.settings['stub_url'] or '').rstrip('/') or None
+        cache_dir = self.settings['cache_dir']
+        self.cache = ResponseCache(cache_dir, self.settings['cache_max_bytes']) if cache_dir else None
+        self._state_dir = os.path.join(cache_dir, 'hosts') if cache_dir else None
+
+        limits = [self.settings['max_per_host']]
+        limits += [l.get('max_per_host', 0) for l in self.settings['host_limits'].values()]
+        retry = Retry(
+            total=self.settings['retries'], backoff_factor=self.settings['backoff'],
+            status_forcelist=RETRY_STATUSES, allowed_methods=frozenset({'GET', 'HEAD'}),
+            respect_retry_after_header=True, raise_on_status=False,
+        )
+        # One pool per host, large enough for the concurrency the limiter allows
+        adapter = HTTPAdapter(pool_maxsize=max(limits), max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._limiters = {}
+        self._limiters_lock = threading.Lock()
+
+    def limiter(self, host):
+        """Limiter for a host; configured domains cover their subdomains"""
+        key, limits = host, {}
+        for domain, domain_limits in self.settings['host_limits'].items():
+            if host == domain or host.endswith('.' + domain):
+                key, limits = domain, domain_limits
+                break
+        with self._limiters_lock:
+            if key not in self._limiters:
+                self._limiters[key] = HostLimiter(
+                    key, limits.get('max_per_host', self.settings['max_per_host']),
+                    limits.get('min_interval', self.settings['min_interval']), self._state_dir,
+                )
+            return self._limiters[key]
+
+    def _transport_url(self, url):
+        if not self.stub_url:
+            return url
+        parts = urlsplit(url)
+        return f"{self.stub_url}/{parts.netloc}{parts.path or '/'}" + (f'?{parts.query}' if parts.query else '')
+
+    @staticmethod
+    def _cached_response(meta, body):
+        response = requests.Response()
+        response.status_code = 200
+        response.url = meta['url']
+        response.headers = CaseInsensitiveDict(meta['headers'])
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response._content = body
+        response.from_cache = True
+        return response
+
+    def get(self, url, headers=None, timeout=None):
+        """
+        GET a URL through the cache and the host's limiter
+
+        Args:
+            url: Absolute URL
+            headers: Request headers
+            timeout: Seconds per attempt (default HTTP_TIMEOUT)
+
+        Returns:
+            requests.Response; ``from_cache`` is True when the body came from the cache
+        """
+        headers = dict(headers or {})
+        key = cached = None
+        if self.cache:
+            key = ResponseCache.key(url, headers)
+            cached = self.cache.get(key)
+            if cached:
+                meta, body = cached
+                if time.time() < meta['fetched_at'] + meta['fresh_for']:
+                    return self._cached_response(meta, body)
+                # Stored as a plain dict in the server's spelling, e.g. 'etag'
+                stored = CaseInsensitiveDict(meta['headers'])
+                if stored.get('ETag'):
+                    headers['If-None-Match'] = stored['ETag']
+                if stored.get('Last-Modified'):
+                    headers['If-Modified-Since'] = stored['Last-Modified']
+
+        with self.limiter(urlsplit(url).hostname or ''):
+            response = self.session.get(self._transport_url(url), headers=headers,
+                                        timeout=timeout or self.timeout, allow_redirects=True)
+        response.from_cache = False
+
+        if response.status_code == 304 and cached:
+            meta, body = cached
+            merged = CaseInsensitiveDict(meta['headers'])
+            merged.update({name: value for name, value in response.headers.items()
+                           if name.lower() not in UNCACHED_HEADERS})
+            meta['headers'] = dict(merged)
+            meta['fetched_at'] = time.time()
+            meta['fresh_for'] = freshness(response.headers) or 0
+            self.cache.set(key, meta)
+            return self._cached_response(meta, body)
+
+        if self.cache and response.status_code == 200:
+            self._store(key, url, response)
+        return response
+
+    def _store(self, key, url, response):
+        lifetime = freshness(response.headers)
+        has_validator = 'ETag' in response.headers or 'Last-Modified' in response.headers
+        if lifetime is None or not (lifetime or has_validator):
+            return
+        meta = {
+            # Keep the original host when the request went through the stub server
+            'url': url if self.stub_url else response.url,
+            'headers': {name: value for name, value in response.headers.items()
+                        if name.lower() not in UNCACHED_HEADERS},
+            'fetched_at': time.time(),
+            'fresh_for': lifetime,
+        }
+        self.cache.set(key, meta, response.content)
+
+
+def settings_from_app(app):
+    """Client settings from the Flask config (plain values, so they can be sent to a child process)"""
+    config = app.config
+    return {
+        'cache_dir': config.get('HTTP_CACHE_DIR') or os.path.join(app.instance_path, 'http_cache'),
+        'cache_max_bytes': config.get('HTTP_CACHE_MAX_BYTES', DEFAULTS['cache_max_bytes']),
+        'timeout': config.get('HTTP_TIMEOUT', DEFAULTS['timeout']),
+        'retries': config.get('HTTP_RETRIES', DEFAULTS['retries']),
+        'backoff': config.get('HTTP_BACKOFF', DEFAULTS['backoff']),
+        'max_per_host': config.get('HTTP_MAX_PER_HOST', DEFAULTS['max_per_host']),
+        'min_interval': config.get('HTTP_MIN_INTERVAL', DEFAULTS['min_interval']),
+        'host_limits': config.get('HTTP_HOST_LIMITS') or {},
+        'stub_url': config.get('HTTP_STUB_URL'),
+    }
+
+
+def configure(settings):
+    """Replace the settings of this process's client (it is rebuilt on next use)"""
+    global _client
+    with _client_lock:
+        _settings.clear()
+        _settings.update(DEFAULTS, **settings)
+        _client = None
+
+
+def get_client():
+    """Client for this process, created on first use (and again after a fork)"""
+    global _client
+    with _client_lock:
+        if _client is None or _client.pid != os.getpid():
+            _client = HttpClient(_settings)
+    return _client
+
+
+def init_http_client(app):
+    """Configure the client from the app config and register the cache CLI command"""
+    configure(settings_from_app(app))
+
+    @app.cli.command('http-cache-clear')
+    def http_cache_clear():
+        """Empty the HTTP response cache"""
+        cache = get_client().cache
+        print(f"Removed {cache.clear() if cache else 0} cached responses")
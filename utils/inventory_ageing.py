@@ -0,0 +1,125 @@
+"""
+Inventory ageing and days-to-sell statistics, computed in the database
+
+Day differences use the backend's own date arithmetic (julianday on SQLite,
+epoch extraction on PostgreSQL), and mean, median and p90 are aggregated in
+SQL, so no car rows are loaded into Python whatever the size of the history.
+"""
+import logging
+from datetime import datetime
+from sqlalchemy import and_, bindparam, case, func, or_, select
+from database import db
+
+logger = logging.getLogger(__name__)
+
+# Stock age buckets as (label, lower bound, upper bound) in days, bounds inclusive
+AGE_BUCKETS = (
+    ('0-30', None, 30),
+    ('31-60', 30, 60),
+    ('61-90', 60, 90),
+    ('>90', 90, None),
+)
+
+
+def days_between(start, end, dialect=None):
+    """SQL expression for the (fractional) number of days from start to end"""
+    dialect = dialect or db.engine.dialect.name
+    if dialect == 'postgresql':
+        return func.extract('epoch', end - start) / 86400.0
+    return func.julianday(end) - func.julianday(start)
+
+
+def _distribution(days, criteria, dialect):
+    """Count, mean, median and p90 (nearest rank) of a day expression"""
+    if dialect == 'postgresql':
+        query = select(
+            func.count(),
+            func.avg(days),
+            func.percentile_cont(0.5).within_group(days.asc()),
+            func.percentile_disc(0.9).within_group(days.asc()),
+        ).where(*criteria)
+    else:
+        # No percentile aggregates: rank the rows with window functions instead
+        ranked = select(
+            days.label('days'),
+            func.row_number().over(order_by=days).label('rn'),
+            func.count().over().label('n'),
+        ).where(*criteria).subquery()
+        middle = or_(ranked.c.rn == (ranked.c.n + 1) // 2, ranked.c.rn == (ranked.c.n + 2) // 2)
+        query = select(
+            func.count(),
+            func.avg(ranked.c.days),
+            func.avg(case((middle, ranked.c.days))),
+            func.max(case((ranked.c.rn == (9 * ranked.c.n + 9) // 10, ranked.c.days))),
+        )
+
+    count, mean, median, p90 = db.session.execute(query).one()
+    return {
+        'count': count or 0,
+        'mean': float(mean) if mean is not None else None,
+        'median': float(median) if median is not None else None,
+        'p90': float(p90) if p90 is not None else None,
+    }
+
+
+def days_to_sell_stats():
+    """Distribution of days from registration in the system to sale, for sold cars"""
+    from models.car import Car
+
+    dialect = db.engine.dialect.name
+    days = days_between(Car.created_at, Car.sold_date, dialect)
+    return _distribution(days, [Car.status == 'sold', Car.sold_date.isnot(None),
+                                Car.created_at.isnot(None)], dialect)
+
+
+def _stock_age(now, dialect):
+    from models.car import Car
+    return days_between(Car.created_at, bindparam('now', now, type_=db.DateTime), dialect)
+
+
+def stock_age_stats(now=None):
+    """Distribution of the current age (days) of unsold stock"""
+    from models.car import Car
+
+    dialect = db.engine.dialect.name
+    age = _stock_age(now or datetime.utcnow(), dialect)
+    return _distribution(age, [Car.status != 'sold', Car.created_at.isnot(None)], dialect)
+
+
+def _bucket_condition(age, lower, upper):
+    bounds = []
+    if lower is not None:
+        bounds.append(age > lower)
+    if upper is not None:
+        bounds.append(age <= upper)
+    return and_(*bounds)
+
+
+def stock_age_buckets(now=None):
+    """
+    Unsold stock per make and import country, split into age buckets
+
+    Returns:
+        List of dicts with make, import_country, total, avg_age and one count
+        per AGE_BUCKETS label under 'buckets'
+    """
+    from models.car import Car
+
+    dialect = db.engine.dialect.name
+    age = _stock_age(now or datetime.utcnow(), dialect)
+    bucket_counts = [func.count(case((_bucket_condition(age, lower, upper), 1)))
+                     for _, lower, upper in AGE_BUCKETS]
+    rows = db.session.execute(
+        select(Car.make, Car.import_country, func.count(), func.avg(age), *bucket_counts)
+        .where(Car.status != 'sold', Car.created_at.isnot(None))
+        .group_by(Car.make, Car.import_country)
+        .order_by(Car.make, Car.import_country)
+    ).all()
+
+    return [{
+        'make': row[0],
+        'import_country': row[1],
+        'total': row[2],
+        'avg_age': float(row[3]) if row[3] is not None else None,
+        'buckets': dict(zip([label for label, _, _ in AGE_BUCKETS], row[4:])),
+    } for row in rows]
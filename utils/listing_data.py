@@ -0,0 +1,353 @@
+"""
+Structured data embedded in listing pages
+
+Most listing sites ship the ad as JSON in the page: schema.org JSON-LD
+(``Car``/``Vehicle`` with an ``Offer``) and, on Next.js sites, the
+``__NEXT_DATA__`` blob. Reading those is faster than building a DOM and
+flattening it to text, and the fields are exact instead of guessed by the
+regex heuristics in AdParser._parse_text, which stay as the fallback.
+
+The script blobs are cut out of the raw HTML with one regex scan and
+decoded with json; the page is never parsed as a whole. EXTRACTORS maps a
+host suffix to the extractor for that site, all returning fields with the
+same names and units as AdParser._parse_text.
+"""
+import html
+import json
+import re
+from urllib.parse import urlsplit
+
+# <script ...>...</script> with its attributes and body
+SCRIPT_PATTERN = re.compile(rb'<script\b([^>]*)>(.*?)</script\s*>', re.IGNORECASE | re.DOTALL)
+JSON_LD_PATTERN = re.compile(rb'type\s*=\s*["\']?application/ld\+json', re.IGNORECASE)
+NEXT_DATA_PATTERN = re.compile(rb'id\s*=\s*["\']?__NEXT_DATA__', re.IGNORECASE)
+
+VEHICLE_TYPES = {'Car', 'Vehicle', 'Motorcycle', 'MotorizedBicycle', 'BusOrCoach'}
+
+# Country of the listing (as in Car.import_country) by ISO code
+COUNTRIES = {'DE': 'Tyskland', 'D': 'Tyskland', 'SE': 'Sverige', 'S': 'Sverige', 'DK': 'Danmark'}
+
+# Value words (lower case) to the parser's fuel_type and transmission values
+FUEL_TYPES = {
+    'diesel': 'diesel', 'petrol': 'gasoline', 'gasoline': 'gasoline', 'benzin': 'gasoline',
+    'bensin': 'gasoline', 'electric': 'electric', 'elektro': 'electric', 'el': 'electric',
+    'hybrid': 'hybrid', 'plug-in-hybrid': 'hybrid', 'plug-in hybrid': 'hybrid',
+}
+TRANSMISSIONS = {
+    'automatic': 'automatic', 'automatik': 'automatic', 'automat': 'automatic', 'automatgear': 'automatic',
+    'manual': 'manual', 'manuell': 'manual', 'manuel': 'manual', 'schaltgetriebe': 'manual',
+}
+
+# Labels of "label: value" attribute lists (Blocket, Bilbasen) to field names
+ATTRIBUTE_LABELS = {
+    'märke': 'make', 'mærke': 'make', 'modell': 'model', 'model': 'model',
+    'modellår': 'year', 'årsmodell': 'year', 'modelår': 'year', 'årgang': 'year',
+    'miltal': 'mileage_mil', 'kilometer': 'mileage', 'km': 'mileage', 'kilometerstand': 'mileage',
+    'bränsle': 'fuel_type', 'drivmedel': 'fuel_type', 'brændstof': 'fuel_type', 'drivmiddel': 'fuel_type',
+    'växellåda': 'transmission', 'geartype': 'transmission', 'gearkasse': 'transmission',
+    'färg': 'color', 'farve': 'color', 'hästkrafter': 'power', 'hk': 'power', 'effekt': 'power',
+    'dörrar': 'doors', 'døre': 'doors', 'antal døre': 'doors',
+    'första registrering': 'registration_date', '1. registrering': 'registration_date',
+    'første registrering': 'registration_date',
+}
+
+NUMBER_PATTERN = re.compile(r'\d[\d\s.,\xa0]*')
+
+
+def script_blobs(content, pattern):
+    """Decoded JSON of every <script> whose attributes match pattern"""
+    blobs = []
+    for match in SCRIPT_PATTERN.finditer(content):
+        if not pattern.search(match.group(1)):
+            continue
+        body = match.group(2).strip()
+        if body.startswith(b'<!--'):
+            body = body[4:].rstrip(b'->').strip()
+        try:
+            blobs.append(json.loads(body))
+        except ValueError:
+            try:
+                blobs.append(json.loads(html.unescape(body.decode('utf-8', 'replace'))))
+            except ValueError:
+                continue
+    return blobs
+
+
+def walk(node):
+    """Every dict nested in a JSON value, parents first"""
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            yield node
+            stack.extend(reversed(list(node.values())))
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+
+
+def _integer(value):
+    """Integer from 150000, "150.000", "150 000 kr" or {"value": ...}; None if there is none"""
+    if isinstance(value, dict):
+        value = value.get('value', value.get('amount'))
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = NUMBER_PATTERN.search(str(value))
+    if not match:
+        return None
+    digits = match.group(0).strip()
+    # "21990.50" / "21.990,50": drop a two-digit decimal part
+    digits = re.sub(r'[.,]\d{2}$', '', digits)
+    digits = re.sub(r'\D', '', digits)
+    return int(digits) if digits else None
+
+
+def _text(value):
+    if isinstance(value, dict):
+        value = value.get('name') or value.get('value')
+    if isinstance(value, list):
+        value = value[0] if value else None
+    return str(value).strip() if value not in (None, '') else None
+
+
+def _year(value):
+    match = re.search(r'(19|20)\d{2}', str(value or ''))
+    return int(match.group(0)) if match else None
+
+
+def _lookup(table, value):
+    value = (_text(value) or '').lower()
+    # schema.org values may be URLs ("https://schema.org/AutomaticTransmission")
+    value = value.rsplit('/', 1)[-1].replace('transmission', '').strip()
+    return table.get(value)
+
+
+def _set(data, field, value):
+    if value not in (None, '') and field not in data:
+        data[field] = value
+
+
+def from_schema(node):
+    """Fields of a schema.org Car/Vehicle (or Product with an Offer) node"""
+    data = {}
+    brand = node.get('brand') or node.get('manufacturer')
+    _set(data, 'make', _text(brand))
+    model = _text(node.get('model'))
+    if model and data.get('make') and model.lower().startswith(data['make'].lower() + ' '):
+        model = model[len(data['make']) + 1:]
+    _set(data, 'model', model)
+    _set(data, 'vin', (_text(node.get('vehicleIdentificationNumber')) or '').upper() or None)
+    registration = _text(node.get('dateVehicleFirstRegistered'))
+    _set(data, 'registration_date', registration)
+    _set(data, 'year', _year(node.get('vehicleModelDate') or node.get('productionDate') or registration))
+
+    odometer = node.get('mileageFromOdometer')
+    mileage = _integer(odometer)
+    if mileage is not None:
+        unit = (odometer.get('unitCode') or odometer.get('unitText') or '') if isinstance(odometer, dict) else ''
+        # SMI: statute miles; Swedish "mil" (10 km) is given as unitText
+        if unit.upper() == 'SMI':
+            mileage = round(mileage * 1.609)
+        elif unit.lower() == 'mil':
+            mileage *= 10
+        _set(data, 'mileage', mileage)
+
+    _set(data, 'color', _text(node.get('color')))
+    _set(data, 'fuel_type', _lookup(FUEL_TYPES, node.get('fuelType')))
+    _set(data, 'transmission', _lookup(TRANSMISSIONS, node.get('vehicleTransmission')))
+    _set(data, 'doors', _integer(node.get('numberOfDoors')))
+    engine = node.get('vehicleEngine')
+    if isinstance(engine, list):
+        engine = engine[0] if engine else None
+    if isinstance(engine, dict):
+        power = engine.get('enginePower')
+        if isinstance(power, list):
+            power = power[0] if power else None
+        _set(data, 'power', _integer(power))
+        if engine.get('fuelType'):
+            _set(data, 'fuel_type', _lookup(FUEL_TYPES, engine['fuelType']))
+
+    offer = node.get('offers')
+    if isinstance(offer, list):
+        offer = offer[0] if offer else None
+    if isinstance(offer, dict):
+        specification = offer.get('priceSpecification')
+        price = offer.get('price', offer.get('lowPrice'))
+        if price is None and isinstance(specification, dict):
+            price = specification.get('price')
+        _set(data, 'price', _integer(price))
+        currency = offer.get('priceCurrency')
+        if not currency and isinstance(specification, dict):
+            currency = specification.get('priceCurrency')
+        if currency:
+            _set(data, 'purchase_currency', str(currency).upper())
+        seller = offer.get('seller') or offer.get('offeredBy')
+        if isinstance(seller, dict):
+            _set(data, 'dealer', _text(seller.get('name')))
+            _set_address(data, seller.get('address'))
+            _set(data, 'phone', _text(seller.get('telephone')))
+    return data
+
+
+def _set_address(data, address):
+    if not isinstance(address, dict):
+        return
+    _set(data, 'location', _text(address.get('addressLocality')))
+    _set(data, 'postal_code', _text(address.get('postalCode')))
+    country = _text(address.get('addressCountry'))
+    if country:
+        _set(data, 'import_country', COUNTRIES.get(country.upper(), None))
+
+
+def from_json_ld(content):
+    """Fields of the first vehicle (or product with a price) in the page's JSON-LD"""
+    fallback = None
+    for blob in script_blobs(content, JSON_LD_PATTERN):
+        for node in walk(blob):
+            types = node.get('@type')
+            types = set(types) if isinstance(types, list) else {types}
+            if types & VEHICLE_TYPES:
+                return from_schema(node)
+            if fallback is None and 'Product' in types and node.get('offers'):
+                fallback = node
+    return from_schema(fallback) if fallback is not None else {}
+
+
+def from_attributes(blob):
+    """Fields from "label"/"value" attribute lists anywhere in a JSON blob"""
+    data = {}
+    for node in walk(blob):
+        label = node.get('label') or node.get('name') or node.get('key')
+        value = node.get('value', node.get('displayValue'))
+        if not isinstance(label, str) or isinstance(value, (dict, list)) or value in (None, ''):
+            continue
+        field = ATTRIBUTE_LABELS.get(label.strip().rstrip(':').lower())
+        if field == 'mileage_mil':
+            _set(data, 'mileage', (_integer(value) or 0) * 10 or None)
+        elif field in ('year', 'doors', 'power', 'mileage'):
+            _set(data, field, _year(value) if field == 'year' else _integer(value))
+        elif field == 'fuel_type':
+            _set(data, field, _lookup(FUEL_TYPES, value))
+        elif field == 'transmission':
+            _set(data, field, _lookup(TRANSMISSIONS, value))
+        elif field:
+            _set(data, field, _text(value))
+    return data
+
+
+def _merge(data, *sources):
+    for source in sources:
+        for field, value in source.items():
+            _set(data, field, value)
+    return data
+
+
+def _next_data(content):
+    blobs = script_blobs(content, NEXT_DATA_PATTERN)
+    return blobs[0] if blobs else None
+
+
+def extract_generic(content):
+    """JSON-LD, then attribute lists in __NEXT_DATA__"""
+    data = from_json_ld(content)
+    next_data = _next_data(content)
+    if next_data is not None:
+        _merge(data, from_attributes(next_data))
+    return data
+
+
+def extract_mobile_de(content):
+    data = extract_generic(content)
+    _set(data, 'purchase_currency', 'EUR')
+    _set(data, 'import_country', 'Tyskland')
+    data['source'] = 'mobile.de'
+    return data
+
+
+def extract_autoscout24(content):
+    """__NEXT_DATA__ listing details (pageProps.listingDetails), then JSON-LD"""
+    data = {}
+    next_data = _next_data(content)
+    details = None
+    if next_data is not None:
+        details = next((node['listingDetails'] for node in walk(next_data)
+                        if isinstance(node.get('listingDetails'), dict)), None)
+    if details:
+        vehicle = details.get('vehicle') or {}
+        _set(data, 'make', _text(vehicle.get('make')))
+        _set(data, 'model', _text(vehicle.get('model') or vehicle.get('modelVersionInput')))
+        _set(data, 'mileage', _integer(vehicle.get('mileageInKmRaw') or vehicle.get('mileageInKm')))
+        _set(data, 'registration_date', _text(vehicle.get('firstRegistrationDate')))
+        _set(data, 'year', _year(vehicle.get('firstRegistrationDateRaw') or vehicle.get('firstRegistrationDate')))
+        _set(data, 'fuel_type', _lookup(FUEL_TYPES, vehicle.get('fuelCategory') or vehicle.get('fuel')))
+        _set(data, 'transmission', _lookup(TRANSMISSIONS, vehicle.get('transmissionType')))
+        _set(data, 'color', _text(vehicle.get('bodyColor')))
+        _set(data, 'power', _integer(vehicle.get('rawPowerInHp') or vehicle.get('powerInHp')))
+        _set(data, 'doors', _integer(vehicle.get('numberOfDoors')))
+        prices = (details.get('prices') or {}).get('public') or {}
+        _set(data, 'price', _integer(prices.get('priceRaw') or prices.get('price')))
+        seller = details.get('seller') or {}
+        _set(data, 'dealer', _text(seller.get('companyName') or seller.get('contactName')))
+        location = details.get('location') or {}
+        _set(data, 'location', _text(location.get('city')))
+        _set(data, 'postal_code', _text(location.get('zip')))
+        country = _text(location.get('countryCode'))
+        if country:
+            _set(data, 'import_country', COUNTRIES.get(country.upper()))
+    _merge(data, from_json_ld(content))
+    _set(data, 'purchase_currency', 'EUR')
+    data['source'] = 'AutoScout24'
+    return data
+
+
+def extract_blocket(content):
+    data = extract_generic(content)
+    _set(data, 'purchase_currency', 'SEK')
+    _set(data, 'import_country', 'Sverige')
+    data['source'] = 'Blocket'
+    return data
+
+
+def extract_bilbasen(content):
+    data = extract_generic(content)
+    _set(data, 'purchase_currency', 'DKK')
+    data['source'] = 'Bilbasen'
+    return data
+
+
+# Host suffix -> extractor; other hosts use extract_generic
+EXTRACTORS = {
+    'mobile.de': extract_mobile_de,
+    'autoscout24.de': extract_autoscout24,
+    'autoscout24.dk': extract_autoscout24,
+    'autoscout24.se': extract_autoscout24,
+    'autoscout24.com': extract_autoscout24,
+    'blocket.se': extract_blocket,
+    'bilbasen.dk': extract_bilbasen,
+}
+
+
+def extractor_for(url):
+    host = (urlsplit(url).hostname or '').lower()
+    for suffix, extractor in EXTRACTORS.items():
+        if host == suffix or host.endswith('.' + suffix):
+            return extractor
+    return extract_generic
+
+
+def extract_listing(content, url):
+    """
+    Fields of a listing page from its embedded structured data
+
+    Args:
+        content: Raw HTML (bytes or str)
+        url: Page URL, which selects the site's extractor
+
+    Returns:
+        Dictionary with the fields found (may be empty). ``postal_code`` is
+        included when the page gives one, for the distance lookup.
+    """
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    return extractor_for(url)(content)
@@ -0,0 +1,95 @@
+"""
+Named loader profiles
+
+The relationships on Car, Customer, Sale and Invoice are ``lazy='dynamic'``,
+so every ``car.documents`` in a template is a query of its own and nothing
+can be eager-loaded. Read-only list relationships over the same rows
+(``Car.all_documents``, ``Invoice.all_line_items``, ...) can be, and a
+profile names the relationships a page needs loaded up front:
+
+    list    rows of a table page
+    grid    cards of the car grid (with the primary photo)
+    detail  a single record page
+
+so a page costs a fixed number of queries whatever its size. The list and
+grid profiles also defer the long text columns (equipment, notes, ...)::
+
+    cars = with_profile(query, 'grid').paginate(...)
+    car = Car.query.options(*loader_options(Car, 'detail')).get_or_404(car_id)
+"""
+from sqlalchemy.orm import defer, joinedload, selectinload
+
+
+def _heavy_columns():
+    """Long text columns per model; list pages never show them"""
+    from models.car import Car
+    from models.customer import Customer
+    from models.sale import Sale
+    from models.invoice import Invoice
+    return {
+        Car: (Car.equipment, Car.condition_notes, Car.service_history, Car.process_notes),
+        Customer: (Customer.notes, Customer.preferences),
+        Sale: (Sale.notes, Sale.terms_conditions),
+        Invoice: (Invoice.notes, Invoice.internal_notes),
+    }
+
+
+def _deferred(model, heavy):
+    return [defer(column) for column in heavy[model]]
+
+
+def _profiles():
+    """Map model classes to {profile: [loader options]}"""
+    from models.car import Car
+    from models.customer import Customer
+    from models.sale import Sale
+    from models.invoice import Invoice
+    heavy = _heavy_columns()
+    return {
+        Car: {
+            'list': _deferred(Car, heavy),
+            'grid': _deferred(Car, heavy) + [joinedload(Car.primary_photo)],
+            'detail': [selectinload(Car.all_documents)],
+        },
+        Customer: {
+            # Only counted, for total_purchases
+            'list': _deferred(Customer, heavy) + [selectinload(Customer.completed_sales).load_only(Sale.id)],
+            'detail': [
+                selectinload(Customer.completed_sales).load_only(Sale.id),
+                selectinload(Customer.all_sales).joinedload(Sale.car).options(*_deferred(Car, heavy)),
+                selectinload(Customer.all_communications),
+                selectinload(Customer.all_documents),
+            ],
+        },
+        Sale: {
+            'list': _deferred(Sale, heavy) + [
+                joinedload(Sale.car).options(*_deferred(Car, heavy)),
+                joinedload(Sale.customer).options(*_deferred(Customer, heavy)),
+            ],
+            'detail': [joinedload(Sale.car), joinedload(Sale.customer)],
+        },
+        Invoice: {
+            'list': _deferred(Invoice, heavy),
+            'detail': [joinedload(Invoice.customer), joinedload(Invoice.issuing_company),
+                       selectinload(Invoice.all_line_items)],
+        },
+    }
+
+
+def loader_options(model, profile):
+    """
+    Loader options of a named profile
+
+    Raises:
+        ValueError: If the model has no such profile
+    """
+    try:
+        return _profiles()[model][profile]
+    except KeyError:
+        raise ValueError(f"No loader profile '{profile}' for {model.__name__}")
+
+
+def with_profile(query, profile):
+    """Query with the loader options of a profile for its first entity applied"""
+    model = query.column_descriptions[0]['entity']
+    return query.options(*loader_options(model, profile))
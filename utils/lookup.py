@@ -0,0 +1,67 @@
+"""
+Typeahead lookups for form fields
+
+Forms pick cars, customers and sales through a search box backed by the
+``/api/lookup`` endpoints (static/js/lookup.js) rather than a <select> with
+every row of the table. A lookup returns at most LIMIT rows:
+
+- cars and customers are matched through the full-text search index
+  (utils.search_index), which prefix-matches every word, so "bmw 32" finds a
+  BMW 320d and "WBA8" a VIN
+- on backends without the search index, every word must instead be a prefix
+  of one of the lookup columns (LIKE 'word%', which a B-tree index serves)
+
+Rows are read as utils.projections tuples; the endpoints cache the JSON per
+role under the list tags of the rows they show.
+"""
+import re
+from sqlalchemy import and_, or_
+from utils.projections import fetch
+from utils.search_index import matching_ids
+
+# Rows per lookup; typeaheads show a short list, refined as the user types
+LIMIT = 10
+
+WORD_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+def _prefix_criterion(columns, words):
+    """Every word is a prefix of one of the columns"""
+    return and_(*[or_(*[column.startswith(word, autoescape=True) for column in columns]) for word in words])
+
+
+def match_criterion(id_column, entity_type, columns, text):
+    """
+    Criterion for rows whose id_column refers to an entity matching the text
+
+    Args:
+        id_column: Column holding the entity id (e.g. Car.id or Sale.car_id)
+        entity_type: Search index entity type ('car', 'customer', ...)
+        columns: Columns to prefix-match when there is no search index
+        text: The typed text
+
+    Returns:
+        SQL criterion, or None when the text has no words
+    """
+    words = WORD_PATTERN.findall(text or '')[:10]
+    if not words:
+        return None
+    ids = matching_ids(entity_type, text)
+    if ids is not None:
+        return id_column.in_(ids)
+    # Prefix-match on the entity's own columns; callers join them for foreign ids
+    return _prefix_criterion(columns, words)
+
+
+def lookup(query, entity_type, columns, text, projection, **expressions):
+    """
+    Up to LIMIT rows of a query that match the typed text, as projection tuples
+
+    An empty text returns the first rows of the query, so a focused field can
+    offer choices before anything is typed.
+    """
+    model = query.column_descriptions[0]['entity']
+    criterion = match_criterion(model.id, entity_type, columns, text)
+    if criterion is not None:
+        query = query.filter(criterion)
+    return fetch(query.limit(LIMIT), projection, **expressions)
@@ -0,0 +1,125 @@
+"""
+Language detection before the full OCR pass
+
+Running Tesseract with one language model is several times faster than with
+the combined ``eng+dan+deu+swe`` set. Before the full pass, a cheap probe
+(the image at reduced size through the English model only) yields rough
+text, and the ad's language is picked from:
+
+1. the listing site named in the text (mobile.de, Blocket, Bilbasen, ...)
+2. site vocabulary ("Erstzulassung", "Miltal", "Forhandler", ...), matched
+   without diacritics since the English model drops most of them
+3. letters only one of the languages uses (ß, æ, ø, ...)
+
+When no language clearly wins, the caller keeps the combined set.
+"""
+import math
+import re
+import unicodedata
+
+from PIL import Image
+
+# Tesseract model per listing site, matched against the lower-cased text
+SOURCE_LANGUAGES = [
+    ('mobile.de', 'deu'), ('mobile de', 'deu'), ('autoscout24.de', 'deu'),
+    ('blocket', 'swe'), ('bytbil', 'swe'),
+    ('bilbasen', 'dan'), ('dba.dk', 'dan'), ('autoscout24.dk', 'dan'),
+]
+
+# Words typical of each language's listings, without diacritics
+KEYWORDS = {
+    'deu': ('erstzulassung', 'kilometerstand', 'kraftstoff', 'getriebe', 'leistung', 'standort',
+            'handler', 'anbieter', 'hubraum', 'fahrzeug', 'unfallfrei', 'schaltgetriebe', 'farbe',
+            'mwst', 'preis', 'sitzheizung', 'anhangerkupplung'),
+    'swe': ('miltal', 'korda mil', 'saljare', 'saljs av', 'forsta reg', 'vaxellada', 'drivmedel',
+            'arsmodell', 'modellar', 'besiktad', 'agare', 'bilens plats', 'hastkrafter', 'farg'),
+    'dan': ('forhandler', 'indregistrering', 'brandstof', 'gearkasse', 'drivmiddel', 'farve',
+            'aargang', 'argang', 'moms', 'hestekraefter', 'saedevarme', 'anhaenger', 'fartpilot'),
+    'eng': ('mileage', 'first registration', 'gearbox', 'transmission', 'fuel type', 'seller',
+            'colour', 'color', 'doors', 'seats'),
+}
+KEYWORD_PATTERNS = {language: re.compile(r'\b(?:' + '|'.join(re.escape(word) for word in words) + r')\b')
+                    for language, words in KEYWORDS.items()}
+
+# Letters that point to one language (or two, sharing the weight)
+LETTER_LANGUAGES = {
+    'ß': ('deu',), 'ü': ('deu',),
+    'æ': ('dan',), 'ø': ('dan',),
+    'å': ('dan', 'swe'), 'ä': ('deu', 'swe'), 'ö': ('deu', 'swe'),
+}
+
+# Scores: a site name settles it; each distinct keyword counts 1, letters count less
+SOURCE_SCORE = 10
+LETTER_WEIGHT = 0.25
+# The winner needs at least this score and this lead over the runner-up
+MIN_SCORE = 2
+MIN_LEAD = 1.5
+
+# Probe image size: at most this many pixels, and never more than half the linear size
+PROBE_MAX_PIXELS = 400_000
+PROBE_MAX_SCALE = 0.5
+PROBE_LANGUAGE = 'eng'
+
+_FOLD = str.maketrans({'æ': 'ae', 'ø': 'o', 'ß': 'ss'})
+
+
+def fold(text):
+    """Lower-cased text without diacritics ("Säljare" -> "saljare")"""
+    text = text.lower().translate(_FOLD)
+    return ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+
+
+def language_scores(text):
+    """Score per Tesseract language code; higher means more likely"""
+    lowered = text.lower()
+    scores = dict.fromkeys(KEYWORDS, 0.0)
+    for needle, language in SOURCE_LANGUAGES:
+        if needle in lowered:
+            scores[language] += SOURCE_SCORE
+    folded = fold(text)
+    for language, pattern in KEYWORD_PATTERNS.items():
+        scores[language] += len(set(pattern.findall(folded)))
+    for letter, languages in LETTER_LANGUAGES.items():
+        count = lowered.count(letter)
+        if count:
+            for language in languages:
+                scores[language] += LETTER_WEIGHT * min(count, 8) / len(languages)
+    return scores
+
+
+def detect_language(text):
+    """
+    Single Tesseract language for the text
+
+    Returns:
+        A language code ('deu', 'swe', 'dan' or 'eng'), or None when the text
+        does not clearly favour one
+    """
+    ranked = sorted(language_scores(text).items(), key=lambda item: item[1], reverse=True)
+    (best, score), (_, runner_up) = ranked[0], ranked[1]
+    if score >= MIN_SCORE and score >= runner_up * MIN_LEAD:
+        return best
+    return None
+
+
+def probe_image(image):
+    """Reduced copy of an image for the probe OCR"""
+    scale = min(PROBE_MAX_SCALE, math.sqrt(PROBE_MAX_PIXELS / max(1, image.width * image.height)))
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    # Binarized (mode '1') images are scaled as grayscale so text stays legible
+    source = image.convert('L') if image.mode == '1' else image
+    return source.resize(size, Image.BILINEAR)
+
+
+def detect_image_language(image, engine):
+    """
+    Single Tesseract language for an image, from a fast low-resolution OCR
+
+    Args:
+        image: PIL image, already preprocessed for OCR
+        engine: utils.ocr_parser OcrEngine
+
+    Returns:
+        A language code, or None when the probe text is inconclusive
+    """
+    return detect_language(engine.image_to_string(probe_image(image), lang=PROBE_LANGUAGE))
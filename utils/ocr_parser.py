@@ -1,45 +1,259 @@
 """
 OCR-based parser for car advertisements from mobile.de, Blocket, etc.
 Extracts structured data from advertisement images/screenshots and PDF files.
+
+Text recognition goes through an OcrEngine kept for the life of the
+process. With tesserocr installed, Tesseract runs in-process and the
+traineddata for OCR_LANGUAGES is loaded once; otherwise pytesseract runs the
+tesseract CLI per image. OCR_ENGINE ('auto', 'tesserocr' or 'pytesseract')
+forces a backend. Scanned PDF pages are OCRed in a process pool of
+OCR_PAGE_WORKERS processes (default: the CPU count); parse job children get
+their share of the CPUs left by the job cap, usually 1, i.e. no pool.
+
+Unless the caller names the languages, each image is probed first
+(utils.ocr_language) and the full OCR runs with the single detected
+language model; it is repeated with all OCR_LANGUAGES when key fields are
+missing from the result.
 """
+import io
 import re
+import threading
 from PIL import Image
 try:
     import pytesseract
 except ImportError:
     pytesseract = None
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Union, BinaryIO
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import os
 import requests
 from bs4 import BeautifulSoup
+from utils.gazetteer import POSTAL_PATTERN, get_gazetteer
+from utils.http_client import get_client
+from utils.listing_data import extract_listing
+from utils.ocr_language import detect_image_language
+from utils.ocr_preprocess import preprocess
+
+OCR_LANGUAGES = 'eng+dan+deu+swe'
+
+# Uploads up to this size are parsed from memory; larger ones are spooled to a temporary file
+IN_MEMORY_MAX_BYTES = 8 * 1024 * 1024
+
+# A file path, the file's bytes, or a binary file object
+FileSource = Union[str, bytes, bytearray, memoryview, BinaryIO]
+
+
+def _as_stream(source: FileSource):
+    """Path or binary file object for Pillow/PyPDF2; bytes are wrapped without copying to disk"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    return source
+
+
+class OcrEngine:
+    """Recognizes the text of PIL images; one instance serves every call in a process"""
+    
+    name = None
+    
+    def image_to_string(self, image: Image.Image, lang: str = OCR_LANGUAGES) -> str:
+        raise NotImplementedError
+    
+    def close(self):
+        pass
+
+
+class TesserocrEngine(OcrEngine):
+    """Tesseract's C API through tesserocr; each language set is initialised once and reused"""
+    
+    name = 'tesserocr'
+    
+    def __init__(self):
+        import tesserocr
+        self._tesserocr = tesserocr
+        self._apis = {}
+        # A TessBaseAPI handles one image at a time
+        self._lock = threading.Lock()
+    
+    def image_to_string(self, image: Image.Image, lang: str = OCR_LANGUAGES) -> str:
+        with self._lock:
+            api = self._apis.get(lang)
+            if api is None:
+                # Same page segmentation as the tesseract CLI default (--psm 3)
+                api = self._apis[lang] = self._tesserocr.PyTessBaseAPI(lang=lang, psm=self._tesserocr.PSM.AUTO)
+            api.SetImage(image)
+            try:
+                return api.GetUTF8Text()
+            finally:
+                api.Clear()
+    
+    def close(self):
+        with self._lock:
+            for api in self._apis.values():
+                api.End()
+            self._apis.clear()
+
+
+class PytesseractEngine(OcrEngine):
+    """Fallback: one tesseract process per image, which loads the traineddata every time"""
+    
+    name = 'pytesseract'
+    
+    def image_to_string(self, image: Image.Image, lang: str = OCR_LANGUAGES) -> str:
+        return pytesseract.image_to_string(image, lang=lang)
+
+
+OCR_ENGINES = {'tesserocr': TesserocrEngine, 'pytesseract': PytesseractEngine}
+
+_ocr_engine = None
+_ocr_engine_pid = None
+_ocr_engine_lock = threading.Lock()
+
+
+def create_ocr_engine(name: str = 'auto') -> Optional[OcrEngine]:
+    """
+    New OCR engine by name; 'auto' prefers tesserocr
+    
+    Returns:
+        The engine, or None when no backend is installed
+    """
+    names = ['tesserocr', 'pytesseract'] if name == 'auto' else [name]
+    for candidate in names:
+        if candidate == 'pytesseract' and pytesseract is None:
+            continue
+        try:
+            return OCR_ENGINES[candidate]()
+        except (ImportError, RuntimeError):
+            # tesserocr missing, or its traineddata not found
+            if name != 'auto':
+                raise
+    return None
+
+
+def get_ocr_engine() -> Optional[OcrEngine]:
+    """OCR engine of this process (chosen by OCR_ENGINE), created on first use and after a fork"""
+    global _ocr_engine, _ocr_engine_pid
+    with _ocr_engine_lock:
+        if _ocr_engine_pid != os.getpid():
+            _ocr_engine = create_ocr_engine(os.environ.get('OCR_ENGINE', 'auto'))
+            _ocr_engine_pid = os.getpid()
+        return _ocr_engine
+
+
+def _init_ocr_worker():
+    """Pool initializer: one Tesseract thread per process, the pool provides the parallelism"""
+    os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+
+
+def _ocr_image(engine: OcrEngine, image: Image.Image, languages: Optional[str] = None) -> tuple[str, str]:
+    """
+    OCR text of a prepared image, and the Tesseract languages it was read with
+
+    With languages None the image's language is detected first; the combined
+    OCR_LANGUAGES are used when detection is inconclusive.
+    """
+    if languages is None:
+        languages = detect_image_language(image, engine) or OCR_LANGUAGES
+    return engine.image_to_string(image, lang=languages), languages
+
+
+def _ocr_pdf_page(pdf: Union[str, bytes], page_number: int, dpi: int, preprocess_profile: Optional[str] = 'scan',
+                  languages: Optional[str] = None) -> tuple[str, str]:
+    """Rasterize and OCR a single PDF page, given by path or bytes (runs in a pool worker)"""
+    from pdf2image import convert_from_bytes, convert_from_path
+    convert = convert_from_path if isinstance(pdf, str) else convert_from_bytes
+    images = convert(pdf, dpi=dpi, first_page=page_number, last_page=page_number,
+                     grayscale=bool(preprocess_profile))
+    try:
+        engine = get_ocr_engine()
+        texts = []
+        for image in images:
+            # Languages detected on the page's first image hold for the rest
+            text, languages = _ocr_image(engine, preprocess(image, preprocess_profile) if preprocess_profile else image,
+                                         languages)
+            texts.append(text)
+        return '\n'.join(texts), languages or OCR_LANGUAGES
+    finally:
+        for image in images:
+            image.close()
+
+
+_page_pool = None
+_page_pool_pid = None
+_page_pool_lock = threading.Lock()
+
+
+def _page_workers() -> int:
+    """Processes for PDF page OCR: OCR_PAGE_WORKERS, default the CPU count"""
+    try:
+        return max(1, int(os.environ.get('OCR_PAGE_WORKERS') or os.cpu_count() or 1))
+    except ValueError:
+        return 1
+
+
+def _get_page_pool(workers: int) -> ProcessPoolExecutor:
+    """Pool for PDF page OCR, kept for the life of the process so its workers' engines stay loaded"""
+    global _page_pool, _page_pool_pid
+    with _page_pool_lock:
+        if _page_pool is None or _page_pool_pid != os.getpid():
+            _page_pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_ocr_worker)
+            _page_pool_pid = os.getpid()
+        return _page_pool
+
+
+def _drop_page_pool():
+    global _page_pool
+    with _page_pool_lock:
+        if _page_pool is not None:
+            _page_pool.shutdown(wait=False, cancel_futures=True)
+        _page_pool = None
+
+
+def _initials(words):
+    """
+    Character class of the words' first letters
+
+    Put in a lookahead before an alternation, it lets the regex engine skip
+    positions that cannot start any of the words without trying each one.
+    """
+    return '[' + ''.join(sorted({re.escape(word[0]) for word in words})) + ']'
+
+
+def _inner_words(words):
+    """Indexes of the words that can start at a word boundary inside another word of the list"""
+    folded = [word.lower() for word in words]
+    inner = []
+    for index, word in enumerate(folded):
+        for outer in folded:
+            starts = [i for i in range(1, len(outer)) if not outer[i - 1].isalnum() and outer[i].isalnum()]
+            if any(outer[i:].startswith(word) or word.startswith(outer[i:]) for i in starts):
+                inner.append(index)
+                break
+    return inner
+
 
 class AdParser:
     """Parse car advertisement images and extract structured data"""
     
-    # Approximate distances from major cities to Aalborg (km)
-    CITY_DISTANCES = {
-        # German cities
-        'BERLIN': 680, 'MÜNCHEN': 1250, 'HAMBURG': 450, 'KÖLN': 750, 'FRANKFURT': 850,
-        'STUTTGART': 1050, 'DÜSSELDORF': 730, 'DORTMUND': 700, 'ESSEN': 720, 'LEIPZIG': 650,
-        'BREMEN': 420, 'DRESDEN': 720, 'HANNOVER': 550, 'NÜRNBERG': 970, 'DUISBURG': 730,
-        'BOCHUM': 700, 'WUPPERTAL': 740, 'BIELEFELD': 620, 'BONN': 760, 'MÜNSTER': 630,
-        'MANNHEIM': 950, 'AUGSBURG': 1200, 'WIESBADEN': 860, 'MÖNCHENGLADBACH': 740,
-        'KARLSRUHE': 990, 'AACHEN': 800, 'KIEL': 280, 'FLENSBURG': 180,
-        'SIEGEN': 873, 'KASSEL': 660, 'ERFURT': 720, 'HALLE': 680, 'MAGDEBURG': 620,
-        'BRAUNSCHWEIG': 600, 'CHEMNITZ': 740, 'LÜBECK': 350, 'ROSTOCK': 480, 'POTSDAM': 690,
-        'OLDENBURG': 400, 'OSNABRÜCK': 560, 'REGENSBURG': 1080, 'WÜRZBURG': 900, 'INGOLSTADT': 1150,
-        'ULM': 1150,
-        # Swedish cities
-        'STOCKHOLM': 1100, 'GÖTEBORG': 330, 'MALMÖ': 470, 'UPPSALA': 1050, 'VÄSTERÅS': 1000,
-        'ÖREBRO': 900, 'LINKÖPING': 950, 'HELSINGBORG': 460, 'JÖNKÖPING': 700, 'NORRKÖPING': 950,
-        'LUND': 480, 'UMEÅ': 1800, 'GÄVLE': 1200, 'BORÅS': 400, 'SÖDERTÄLJE': 1100,
-        'ESKILSTUNA': 1000, 'KARLSTAD': 800, 'SUNDSVALL': 1450, 'HALMSTAD': 400, 'VÄXJÖ': 550
-    }
+    # Part of the parse result cache key; bump when OCR settings change results
+    # (code changes to this class are picked up automatically)
+    PARSER_VERSION = '3'
     
     # Diesel consumption and price (average for transport vehicles)
     DIESEL_CONSUMPTION_PER_100KM = 12.0  # liters per 100 km
     DIESEL_PRICE_DKK = 13.50  # DKK per liter (approximate)
     
+    # Scanned PDFs: pages OCR'd at most, render resolution, and the fields
+    # that end the OCR early once all of them are found
+    PDF_OCR_MAX_PAGES = 3
+    PDF_OCR_DPI = 300
+    KEY_FIELDS = ('vin', 'price', 'make', 'year')
+    # OCR with a detected single language is repeated with all
+    # OCR_LANGUAGES when any of these fields is missing
+    LANGUAGE_RETRY_FIELDS = ('price', 'make', 'year')
+    # Listing pages whose embedded structured data has all of these skip text scraping
+    STRUCTURED_FIELDS = ('make', 'model', 'price')
+    
     # Common patterns for extracting information
     VIN_PATTERN = re.compile(r'\b[A-HJ-NPR-Z0-9]{17}\b', re.IGNORECASE)
     PRICE_PATTERN = re.compile(r'([\d\s\.\,]+)\s*((?:DKK|EUR|SEK|€|kr))(?=\s|\n|$)', re.IGNORECASE)
@@ -47,7 +261,7 @@ class AdParser:
     YEAR_PATTERN = re.compile(r'\b(19\d{2}|20[0-2]\d)\b')
     MILEAGE_PATTERN = re.compile(r'([\d\.\,]+)\s*(?:km|kilometer)', re.IGNORECASE)
     POWER_PATTERN = re.compile(r'([\d]+)\s*(?:hk|hp|ps|kw)', re.IGNORECASE)
-    REGISTRATION_PATTERN = re.compile(r'(?:Reg|Registration|Första reg|Erstzulassung|Første indregistrering)[:\s]*([\d]{1,2}[\/\-\.][\d]{1,2}[\/\-\.][\d]{2,4})', re.IGNORECASE)
+    REGISTRATION_PATTERN = re.compile(r'(?=[EFR])(?:Reg|Registration|Första reg|Erstzulassung|Første indregistrering)[:\s]*([\d]{1,2}[\/\-\.][\d]{1,2}[\/\-\.][\d]{2,4})', re.IGNORECASE)
     COLOR_PATTERN = re.compile(r'(?:Farve|Färg|Color|Colour|Farbe)[:\s]*([A-Za-zæøåÆØÅäöüÄÖÜß\s]+?)(?:\n|,|$)', re.IGNORECASE)
     DOORS_PATTERN = re.compile(r'([\d])\s*(?:døre|dörrar|doors|türen)', re.IGNORECASE)
     SEATS_PATTERN = re.compile(r'([\d])\s*(?:sæde|säten|seats|sitzplätze)', re.IGNORECASE)
@@ -93,81 +307,201 @@ class AdParser:
         'Dacia', 'Suzuki', 'Subaru', 'Mitsubishi', 'Jeep', 'Chevrolet', 'Cadillac'
     ]
     
+    # Extraction tables for _parse_text, compiled once at import
+    
+    # Group n+1 holds CAR_MAKES[n]; at each position the first make in list order wins
+    MAKES_PATTERN = re.compile(r'\b(?=' + _initials(CAR_MAKES) + r')(?:'
+                               + '|'.join(f'({re.escape(make)})' for make in CAR_MAKES) + r')\b', re.IGNORECASE)
+    # Makes that can start inside another make (as "Rover" would in "Land
+    # Rover"), which a single scan steps over; searched separately as (index, pattern)
+    INNER_MAKES = [(index, re.compile(r'\b' + re.escape(CAR_MAKES[index]) + r'\b', re.IGNORECASE))
+                   for index in _inner_words(CAR_MAKES)]
+    # Model: words after the make, before year/price/specs (skipping newlines and slashes)
+    MODEL_PATTERN = re.compile(r'^[\s/\n]*([A-Z0-9][A-Za-z0-9\-\s\+]{1,40}?)(?:[\s\n]*(?:\d{4}|€|DKK|SEK|kr|\n\n|Säljs|Modellår|Model|AMG|Benzin|Diesel|Automatik|Manuel))', re.IGNORECASE)
+    # "Brand Model Year" when no known make is found
+    BRAND_MODEL_PATTERN = re.compile(r'(?:^|\n)\s*([A-Z][a-z]+(?:\s+[A-Z][a-z]+)?)\s+([A-Z0-9][A-Za-z0-9\-\s]{2,20}?)\s+(?:\d{4})', re.MULTILINE)
+    
+    # (pattern, multiplier): Swedish "mil" is 10 km
+    MILEAGE_PATTERNS = [
+        (re.compile(r'(?:Miltal|Körda mil)[:\s]*([0-9\s]+)\s*mil(?!j|k)', re.IGNORECASE), 10),
+        (re.compile(r'([0-9\s]+)\s*mil(?!j|k)(?:\n|\s|$)', re.IGNORECASE), 10),  # "670 mil"
+        (re.compile(r'(?:Kilometerstand|Mileage)[:\s]*([0-9\.\,\s]+)\s*km', re.IGNORECASE), 1),
+        (re.compile(r'([0-9]{2,7}[\.]{0,1}[0-9]{3})\s*km', re.IGNORECASE), 1),  # Standard format
+        (re.compile(r'([0-9\.\,\s]+)\s*km', re.IGNORECASE), 1)  # Any number + km
+    ]
+    
+    COLOR_PATTERNS = [
+        re.compile(r'(?=[CFL])(?:Farve|Färg|Color|Colour|Farbe|Lackierung)[:\s]*([A-Za-zæøåÆØÅäöüÄÖÜß\s\-]+?)(?:\n|,|;|\||$)', re.IGNORECASE),
+        re.compile(r'\b(?=[BGHRSVWY])(Sort|Hvid|Grå|Sølv|Rød|Blå|Grøn|Gul|Brun|Schwarz|Weiß|Grau|Silber|Rot|Blau|Grün|Gelb|Braun|Black|White|Gray|Silver|Red|Blue|Green|Yellow|Brown|Svart|Vit|Grå|Silver|Röd|Blå|Grön|Gul|Brun)\b', re.IGNORECASE)
+    ]
+    
+    DEALER_PATTERNS = [
+        re.compile(r'(?:Säljs av|Säljare)[:\s]+([A-ZÄÖÜ0-9][A-Za-zäöüÄÖÜß0-9\s&\.\-]+?)(?:\n|Skriv|Visa|Tel|$)', re.IGNORECASE),
+        re.compile(r'(?=[ADFH])(?:Händler|Dealer|Forhandler|Anbieter)[:\s]*([A-ZÄÖÜ0-9][A-Za-zäöüÄÖÜß0-9\s&\.\-]+?)(?:\n|Standort|Location|Ort|Tel|Telefon|Phone|$)', re.IGNORECASE),
+        re.compile(r'(?=[SV])(?:Verkäufer|Seller)[:\s]*([A-ZÄÖÜ0-9][A-Za-zäöüÄÖÜß0-9\s&\.\-]+?)(?:\n|Standort|Location|Ort|Tel|$)', re.IGNORECASE),
+    ]
+    # Last resort: a company name before its legal form. The name may span
+    # lines, so searching this over the whole text retries every start across
+    # long runs of words; _search_company only runs it over runs that contain
+    # a legal form.
+    COMPANY_PATTERN = re.compile(r'([A-ZÄÖÜ][A-Za-zäöüÄÖÜß\s&\.]+?)\s+(?:GmbH|AG|AB|KG|OHG|Ltd|ApS|A/S)', re.IGNORECASE)
+    COMPANY_RUN_PATTERN = re.compile(r'[A-Za-zäöüÄÖÜß\s&\.]+', re.IGNORECASE)
+    COMPANY_FORM_PATTERN = re.compile(r'\s+(?:GmbH|AG|AB|KG|OHG|Ltd|ApS|A/S)', re.IGNORECASE)
+    COMPANY_START_PATTERN = re.compile(r'[A-ZÄÖÜ]', re.IGNORECASE)
+    INVALID_DEALER_PATTERN = re.compile('|'.join(re.escape(word) for word in [
+        'Location', 'This listing', 'Standort', 'Ort', 'Description', 'Details',
+        'Map', 'View', 'Show', 'Contact', 'Call', 'Email', 'Website']), re.IGNORECASE)
+    DEALER_TRAILER_PATTERN = re.compile(r'\s*(?:Tel|Phone|Telefon|Contact).*$', re.IGNORECASE)
+    
+    LOCATION_PATTERNS = [
+        # Swedish format like "598 21 VIMMERBY" or "Badhusgatan 7, 598 21 VIMMERBY"
+        re.compile(r'\d{3}\s+\d{2}\s+([A-ZÄÖÜ][A-Za-zäöüÄÖÜß\s\-]{3,30})(?:\n|,|$|Till)', re.IGNORECASE),
+        # After "Standort/Location/Ort" label with optional postal code
+        re.compile(r'(?:Standort|Location|Ort|Placering|Bilens plats)[:\s]*(?:[A-Z]{2}[-\s])?\d{4,5}\s+([A-ZÄÖÜ][A-Za-zäöüÄÖÜß\s\-]+?)(?:\n|,|;|\||Tel|Phone|Dealer)', re.IGNORECASE),
+        # Just postal code + city (German format)
+        re.compile(r'(?:[A-Z]{2}[-\s])?\d{4,5}\s+([A-ZÄÖÜ][A-Za-zäöüÄÖÜß\s\-]{3,30})(?:\n|,|;)', re.IGNORECASE),
+        # Known city names in text
+        re.compile(r'\b(?=' + _initials(GERMAN_CITIES + SWEDISH_CITIES) + r')(' + '|'.join(GERMAN_CITIES + SWEDISH_CITIES) + r')\b',
+                   re.IGNORECASE)
+    ]
+    INVALID_LOCATION_PATTERN = re.compile('|'.join([
+        'this', 'listing', 'map', 'location', 'click', 'view', 'see',
+        'description', 'show', 'more', 'details', 'information', 'contact',
+        'website', 'email', 'phone', 'telefon', 'dealer', 'seller',
+        'stolar', 'säten', 'dörrar', 'wheels', 'doors', 'seats']))
+    LOCATION_TRAILER_PATTERN = re.compile(r'\s*(?:Tel|Phone|Telefon).*$', re.IGNORECASE)
+    
+    # Keyword lists are checked by substring against the upper-cased text;
+    # for lists this short that is faster than one combined regex scan.
+    # Import country signals (besides GERMAN_CITIES and SWEDISH_CITIES):
+    GERMAN_WORDS = ('STANDORT', 'HÄNDLER', 'ERSTZULASSUNG', 'FAHRZEUGHALTER', 'HU', 'TÜV')
+    GERMAN_COMPANY_WORDS = ('GMBH', 'KG', 'OHG')
+    SWEDISH_WORDS = ('SÄLJARE', 'SÄLJS AV', 'FÖRSTA REG', 'ÄGARE', 'BESIKTAD', 'MILTAL', 'KÖRDA MIL')
+    SWEDISH_COMPANY_WORDS = (' AB ', 'AKTIEBOLAG')
+    GERMAN_PHONE_PATTERN = re.compile(r'\+49\s|\(49\)')
+    SWEDISH_PHONE_PATTERN = re.compile(r'\+46\s|\(46\)|^46\s')
+    
+    FUEL_PATTERNS = [
+        re.compile(r'Drivmedel[:\s\n]*(El|Diesel|Bensin|Hybrid)', re.IGNORECASE),
+        re.compile(r'Fuel[:\s\n]*(Electric|Diesel|Petrol|Gasoline|Hybrid)', re.IGNORECASE),
+    ]
+    FUEL_VALUES = {'EL': 'electric', 'ELECTRIC': 'electric', 'DIESEL': 'diesel', 'BENSIN': 'gasoline',
+                   'PETROL': 'gasoline', 'GASOLINE': 'gasoline', 'HYBRID': 'hybrid'}
+    # Keyword fallback, checked in this order
+    FUEL_KEYWORDS = [
+        ('diesel', ('DIESEL', 'DIESELMOTOR', 'TDI', 'D-')),
+        ('gasoline', ('BENZIN', 'PETROL', 'GASOLINE', 'TSI', 'FSI', 'BENSIN')),
+        ('electric', ('ELECTRIC', 'ELEKTRISK', 'BATTERY', 'BATTERI', 'EQB', 'EQC', 'EQA', 'E-TRON', 'TAYCAN')),
+        ('hybrid', ('HYBRID', 'PLUG-IN', 'PHEV')),
+    ]
+    AUTOMATIC_WORDS = ('AUTOMATIC', 'AUTOMATGEAR', 'AUTOMAT', 'DSG', 'TIPTRONIC', 'STEPTRONIC')
+    MANUAL_WORDS = ('MANUAL', 'MANUELL', 'SCHALTGETRIEBE')
+    # (keyword, upper-cased keyword)
+    EQUIPMENT_WORDS = [(keyword, keyword.upper()) for keyword in EQUIPMENT_KEYWORDS]
+    
     @staticmethod
-    def parse_image(image_path: str) -> Dict[str, Any]:
+    def parse_image(image: FileSource, preprocess_profile: Optional[str] = 'screenshot',
+                    languages: Optional[str] = None) -> Dict[str, Any]:
         """
         Parse an advertisement image and extract car information
         
         Args:
-            image_path: Path to the advertisement image file
+            image: Path, bytes or binary file object of the advertisement image
+            preprocess_profile: utils.ocr_preprocess profile, or None to OCR the image as is
+            languages: Tesseract languages ("deu", "eng+dan+deu+swe"), or None to detect them
             
         Returns:
             Dictionary with extracted fields (vin, make, model, year, price, mileage, etc.)
         """
         try:
-            if pytesseract is None:
-                return {'error': 'OCR not available - pytesseract not installed'}
+            engine = get_ocr_engine()
+            if engine is None:
+                return {'error': 'OCR not available - tesserocr or pytesseract not installed'}
             
-            # Open and preprocess image
-            image = Image.open(image_path)
+            # Open (decoding straight from memory for bytes) and preprocess image
+            image = Image.open(_as_stream(image))
             
-            # Convert to RGB if needed
-            if image.mode != 'RGB':
+            if preprocess_profile:
+                image = preprocess(image, preprocess_profile)
+            elif image.mode != 'RGB':
                 image = image.convert('RGB')
             
             # Extract text using OCR
-            text = pytesseract.image_to_string(image, lang='eng+dan+deu+swe')
+            text, used_languages = _ocr_image(engine, image, languages)
             
             # Parse extracted text
             data = AdParser._parse_text(text)
             
+            if languages is None and used_languages != OCR_LANGUAGES and AdParser._missing_fields(data):
+                # Wrong guess or a mixed-language ad: read it again with every model
+                retry = AdParser._parse_text(engine.image_to_string(image, lang=OCR_LANGUAGES))
+                if len(AdParser._missing_fields(retry)) <= len(AdParser._missing_fields(data)):
+                    data = retry
+            
             return data
             
         except Exception as e:
             return {'error': str(e)}
     
     @staticmethod
-    def parse_pdf(pdf_path: str) -> Dict[str, Any]:
+    def parse_pdf(pdf: FileSource) -> Dict[str, Any]:
         """
         Parse a PDF advertisement and extract car information
         
         Args:
-            pdf_path: Path to the PDF file
+            pdf: Path, bytes or binary file object of the PDF
             
         Returns:
             Dictionary with extracted fields
         """
         try:
             try:
-                from pdf2image import convert_from_path
+                from pdf2image import pdfinfo_from_bytes, pdfinfo_from_path
             except ImportError:
-                convert_from_path = None
+                pdfinfo_from_bytes = pdfinfo_from_path = None
             import PyPDF2
             
+            if not isinstance(pdf, (str, bytes)):
+                # Pool workers get the PDF as bytes (or a path); read file objects once
+                pdf = pdf.read() if hasattr(pdf, 'read') else bytes(pdf)
+            
             combined_text = ""
+            page_count = None
             
             # First try to extract text directly from PDF (if it's not scanned)
             try:
-                with open(pdf_path, 'rb') as file:
-                    pdf_reader = PyPDF2.PdfReader(file)
-                    for page in pdf_reader.pages:
-                        page_text = page.extract_text()
-                        if page_text:
-                            combined_text += page_text + "\n"
+                pdf_reader = PyPDF2.PdfReader(_as_stream(pdf))
+                page_count = len(pdf_reader.pages)
+                for page in pdf_reader.pages:
+                    page_text = page.extract_text()
+                    if page_text:
+                        combined_text += page_text + "\n"
             except:
                 pass
             
             # If no text or very little text, use OCR on images
             if len(combined_text.strip()) < 50:
-                if convert_from_path is None or pytesseract is None:
+                if pdfinfo_from_path is None or get_ocr_engine() is None:
                     return {'error': 'PDF OCR not available - dependencies not installed'}
-                # Convert PDF pages to images
-                images = convert_from_path(pdf_path, dpi=300, first_page=1, last_page=3)
+                if page_count is None:
+                    pdfinfo = pdfinfo_from_path if isinstance(pdf, str) else pdfinfo_from_bytes
+                    page_count = pdfinfo(pdf)['Pages']
                 
-                # Extract text from each page
-                for i, image in enumerate(images):
-                    text = pytesseract.image_to_string(image, lang='eng+dan+deu+swe')
-                    combined_text += text + "\n"
+                extracted_text = combined_text
+                combined_text, data, narrowed = AdParser._ocr_pdf_text(pdf, page_count, extracted_text)
+                if data is not None:
+                    return data
+                
+                data = AdParser._parse_text(combined_text)
+                if narrowed and AdParser._missing_fields(data):
+                    # Wrong guess or a mixed-language ad: read the pages again with every model
+                    retry_text, retry, _ = AdParser._ocr_pdf_text(pdf, page_count, extracted_text, OCR_LANGUAGES)
+                    if retry is not None:
+                        return retry
+                    retry = AdParser._parse_text(retry_text)
+                    if len(AdParser._missing_fields(retry)) <= len(AdParser._missing_fields(data)):
+                        return retry
+                return data
             
             # Parse the combined text
             data = AdParser._parse_text(combined_text)
@@ -177,43 +511,181 @@ class AdParser:
         except Exception as e:
             return {'error': str(e)}
     
+    @staticmethod
+    def _missing_fields(data: Dict[str, Any]):
+        """LANGUAGE_RETRY_FIELDS absent from a parse result"""
+        return [field for field in AdParser.LANGUAGE_RETRY_FIELDS if not data.get(field)]
+    
+    @staticmethod
+    def _ocr_pdf_text(pdf: Union[str, bytes], page_count: int, text: str, languages: Optional[str] = None):
+        """
+        Append the OCR text of a PDF's first pages to text, page by page
+        
+        Pages arrive in order; OCR stops as soon as the key fields are found.
+        
+        Returns:
+            Tuple of (text, data, narrowed): data is the parse result when all
+            KEY_FIELDS were found and None otherwise; narrowed tells whether
+            any page was read with fewer than all OCR_LANGUAGES
+        """
+        narrowed = False
+        page_texts = AdParser._ocr_pdf_pages(pdf, page_count, languages)
+        try:
+            for page_text, page_languages in page_texts:
+                narrowed = narrowed or page_languages != OCR_LANGUAGES
+                text += page_text + "\n"
+                data = AdParser._parse_text(text)
+                if all(data.get(field) for field in AdParser.KEY_FIELDS):
+                    return text, data, narrowed
+        finally:
+            page_texts.close()
+        return text, None, narrowed
+    
+    @staticmethod
+    def _ocr_pdf_pages(pdf: Union[str, bytes], page_count: int, languages: Optional[str] = None):
+        """
+        OCR the first pages of a PDF, yielding each page's text and languages in page order
+        
+        Every page is rendered and recognised on its own in a pool worker, so
+        at most one page image per worker is in memory. The pool outlives the
+        call, so later PDFs reuse warm workers. Closing the generator early
+        cancels the pages that have not started yet.
+        
+        Args:
+            pdf: Path to the PDF file, or its bytes
+            page_count: Number of pages in the PDF
+            languages: Tesseract languages, or None to detect them per page
+        """
+        pages = range(1, min(page_count, AdParser.PDF_OCR_MAX_PAGES) + 1)
+        workers = min(len(pages), _page_workers())
+        if workers <= 1:
+            for page_number in pages:
+                yield _ocr_pdf_page(pdf, page_number, AdParser.PDF_OCR_DPI, languages=languages)
+            return
+        
+        pool = _get_page_pool(min(AdParser.PDF_OCR_MAX_PAGES, _page_workers()))
+        # Only the pool's workers run pages at once; the rest wait as cheap queued calls
+        futures = [pool.submit(_ocr_pdf_page, pdf, page_number, AdParser.PDF_OCR_DPI, languages=languages)
+                   for page_number in pages]
+        try:
+            for future in futures:
+                yield future.result()
+        except BrokenProcessPool:
+            _drop_page_pool()
+            raise
+        finally:
+            for future in futures:
+                future.cancel()
+    
+    # Request headers for listing pages
+    MOBILE_DE_HEADERS = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+        'Accept-Language': 'de-DE,de;q=0.9',
+        'Accept-Encoding': 'gzip, deflate, br',
+        'DNT': '1',
+        'Connection': 'keep-alive',
+        'Upgrade-Insecure-Requests': '1',
+        'Sec-Fetch-Dest': 'document',
+        'Sec-Fetch-Mode': 'navigate',
+        'Sec-Fetch-Site': 'none',
+        'Sec-Fetch-User': '?1',
+        'Cache-Control': 'max-age=0'
+    }
+    DEFAULT_HEADERS = {
+        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+        'Accept-Language': 'da,en-US;q=0.9,en;q=0.8,de;q=0.7',
+        'Accept-Encoding': 'gzip, deflate, br',
+        'DNT': '1',
+        'Connection': 'keep-alive',
+        'Upgrade-Insecure-Requests': '1',
+        'Sec-Fetch-Dest': 'document',
+        'Sec-Fetch-Mode': 'navigate',
+        'Sec-Fetch-Site': 'none',
+        'Cache-Control': 'max-age=0'
+    }
+    
+    @staticmethod
+    def _html_to_text(content: bytes, drop_tags=("script", "style")) -> str:
+        """Visible text of an HTML page, one phrase per line"""
+        soup = BeautifulSoup(content, 'html.parser')
+        
+        # Remove script and style elements
+        for script in soup(list(drop_tags)):
+            script.decompose()
+        
+        # Get text
+        text = soup.get_text(separator='\n')
+        
+        # Clean up text
+        lines = (line.strip() for line in text.splitlines())
+        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+        return '\n'.join(chunk for chunk in chunks if chunk)
+    
+    @staticmethod
+    def _parse_listing(content: Union[str, bytes], url: str, drop_tags=("script", "style"),
+                       text: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Extract car information from a listing page's HTML
+        
+        The page's embedded JSON-LD / __NEXT_DATA__ is read first (see
+        utils.listing_data). Only when it lacks any of STRUCTURED_FIELDS is the
+        page flattened to text for _parse_text, and the structured values
+        then replace the guesses from the text.
+        
+        Args:
+            content: HTML of the page
+            url: URL of the page (selects the site's extractor)
+            drop_tags: Tags left out of the text for the fallback
+            text: Visible text of the page, when already known
+            
+        Returns:
+            Dictionary with extracted fields; raw_ocr_text is only set when the text was scraped
+        """
+        structured = extract_listing(content, url)
+        postal_code = structured.pop('postal_code', None)
+        if all(structured.get(field) for field in AdParser.STRUCTURED_FIELDS):
+            data = structured
+        else:
+            data = AdParser._parse_text(text if text is not None else AdParser._html_to_text(content, drop_tags))
+            data.update(structured)
+        
+        if structured.get('location'):
+            transport_cost, distance_km = AdParser._calculate_transport_cost(
+                data['location'], data.get('import_country'), postal_code)
+            data.pop('transport_cost', None)
+            data.pop('distance_km', None)
+            if transport_cost:
+                data['transport_cost'] = transport_cost
+                data['distance_km'] = distance_km
+        
+        data['ad_url'] = url
+        return data
+    
     @staticmethod
     def parse_url(url: str) -> Dict[str, Any]:
         """
         Parse an advertisement URL and extract car information
         
+        Pages are fetched with the shared client in utils.http_client, so
+        connections are reused and unchanged pages come from its cache.
+        Embedded structured data is preferred over scraping the page text.
+        
         Args:
             url: URL of the advertisement
             
         Returns:
             Dictionary with extracted fields
         """
+        client = get_client()
         try:
             # Mobile.de has very strong bot protection - try requests with special headers first
             if 'mobile.de' in url:
                 print(f"[INFO] Detected mobile.de - trying with optimized headers...")
                 
-                # Try multiple strategies for mobile.de
-                session = requests.Session()
-                
-                # Strategy 1: Desktop Chrome with German locale
-                headers = {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                    'Accept-Language': 'de-DE,de;q=0.9',
-                    'Accept-Encoding': 'gzip, deflate, br',
-                    'DNT': '1',
-                    'Connection': 'keep-alive',
-                    'Upgrade-Insecure-Requests': '1',
-                    'Sec-Fetch-Dest': 'document',
-                    'Sec-Fetch-Mode': 'navigate',
-                    'Sec-Fetch-Site': 'none',
-                    'Sec-Fetch-User': '?1',
-                    'Cache-Control': 'max-age=0'
-                }
-                
                 try:
-                    response = session.get(url, headers=headers, timeout=15, allow_redirects=True)
+                    response = client.get(url, headers=AdParser.MOBILE_DE_HEADERS)
                     
                     # Check if we got blocked
                     if response.status_code == 403 or 'Zugriff verweigert' in response.text or 'Access denied' in response.text:
@@ -227,22 +699,11 @@ class AdParser:
                     
                     response.raise_for_status()
                     
-                    soup = BeautifulSoup(response.content, 'html.parser')
-                    
-                    # Remove script and style elements
-                    for script in soup(["script", "style", "noscript"]):
-                        script.decompose()
-                    
-                    # Get text
-                    text = soup.get_text(separator='\n')
+                    data = AdParser._parse_listing(response.content, url, ("script", "style", "noscript"))
                     
-                    # Clean up text
-                    lines = (line.strip() for line in text.splitlines())
-                    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-                    text = '\n'.join(chunk for chunk in chunks if chunk)
-                    
-                    # Check if we actually got car data
-                    if len(text) < 500 or 'Zugriff' in text:
+                    # Check if we actually got car data (only scraped pages carry their text)
+                    text = data.get('raw_ocr_text')
+                    if text is not None and (len(text) < 500 or 'Zugriff' in text):
                         return {
                             'error': 'Mobile.de blokerer automatisk adgang',
                             'blocked': True,
@@ -250,10 +711,6 @@ class AdParser:
                             'help_text': 'Brug alternativ metode: kopier data manuelt eller upload screenshot'
                         }
                     
-                    # Parse the text
-                    data = AdParser._parse_text(text)
-                    data['ad_url'] = url
-                    
                     return data
                     
                 except Exception as e:
@@ -264,28 +721,10 @@ class AdParser:
                         'help_text': 'Prøv at kopiere bilens data manuelt fra mobile.de'
                     }
             
-            # For Blocket, use Selenium directly (JavaScript rendering)
-            elif 'blocket.se' in url:
-                print(f"[INFO] Detected Blocket.se - using Selenium...")
-                return AdParser._parse_url_with_selenium(url)
-            
-            # Try with requests first (faster) for other sites
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                'Accept-Language': 'da,en-US;q=0.9,en;q=0.8,de;q=0.7',
-                'Accept-Encoding': 'gzip, deflate, br',
-                'DNT': '1',
-                'Connection': 'keep-alive',
-                'Upgrade-Insecure-Requests': '1',
-                'Sec-Fetch-Dest': 'document',
-                'Sec-Fetch-Mode': 'navigate',
-                'Sec-Fetch-Site': 'none',
-                'Cache-Control': 'max-age=0'
-            }
-            
-            session = requests.Session()
-            response = session.get(url, headers=headers, timeout=15, allow_redirects=True)
+            # Try with requests first (faster); Blocket renders most listings
+            # with JavaScript, so it falls back to Selenium unless the page
+            # already carries the make and price
+            response = client.get(url, headers=AdParser.DEFAULT_HEADERS)
             
             # If blocked, try with Selenium
             if response.status_code == 403:
@@ -293,23 +732,11 @@ class AdParser:
             
             response.raise_for_status()
             
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Remove script and style elements
-            for script in soup(["script", "style"]):
-                script.decompose()
-            
-            # Get text
-            text = soup.get_text(separator='\n')
-            
-            # Clean up text
-            lines = (line.strip() for line in text.splitlines())
-            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-            text = '\n'.join(chunk for chunk in chunks if chunk)
+            data = AdParser._parse_listing(response.content, url)
             
-            # Parse the text
-            data = AdParser._parse_text(text)
-            data['ad_url'] = url
+            if 'blocket.se' in url and not ('make' in data and 'price' in data):
+                print(f"[INFO] Detected Blocket.se - using Selenium...")
+                return AdParser._parse_url_with_selenium(url)
             
             return data
             
@@ -399,6 +826,8 @@ class AdParser:
                     # For other sites, general wait
                     time.sleep(4)
                 
+                page_source = driver.page_source
+                
                 # Get page text directly using JavaScript for better encoding
                 try:
                     # Try to get body text via JavaScript
@@ -410,7 +839,6 @@ class AdParser:
                         raise Exception("Empty text")
                 except:
                     # Fallback to parsing HTML
-                    page_source = driver.page_source
                     print(f"[SELENIUM] Page source length: {len(page_source)} bytes")
                     
                     # Parse with BeautifulSoup
@@ -430,11 +858,8 @@ class AdParser:
                     
                     print(f"[SELENIUM] Extracted text via BS4: {len(text)} chars")
                 
-                # Parse the text
-                data = AdParser._parse_text(text)
-                data['ad_url'] = url
-                
-                return data
+                # Structured data in the rendered page first, then the text
+                return AdParser._parse_listing(page_source, url, text=text)
                 
             finally:
                 driver.quit()
@@ -445,9 +870,36 @@ class AdParser:
         except Exception as e:
             return {'error': f'Selenium fejl: {str(e)}', 'selenium_error': True}
 
+    @staticmethod
+    def _search_company(text: str):
+        """
+        First COMPANY_PATTERN match in the text, in linear time
+
+        A match lies within one run of name characters (plus the legal form),
+        so only runs where a legal form follows a possible first letter are
+        searched, and only up to that legal form.
+        """
+        for run in AdParser.COMPANY_RUN_PATTERN.finditer(text):
+            first = AdParser.COMPANY_START_PATTERN.search(text, run.start(), run.end())
+            if not first:
+                continue
+            # The name has at least two characters; the legal form may end
+            # past the run (the "/S" of A/S)
+            form = AdParser.COMPANY_FORM_PATTERN.search(text, first.end() + 1, run.end() + 2)
+            if form:
+                match = AdParser.COMPANY_PATTERN.search(text, run.start(), form.end())
+                if match:
+                    return match
+        return None
+    
     @staticmethod
     def _parse_text(text: str) -> Dict[str, Any]:
-        """Extract structured data from OCR text with improved multilingual support"""
+        """
+        Extract structured data from OCR text with improved multilingual support
+        
+        All patterns are compiled at import (see the tables above) and each
+        runs in linear time, so long HTML-derived texts parse quickly.
+        """
         data = {}
         text_upper = text.upper()
         
@@ -456,40 +908,41 @@ class AdParser:
         if vin_match:
             data['vin'] = vin_match.group(0).upper()
         
-        # Extract car make and model FIRST (improved detection)
-        make_found = False
-        for make in AdParser.CAR_MAKES:
-            # Case-insensitive search with word boundaries
-            pattern = re.compile(rf'\b{re.escape(make)}\b', re.IGNORECASE)
-            make_match = pattern.search(text)
-            if make_match:
-                data['make'] = make
-                make_found = True
-                
-                # Try to extract model (words after make, before year/price/specs)
-                # Look for 2-3 words after the make
-                after_make = text[make_match.end():make_match.end()+150]
-                # Clean and extract model - improved pattern to capture model numbers/letters
-                # Skip over newlines and slashes first
-                model_pattern = re.compile(r'^[\s/\n]*([A-Z0-9][A-Za-z0-9\-\s\+]{1,40}?)(?:[\s\n]*(?:\d{4}|€|DKK|SEK|kr|\n\n|Säljs|Modellår|Model|AMG|Benzin|Diesel|Automatik|Manuel))', re.IGNORECASE)
-                model_match = model_pattern.search(after_make)
-                if model_match:
-                    model = model_match.group(1).strip()
-                    # Clean up model (remove trailing junk but keep + and numbers)
-                    # Split by newline first to avoid getting too much
-                    model = model.split('\n')[0].strip()
-                    # Remove any leading slashes or spaces
-                    model = model.lstrip('/ ')
-                    model_words = model.split()[:4]  # Max 4 words/parts
-                    if model_words:
-                        data['model'] = ' '.join(model_words)
+        # Extract car make and model FIRST: the earliest make in CAR_MAKES order
+        # wins, at its first occurrence in the text
+        make_match = make_index = None
+        for match in AdParser.MAKES_PATTERN.finditer(text):
+            if make_match is None or match.lastindex - 1 < make_index:
+                make_match, make_index = match, match.lastindex - 1
+                if make_index == 0:
+                    break
+        for index, pattern in AdParser.INNER_MAKES:
+            if make_match is not None and index >= make_index:
+                break
+            match = pattern.search(text)
+            if match:
+                make_match, make_index = match, index
                 break
         
-        # If make not found in list, try to extract from common patterns
-        if not make_found:
-            # Look for patterns like "Brand Model Year" or "Year Brand Model"
-            brand_model_pattern = re.compile(r'(?:^|\n)\s*([A-Z][a-z]+(?:\s+[A-Z][a-z]+)?)\s+([A-Z0-9][A-Za-z0-9\-\s]{2,20}?)\s+(?:\d{4})', re.MULTILINE)
-            bm_match = brand_model_pattern.search(text)
+        if make_match:
+            data['make'] = AdParser.CAR_MAKES[make_index]
+            
+            # Try to extract model (words after make, before year/price/specs)
+            make_end = make_match.end()
+            after_make = text[make_end:make_end+150]
+            model_match = AdParser.MODEL_PATTERN.search(after_make)
+            if model_match:
+                model = model_match.group(1).strip()
+                # Split by newline first to avoid getting too much
+                model = model.split('\n')[0].strip()
+                # Remove any leading slashes or spaces
+                model = model.lstrip('/ ')
+                model_words = model.split()[:4]  # Max 4 words/parts
+                if model_words:
+                    data['model'] = ' '.join(model_words)
+        else:
+            # Make not in list: look for patterns like "Brand Model Year"
+            bm_match = AdParser.BRAND_MODEL_PATTERN.search(text)
             if bm_match:
                 data['make'] = bm_match.group(1).strip()
                 data['model'] = bm_match.group(2).strip()
@@ -508,19 +961,10 @@ class AdParser:
         
         # Extract price and currency
         # Try pattern with "Pris" label first
-        price_match = AdParser.PRICE_PATTERN_AFTER.search(text)
-        after = False
-        if not price_match:
-            price_match = AdParser.PRICE_PATTERN.search(text)
-            after = True
-        
+        price_match = AdParser.PRICE_PATTERN_AFTER.search(text) or AdParser.PRICE_PATTERN.search(text)
         if price_match:
-            if after:
-                price_str = price_match.group(1)
-                currency_raw = price_match.group(2).upper()
-            else:
-                price_str = price_match.group(1)
-                currency_raw = price_match.group(2).upper()
+            price_str = price_match.group(1)
+            currency_raw = price_match.group(2).upper()
             # Remove ALL separators (spaces, non-breaking spaces, dots, commas, newlines)
             price_str = price_str.replace('.', '').replace(',', '').replace(' ', '').replace('\xa0', '').replace('\n', '').strip()
             try:
@@ -530,7 +974,7 @@ class AdParser:
             # Normalize currency
             if currency_raw in ('DKK', 'KR'):  # 'kr' default DKK but check context
                 # If Swedish indicators, it's likely SEK
-                if 'BLOCKET' in text.upper() or 'SVERIGE' in text.upper():
+                if 'BLOCKET' in text_upper or 'SVERIGE' in text_upper:
                     data['purchase_currency'] = 'SEK'
                 else:
                     data['purchase_currency'] = 'DKK'
@@ -540,17 +984,7 @@ class AdParser:
                 data['purchase_currency'] = 'SEK'
         
         # Extract mileage - improved with multilingual support
-        # Note: Swedish "mil" = 10 km, so convert accordingly
-        mileage_patterns = [
-            # Swedish format: "670 mil" - need to convert (1 mil = 10 km)
-            (re.compile(r'(?:Miltal|Körda mil)[:\s]*([0-9\s]+)\s*mil(?!j|k)', re.IGNORECASE), 10),
-            (re.compile(r'([0-9\s]+)\s*mil(?!j|k)(?:\n|\s|$)', re.IGNORECASE), 10),  # "670 mil"
-            # German/Danish/English: km format
-            (re.compile(r'(?:Kilometerstand|Mileage)[:\s]*([0-9\.\,\s]+)\s*km', re.IGNORECASE), 1),
-            (re.compile(r'([0-9]{2,7}[\.]{0,1}[0-9]{3})\s*km', re.IGNORECASE), 1),  # Standard format
-            (re.compile(r'([0-9\.\,\s]+)\s*km', re.IGNORECASE), 1)  # Any number + km
-        ]
-        for pattern, multiplier in mileage_patterns:
+        for pattern, multiplier in AdParser.MILEAGE_PATTERNS:
             mileage_match = pattern.search(text)
             if mileage_match:
                 mileage_str = mileage_match.group(1).replace('.', '').replace(',', '').replace(' ', '')
@@ -563,11 +997,7 @@ class AdParser:
                     pass
         
         # Extract color - multilingual
-        color_patterns = [
-            re.compile(r'(?:Farve|Färg|Color|Colour|Farbe|Lackierung)[:\s]*([A-Za-zæøåÆØÅäöüÄÖÜß\s\-]+?)(?:\n|,|;|\||$)', re.IGNORECASE),
-            re.compile(r'\b(Sort|Hvid|Grå|Sølv|Rød|Blå|Grøn|Gul|Brun|Schwarz|Weiß|Grau|Silber|Rot|Blau|Grün|Gelb|Braun|Black|White|Gray|Silver|Red|Blue|Green|Yellow|Brown|Svart|Vit|Grå|Silver|Röd|Blå|Grön|Gul|Brun)\b', re.IGNORECASE)
-        ]
-        for pattern in color_patterns:
+        for pattern in AdParser.COLOR_PATTERNS:
             color_match = pattern.search(text)
             if color_match:
                 color = color_match.group(1).strip()
@@ -589,49 +1019,26 @@ class AdParser:
             data['doors'] = int(doors_match.group(1))
         
         # Extract dealer/seller information - improved multilingual
-        dealer_patterns = [
-            re.compile(r'(?:Säljs av|Säljare)[:\s]+([A-ZÄÖÜ0-9][A-Za-zäöüÄÖÜß0-9\s&\.\-]+?)(?:\n|Skriv|Visa|Tel|$)', re.IGNORECASE),
-            re.compile(r'(?:Händler|Dealer|Forhandler|Anbieter)[:\s]*([A-ZÄÖÜ0-9][A-Za-zäöüÄÖÜß0-9\s&\.\-]+?)(?:\n|Standort|Location|Ort|Tel|Telefon|Phone|$)', re.IGNORECASE),
-            re.compile(r'(?:Verkäufer|Seller)[:\s]*([A-ZÄÖÜ0-9][A-Za-zäöüÄÖÜß0-9\s&\.\-]+?)(?:\n|Standort|Location|Ort|Tel|$)', re.IGNORECASE),
-            re.compile(r'([A-ZÄÖÜ][A-Za-zäöüÄÖÜß\s&\.]+?)\s+(?:GmbH|AG|AB|KG|OHG|Ltd|ApS|A/S)', re.IGNORECASE)
-        ]
-        
-        for i, pattern in enumerate(dealer_patterns):
-            dealer_match = pattern.search(text)
+        for search in [pattern.search for pattern in AdParser.DEALER_PATTERNS] + [AdParser._search_company]:
+            dealer_match = search(text)
             if dealer_match:
                 dealer = dealer_match.group(1).strip()
                 # Filter out invalid values
-                invalid_dealer_values = ['Location', 'This listing', 'Standort', 'Ort', 'Description', 'Details', 
-                                        'Map', 'View', 'Show', 'Contact', 'Call', 'Email', 'Website']
-                if 3 <= len(dealer) <= 80 and not any(inv.lower() in dealer.lower() for inv in invalid_dealer_values):
+                if 3 <= len(dealer) <= 80 and not AdParser.INVALID_DEALER_PATTERN.search(dealer):
                     # Remove trailing junk
-                    dealer = re.sub(r'\s*(?:Tel|Phone|Telefon|Contact).*$', '', dealer, flags=re.IGNORECASE)
+                    dealer = AdParser.DEALER_TRAILER_PATTERN.sub('', dealer)
                     data['dealer'] = dealer.strip()
                     break
         
         # Extract location/city - improved with better filtering
-        location_patterns = [
-            # Pattern 1: Swedish format like "598 21 VIMMERBY" or "Badhusgatan 7, 598 21 VIMMERBY"
-            re.compile(r'\d{3}\s+\d{2}\s+([A-ZÄÖÜ][A-Za-zäöüÄÖÜß\s\-]{3,30})(?:\n|,|$|Till)', re.IGNORECASE),
-            # Pattern 2: After "Standort/Location/Ort" label with optional postal code
-            re.compile(r'(?:Standort|Location|Ort|Placering|Bilens plats)[:\s]*(?:[A-Z]{2}[-\s])?\d{4,5}\s+([A-ZÄÖÜ][A-Za-zäöüÄÖÜß\s\-]+?)(?:\n|,|;|\||Tel|Phone|Dealer)', re.IGNORECASE),
-            # Pattern 3: Just postal code + city (German format)
-            re.compile(r'(?:[A-Z]{2}[-\s])?\d{4,5}\s+([A-ZÄÖÜ][A-Za-zäöüÄÖÜß\s\-]{3,30})(?:\n|,|;)', re.IGNORECASE),
-            # Pattern 4: Known city names in text
-            re.compile(r'\b(' + '|'.join(AdParser.GERMAN_CITIES + AdParser.SWEDISH_CITIES) + r')\b', re.IGNORECASE)
-        ]
-        
         location_found = False
-        for i, pattern in enumerate(location_patterns):
+        postal_code = None
+        for pattern in AdParser.LOCATION_PATTERNS:
             for match in pattern.finditer(text):
                 candidate = match.group(1).strip() if match.lastindex else match.group(0).strip()
                 
                 # Skip invalid candidates
-                invalid_words = ['this', 'listing', 'map', 'location', 'click', 'view', 'see',
-                               'description', 'show', 'more', 'details', 'information', 'contact',
-                               'website', 'email', 'phone', 'telefon', 'dealer', 'seller',
-                               'stolar', 'säten', 'dörrar', 'wheels', 'doors', 'seats']
-                if any(iw in candidate.lower() for iw in invalid_words):
+                if AdParser.INVALID_LOCATION_PATTERN.search(candidate.lower()):
                     continue
                 if candidate.replace(' ', '').replace('-', '').isdigit():
                     continue
@@ -639,12 +1046,15 @@ class AdParser:
                     continue
                     
                 # Clean the candidate
-                candidate = re.sub(r'\s*(?:Tel|Phone|Telefon).*$', '', candidate, flags=re.IGNORECASE)
+                candidate = AdParser.LOCATION_TRAILER_PATTERN.sub('', candidate)
                 candidate = candidate.strip()
                 
                 if candidate:
                     data['location'] = candidate
                     location_found = True
+                    # Keep the postal code in front of the town for the distance lookup
+                    postal_match = POSTAL_PATTERN.search(text, match.start(), match.start(1)) if match.lastindex else None
+                    postal_code = postal_match.group(0) if postal_match else None
                     break
             
             if location_found:
@@ -659,11 +1069,11 @@ class AdParser:
             german_indicators += 3
         if any(city in text_upper for city in AdParser.GERMAN_CITIES):
             german_indicators += 2
-        if any(word in text_upper for word in ['STANDORT', 'HÄNDLER', 'ERSTZULASSUNG', 'FAHRZEUGHALTER', 'HU', 'TÜV']):
+        if any(word in text_upper for word in AdParser.GERMAN_WORDS):
             german_indicators += 1
-        if any(word in text_upper for word in ['GMBH', 'KG', 'OHG']):
+        if any(word in text_upper for word in AdParser.GERMAN_COMPANY_WORDS):
             german_indicators += 1
-        if re.search(r'\+49\s|\(49\)', text):  # German phone code
+        if AdParser.GERMAN_PHONE_PATTERN.search(text):  # German phone code
             german_indicators += 2
         
         # Check for Swedish indicators
@@ -674,11 +1084,11 @@ class AdParser:
             swedish_indicators += 5
         if any(city in text_upper for city in AdParser.SWEDISH_CITIES):
             swedish_indicators += 2
-        if any(word in text_upper for word in ['SÄLJARE', 'SÄLJS AV', 'FÖRSTA REG', 'ÄGARE', 'BESIKTAD', 'MILTAL', 'KÖRDA MIL']):
+        if any(word in text_upper for word in AdParser.SWEDISH_WORDS):
             swedish_indicators += 1
-        if any(word in text_upper for word in [' AB ', 'AKTIEBOLAG']):
+        if any(word in text_upper for word in AdParser.SWEDISH_COMPANY_WORDS):
             swedish_indicators += 1
-        if re.search(r'\+46\s|\(46\)|^46\s', text):  # Swedish phone code
+        if AdParser.SWEDISH_PHONE_PATTERN.search(text):  # Swedish phone code
             swedish_indicators += 2
         if 'SVERIGE' in text_upper or 'SWEDEN' in text_upper:
             swedish_indicators += 2
@@ -697,51 +1107,27 @@ class AdParser:
         if phone_match:
             data['phone'] = phone_match.group(0)
         
-        # Extract fuel type - improved detection
-        # Check for "Drivmedel\nEl" or "Drivmedel: El" pattern first (most specific)
-        fuel_patterns = [
-            (re.compile(r'Drivmedel[:\s\n]*(El|Diesel|Bensin|Hybrid)', re.IGNORECASE), 'direct'),
-            (re.compile(r'Fuel[:\s\n]*(Electric|Diesel|Petrol|Gasoline|Hybrid)', re.IGNORECASE), 'direct'),
-        ]
-        
-        fuel_found = False
-        for pattern, match_type in fuel_patterns:
+        # Extract fuel type: "Drivmedel: El" / "Fuel: Diesel" first (most specific)
+        for pattern in AdParser.FUEL_PATTERNS:
             fuel_match = pattern.search(text)
             if fuel_match:
-                fuel_value = fuel_match.group(1).upper()
-                if fuel_value in ['EL', 'ELECTRIC']:
-                    data['fuel_type'] = 'electric'
-                elif fuel_value == 'DIESEL':
-                    data['fuel_type'] = 'diesel'
-                elif fuel_value in ['BENSIN', 'PETROL', 'GASOLINE']:
-                    data['fuel_type'] = 'gasoline'
-                elif fuel_value == 'HYBRID':
-                    data['fuel_type'] = 'hybrid'
-                fuel_found = True
+                data['fuel_type'] = AdParser.FUEL_VALUES[fuel_match.group(1).upper()]
                 break
-        
-        # Fallback to keyword search if no direct match
-        if not fuel_found:
-            if any(word in text_upper for word in ['DIESEL', 'DIESELMOTOR', 'TDI', 'D-']):
-                data['fuel_type'] = 'diesel'
-            elif any(word in text_upper for word in ['BENZIN', 'PETROL', 'GASOLINE', 'TSI', 'FSI', 'BENSIN']):
-                data['fuel_type'] = 'gasoline'
-            elif any(word in text_upper for word in ['ELECTRIC', 'ELEKTRISK', 'BATTERY', 'BATTERI', 'EQB', 'EQC', 'EQA', 'E-TRON', 'TAYCAN']):
-                data['fuel_type'] = 'electric'
-            elif any(word in text_upper for word in ['HYBRID', 'PLUG-IN', 'PHEV']):
-                data['fuel_type'] = 'hybrid'
+        else:
+            # Fallback to keyword search if no direct match
+            for fuel_type, keywords in AdParser.FUEL_KEYWORDS:
+                if any(word in text_upper for word in keywords):
+                    data['fuel_type'] = fuel_type
+                    break
         
         # Extract transmission
-        if any(word in text_upper for word in ['AUTOMATIC', 'AUTOMATGEAR', 'AUTOMAT', 'DSG', 'TIPTRONIC', 'STEPTRONIC']):
+        if any(word in text_upper for word in AdParser.AUTOMATIC_WORDS):
             data['transmission'] = 'automatic'
-        elif any(word in text_upper for word in ['MANUAL', 'MANUELL', 'SCHALTGETRIEBE']):
+        elif any(word in text_upper for word in AdParser.MANUAL_WORDS):
             data['transmission'] = 'manual'
         
         # Extract equipment/features
-        equipment = []
-        for keyword in AdParser.EQUIPMENT_KEYWORDS:
-            if keyword.upper() in text_upper:
-                equipment.append(keyword)
+        equipment = [keyword for keyword, word in AdParser.EQUIPMENT_WORDS if word in text_upper]
         if equipment:
             data['equipment'] = ', '.join(equipment[:10])  # Limit to 10 items
         
@@ -759,7 +1145,7 @@ class AdParser:
         if 'location' in data:
             # Pass import_country if available to help with estimation
             import_country = data.get('import_country', None)
-            transport_cost, distance_km = AdParser._calculate_transport_cost(data['location'], import_country)
+            transport_cost, distance_km = AdParser._calculate_transport_cost(data['location'], import_country, postal_code)
             if transport_cost:
                 data['transport_cost'] = transport_cost
                 data['distance_km'] = distance_km
@@ -770,28 +1156,27 @@ class AdParser:
         return data
     
     @staticmethod
-    def _calculate_transport_cost(location: str, import_country: Optional[str] = None) -> tuple[Optional[float], Optional[int]]:
+    def _calculate_transport_cost(location: str, import_country: Optional[str] = None,
+                                  postal_code: Optional[str] = None) -> tuple[Optional[float], Optional[int]]:
         """
         Calculate estimated diesel cost for transport from location to Aalborg
         
         Args:
             location: City name from the advertisement
             import_country: Import country ('Tyskland', 'Sverige', etc.) if known
+            postal_code: Postal code given with the city, if any ("DE-57074", "598 21")
             
         Returns:
             Tuple of (cost in DKK, distance in km), or (None, None) if city not found
         """
         location_upper = location.upper().strip()
         
-        # Try to find matching city
-        distance_km = None
-        for city, dist in AdParser.CITY_DISTANCES.items():
-            if city in location_upper:
-                distance_km = dist
-                break
+        # Look the town (or its postal code region) up in the offline gazetteer
+        place = get_gazetteer().locate(f"{postal_code} {location}" if postal_code else location, import_country)
+        distance_km = place.distance_km if place else None
         
         # If no specific city found, use average distance based on country
-        if not distance_km:
+        if distance_km is None:
             # First check if we have import_country
             if import_country == 'Tyskland':
                 distance_km = 700  # Average distance to Germany
@@ -817,39 +1202,53 @@ class AdParser:
         return None, None
     
     @staticmethod
-    def parse_from_upload(file_storage) -> Dict[str, Any]:
+    def parse_file(source: FileSource, filename: str) -> Dict[str, Any]:
+        """
+        Parse an image or PDF advertisement, choosing the parser by file name
+        
+        Args:
+            source: Path, bytes or binary file object
+            filename: Original file name (only its extension is used)
+            
+        Returns:
+            Dictionary with extracted fields
+        """
+        if filename.lower().endswith('.pdf'):
+            return AdParser.parse_pdf(source)
+        return AdParser.parse_image(source)
+    
+    @staticmethod
+    def parse_from_upload(file_storage, max_in_memory: int = IN_MEMORY_MAX_BYTES) -> Dict[str, Any]:
         """
         Parse advertisement from Flask file upload (supports images and PDFs)
         
+        Uploads up to max_in_memory bytes are parsed from memory; larger ones
+        are copied to a temporary file first.
+        
         Args:
             file_storage: Flask FileStorage object from request.files
+            max_in_memory: Size limit in bytes for parsing without a temporary file
             
         Returns:
             Dictionary with extracted fields
         """
+        import shutil
         import tempfile
         
         try:
-            # Get file extension
-            filename = file_storage.filename.lower()
-            is_pdf = filename.endswith('.pdf')
-            
-            # Save to temporary file
-            suffix = '.pdf' if is_pdf else '.png'
-            with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-                file_storage.save(tmp.name)
-                tmp_path = tmp.name
-            
-            # Parse based on file type
-            if is_pdf:
-                data = AdParser.parse_pdf(tmp_path)
-            else:
-                data = AdParser.parse_image(tmp_path)
+            stream = file_storage.stream
+            stream.seek(0, os.SEEK_END)
+            size = stream.tell()
+            stream.seek(0)
             
-            # Clean up
-            os.unlink(tmp_path)
+            if size <= max_in_memory:
+                return AdParser.parse_file(stream.read(), file_storage.filename)
             
-            return data
+            suffix = '.pdf' if file_storage.filename.lower().endswith('.pdf') else '.png'
+            with tempfile.NamedTemporaryFile(suffix=suffix) as tmp:
+                shutil.copyfileobj(stream, tmp)
+                tmp.flush()
+                return AdParser.parse_file(tmp.name, file_storage.filename)
             
         except Exception as e:
             return {'error': str(e)}
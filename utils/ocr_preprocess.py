@@ -0,0 +1,138 @@
+"""
+Image preprocessing before Tesseract
+
+Screenshots from phones are often 1000-3000 px wide with text three times the
+size Tesseract needs, and 300 dpi PDF renders carry wide empty margins. OCR
+time grows with the pixel count, so images are reduced before recognition:
+
+1. grayscale (dark-mode screenshots are inverted to dark text on light)
+2. crop the empty margins around the content
+3. downscale so the median text line is about ``target_line_height`` pixels
+4. binarize with an Otsu threshold
+
+The steps are tuned per source through PROFILES.
+"""
+from PIL import Image, ImageChops, ImageOps
+
+# Per source settings:
+#   target_line_height: text line height (px) to scale to; images are never enlarged
+#   min_scale:          lower bound on the scale factor (guards against bad estimates)
+#   crop / binarize:    whether to run those steps
+PROFILES = {
+    # Phone and desktop screenshots: large anti-aliased UI text, sometimes dark mode
+    'screenshot': {'target_line_height': 40, 'min_scale': 0.3, 'crop': True, 'binarize': True},
+    # 300 dpi renders of scanned PDFs: text is already close to Tesseract's preferred size
+    'scan': {'target_line_height': 48, 'min_scale': 0.5, 'crop': True, 'binarize': True},
+}
+
+# Grey levels within this distance of the background count as empty
+MARGIN_TOLERANCE = 24
+MARGIN_PADDING = 10
+# Text line runs shorter than this (px) are treated as noise or rules
+MIN_LINE_HEIGHT = 4
+
+
+def _background(gray):
+    """Most common grey level along the image border"""
+    width, height = gray.size
+    border = Image.new('L', (width, 2))
+    border.paste(gray.crop((0, 0, width, 1)), (0, 0))
+    border.paste(gray.crop((0, height - 1, width, height)), (0, 1))
+    histogram = border.histogram()
+    return histogram.index(max(histogram))
+
+
+def _crop_margins(gray, background):
+    difference = ImageChops.difference(gray, Image.new('L', gray.size, background))
+    bbox = difference.point(lambda p: 255 if p > MARGIN_TOLERANCE else 0).getbbox()
+    if not bbox:
+        return gray
+    left, top, right, bottom = bbox
+    width, height = gray.size
+    return gray.crop((max(0, left - MARGIN_PADDING), max(0, top - MARGIN_PADDING),
+                      min(width, right + MARGIN_PADDING), min(height, bottom + MARGIN_PADDING)))
+
+
+def otsu_threshold(gray):
+    """Grey level that best separates text from background (Otsu's method)"""
+    histogram = gray.histogram()
+    total = sum(histogram)
+    sum_all = sum(i * count for i, count in enumerate(histogram))
+    sum_background = weight_background = 0
+    best_threshold, best_variance = 127, -1.0
+    for level, count in enumerate(histogram):
+        weight_background += count
+        if weight_background == 0:
+            continue
+        weight_foreground = total - weight_background
+        if weight_foreground == 0:
+            break
+        sum_background += level * count
+        mean_background = sum_background / weight_background
+        mean_foreground = (sum_all - sum_background) / weight_foreground
+        variance = weight_background * weight_foreground * (mean_background - mean_foreground) ** 2
+        if variance > best_variance:
+            best_threshold, best_variance = level, variance
+    return best_threshold
+
+
+def estimate_line_height(gray, threshold=None):
+    """
+    Median height (px) of the text lines, from a horizontal ink projection
+
+    Returns:
+        Line height, or None when no text lines were found
+    """
+    threshold = otsu_threshold(gray) if threshold is None else threshold
+    ink = gray.point(lambda p: 255 if p <= threshold else 0)
+    # One column holding the ink share of every row
+    rows = list(ink.resize((1, ink.height), Image.BOX).getdata())
+    heights, run = [], 0
+    for value in rows + [0]:
+        if value > 0:
+            run += 1
+        elif run:
+            if run >= MIN_LINE_HEIGHT:
+                heights.append(run)
+            run = 0
+    if not heights:
+        return None
+    heights.sort()
+    return heights[len(heights) // 2]
+
+
+def preprocess(image, profile='screenshot'):
+    """
+    Prepare an image for Tesseract
+
+    Args:
+        image: PIL image (any mode)
+        profile: Key of PROFILES, or a dict with the same settings
+
+    Returns:
+        Grayscale or bilevel PIL image
+    """
+    settings = PROFILES[profile] if isinstance(profile, str) else profile
+
+    gray = ImageOps.grayscale(image) if image.mode != 'L' else image
+    background = _background(gray)
+    if background < 128:
+        # Dark mode: Tesseract expects dark text on a light background
+        gray = ImageOps.invert(gray)
+        background = 255 - background
+
+    if settings.get('crop'):
+        gray = _crop_margins(gray, background)
+
+    threshold = otsu_threshold(gray)
+    line_height = estimate_line_height(gray, threshold)
+    if line_height:
+        scale = max(settings['min_scale'], settings['target_line_height'] / line_height)
+        if scale < 1.0:
+            size = (max(1, round(gray.width * scale)), max(1, round(gray.height * scale)))
+            gray = gray.resize(size, Image.LANCZOS)
+            threshold = otsu_threshold(gray)
+
+    if settings.get('binarize'):
+        gray = gray.point(lambda p: 255 if p > threshold else 0)
+    return gray
@@ -0,0 +1,233 @@
+"""
+Keyset (cursor) pagination for list views and JSON APIs
+
+Instead of OFFSET/LIMIT plus COUNT(*), each page is fetched with a WHERE
+clause on the sort key of the last row seen, so deep pages cost the same as
+the first one. Cursors are opaque, URL-safe tokens.
+"""
+import base64
+import json
+import logging
+from datetime import date, datetime
+from decimal import Decimal
+from flask import request
+from sqlalchemy import and_, or_, tuple_
+from database import db
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor token cannot be decoded"""
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return ['dt', value.isoformat()]
+    if isinstance(value, date):
+        return ['d', value.isoformat()]
+    if isinstance(value, Decimal):
+        return ['n', str(value)]
+    return ['v', value]
+
+
+def _decode_value(item):
+    tag, value = item
+    if tag == 'dt':
+        return datetime.fromisoformat(value)
+    if tag == 'd':
+        return date.fromisoformat(value)
+    if tag == 'n':
+        return Decimal(value)
+    return value
+
+
+def encode_cursor(values, direction='next'):
+    """Encode sort key values of a boundary row into an opaque cursor"""
+    payload = json.dumps({'k': [_encode_value(v) for v in values], 'd': direction},
+                         separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor token
+
+    Returns:
+        Tuple of (key values, direction)
+
+    Raises:
+        InvalidCursor: If the token is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        direction = payload.get('d', 'next')
+        if direction not in ('next', 'prev'):
+            raise ValueError(direction)
+        return [_decode_value(item) for item in payload['k']], direction
+    except Exception as e:
+        raise InvalidCursor(f'Invalid cursor: {cursor}') from e
+
+
+def _after(keys, values, reverse=False):
+    """WHERE clause selecting rows after the given key values in sort order"""
+    descending = [desc != reverse for _, desc in keys]
+    exprs = [expr for expr, _ in keys]
+
+    # Uniform direction: a single row-value comparison the index can serve
+    if all(descending) or not any(descending):
+        left, right = tuple_(*exprs), tuple_(*values)
+        return left < right if descending[0] else left > right
+
+    clauses = []
+    for i, (expr, desc) in enumerate(zip(exprs, descending)):
+        equal = [exprs[j] == values[j] for j in range(i)]
+        clauses.append(and_(*equal, expr < values[i] if desc else expr > values[i]))
+    return or_(*clauses)
+
+
+def estimate_count(query):
+    """
+    Planner estimate of the number of rows a query returns (PostgreSQL only)
+
+    Returns:
+        Estimated row count, or None when no estimate is available
+    """
+    try:
+        bind = db.session.get_bind()
+        if bind.dialect.name != 'postgresql':
+            return None
+        compiled = query.statement.compile(dialect=bind.dialect)
+        plan = db.session.connection().exec_driver_sql(
+            f'EXPLAIN (FORMAT JSON) {compiled.string}', compiled.params
+        ).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+    except Exception as e:
+        logger.warning(f"Row estimate failed: {str(e)}")
+        return None
+
+
+class KeysetPage:
+    """One page of keyset paginated results"""
+
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None,
+                 total=None, total_is_estimate=False):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+        self.total_is_estimate = total_is_estimate
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def to_dict(self):
+        """Pagination metadata for JSON responses"""
+        return {
+            'per_page': self.per_page,
+            'next_cursor': self.next_cursor,
+            'prev_cursor': self.prev_cursor,
+            'has_next': self.has_next,
+            'has_prev': self.has_prev,
+            'total': self.total,
+            'total_is_estimate': self.total_is_estimate
+        }
+
+
+def keyset_paginate(query, keys, cursor=None, per_page=20, count=None):
+    """
+    Paginate a query by its sort keys instead of OFFSET
+
+    Args:
+        query: Unordered Flask-SQLAlchemy query of model instances
+        keys: List of (expression, descending) tuples defining the sort order.
+              The last key must be unique (normally the primary key) and keys
+              must be non-null; wrap nullable columns in coalesce().
+        cursor: Cursor token from a previous page (None = first page)
+        per_page: Page size
+        count: None (skip counting), 'exact' (COUNT(*)) or 'estimate' (planner estimate)
+
+    Returns:
+        KeysetPage
+
+    Raises:
+        InvalidCursor: If the cursor token is malformed
+    """
+    direction = 'next'
+    paged = query
+    if cursor:
+        values, direction = decode_cursor(cursor)
+        if len(values) != len(keys):
+            raise InvalidCursor(f'Invalid cursor: {cursor}')
+        paged = paged.filter(_after(keys, values, reverse=(direction == 'prev')))
+
+    # Select key values alongside each row so cursors use the exact SQL values
+    reverse = direction == 'prev'
+    ordering = [expr.desc() if desc != reverse else expr.asc() for expr, desc in keys]
+    labelled = [expr.label(f'_key_{i}') for i, (expr, _) in enumerate(keys)]
+    rows = paged.add_columns(*labelled).order_by(*ordering).limit(per_page + 1).all()
+
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if reverse:
+        rows.reverse()
+
+    items = [row[0] for row in rows]
+    first_key = list(rows[0][1:]) if rows else None
+    last_key = list(rows[-1][1:]) if rows else None
+
+    if reverse:
+        has_prev, has_next = more, True
+    else:
+        has_prev, has_next = bool(cursor), more
+
+    total = None
+    if count == 'exact':
+        total = query.order_by(None).count()
+    elif count == 'estimate':
+        total = estimate_count(query.order_by(None))
+
+    return KeysetPage(
+        items,
+        per_page,
+        next_cursor=encode_cursor(last_key, 'next') if has_next and last_key else None,
+        prev_cursor=encode_cursor(first_key, 'prev') if has_prev and first_key else None,
+        total=total,
+        total_is_estimate=(count == 'estimate')
+    )
+
+
+def order_by_keys(query, keys):
+    """Query ordered by keyset sort keys, so offset pages list rows in the same order as cursor pages"""
+    return query.order_by(*[expr.desc() if desc else expr.asc() for expr, desc in keys])
+
+
+def wants_keyset():
+    """Check if the current request asked for cursor pagination (``?cursor=``)"""
+    return 'cursor' in request.args
+
+
+def paginate_request(query, keys, per_page=20):
+    """
+    Keyset paginate a query using the ``cursor`` and ``count`` request arguments
+
+    A malformed or stale cursor falls back to the first page.
+    """
+    count = request.args.get('count')
+    if count not in ('exact', 'estimate'):
+        count = None
+    cursor = request.args.get('cursor') or None
+    try:
+        return keyset_paginate(query, keys, cursor=cursor, per_page=per_page, count=count)
+    except InvalidCursor:
+        logger.warning(f"Ignoring invalid cursor: {cursor}")
+        return keyset_paginate(query, keys, per_page=per_page, count=count)
@@ -0,0 +1,219 @@
+"""
+Content-addressed on-disk cache of advertisement parse results
+
+Uploads are keyed by the SHA-256 of their bytes, URLs by the normalized URL
+plus the (UTC) fetch date, so a listing is fetched at most once a day. Every
+key also includes the parser version, a hash of the AdParser, image
+preprocessing and gazetteer source (and the gazetteer seed), so changing the
+extraction code or distances invalidates old results without a manual flush.
+
+Entries are small JSON files under ``PARSE_CACHE_DIR``; a hit refreshes the
+file's mtime, and once the directory grows past ``PARSE_CACHE_MAX_BYTES`` the
+least recently used files are removed. Writes keep a running size total in a
+small index file (shared by the parse job processes), so the directory is only
+walked when the total passes the limit, or every EVICT_EVERY writes to correct
+for files changed behind the cache's back.
+"""
+import hashlib
+import inspect
+import json
+import logging
+import os
+import tempfile
+from datetime import datetime
+from functools import lru_cache
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+try:
+    import fcntl
+except ImportError:  # Windows: index updates are not locked, the periodic walk corrects them
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 100 * 1024 * 1024
+
+# Eviction trims the cache to this fraction of the limit, so files are not deleted on every write
+EVICT_TO = 0.9
+
+# Writes between directory walks that resynchronise the size index
+EVICT_EVERY = 500
+
+# Running "<bytes> <writes>" total of the cache directory
+INDEX_NAME = 'size.idx'
+
+# Query parameters that do not change which listing a URL points to
+TRACKING_PARAMS = ('utm_', 'fbclid', 'gclid', 'ref', 'referrer')
+
+
+@lru_cache(maxsize=None)
+def parser_version():
+    """PARSER_VERSION plus a hash of the parser, language detection, listing data, preprocessing and gazetteer source and data"""
+    from utils import gazetteer, listing_data, ocr_language, ocr_preprocess
+    from utils.ocr_parser import AdParser
+    source = (inspect.getsource(AdParser) + inspect.getsource(ocr_language) + inspect.getsource(listing_data)
+              + inspect.getsource(ocr_preprocess) + inspect.getsource(gazetteer))
+    with open(gazetteer.SEED_PATH, encoding='utf-8') as f:
+        source += f.read()
+    digest = hashlib.sha256(source.encode()).hexdigest()[:12]
+    return f"{AdParser.PARSER_VERSION}.{digest}"
+
+
+def normalize_url(url):
+    """Lower-case scheme and host, drop fragment, tracking parameters and trailing slash"""
+    parts = urlsplit(url.strip())
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                   if not k.lower().startswith(TRACKING_PARAMS))
+    path = parts.path.rstrip('/') or '/'
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, urlencode(query), ''))
+
+
+def _key(kind, identity):
+    return hashlib.sha256(f"{parser_version()}\0{kind}\0{identity}".encode()).hexdigest()
+
+
+def upload_key(content):
+    """Cache key for uploaded file bytes"""
+    return _key('upload', hashlib.sha256(content).hexdigest())
+
+
+def file_key(path):
+    """Cache key for a stored upload, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return _key('upload', digest.hexdigest())
+
+
+def url_key(url, day=None):
+    """Cache key for a listing URL fetched on the given day (default: today, UTC)"""
+    day = day or datetime.utcnow().date()
+    return _key('url', f"{normalize_url(url)}\0{day.isoformat()}")
+
+
+class ParseResultCache:
+    """Directory of JSON results with size-bounded LRU eviction"""
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f'{key}.json')
+
+    def _update_index(self, delta=0, total=None):
+        """
+        Add delta bytes and one write to the size index, or reset it to total
+
+        Returns:
+            (total bytes, writes) after the update; None when the index was
+            missing or unreadable, so the caller walks the directory instead
+        """
+        try:
+            with open(os.path.join(self.directory, INDEX_NAME), 'a+', encoding='utf-8') as f:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                f.seek(0)
+                try:
+                    size, writes = (int(part) for part in f.read().split())
+                    state = (size + delta, writes + 1)
+                except ValueError:
+                    state = None
+                if total is not None:
+                    state = (total, 0)
+                if state:
+                    f.seek(0)
+                    f.truncate()
+                    f.write(f'{max(0, state[0])} {state[1]}')
+                return state
+        except OSError:
+            return None
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(path)  # Mark as recently used
+        except OSError:
+            pass
+        return value
+
+    def set(self, key, value):
+        path = self._path(key)
+        try:
+            old_size = os.path.getsize(path)
+        except OSError:
+            old_size = 0
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temporary file and rename, so readers never see a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(value, f, default=str)
+            os.replace(tmp_path, path)
+            new_size = os.path.getsize(path)
+        except OSError as e:
+            logger.warning(f"Parse cache write failed: {str(e)}")
+            return False
+        state = self._update_index(new_size - old_size)
+        if state is None or state[0] > self.max_bytes or state[1] >= EVICT_EVERY:
+            self.evict()
+        return True
+
+    def _entries(self):
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self):
+        """Remove least recently used entries while the cache is over its size limit"""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            self._update_index(total=total)
+            return 0
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes * EVICT_TO:
+                break
+            try:
+                os.unlink(path)
+                total -= size
+                removed += 1
+            except OSError:
+                pass
+        self._update_index(total=total)
+        logger.info(f"Parse cache evicted {removed} entries")
+        return removed
+
+    def clear(self):
+        entries = self._entries()
+        for _, _, path in entries:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+        self._update_index(total=0)
+        return len(entries)
+
+
+def get_cache(app=None):
+    """Cache configured for the current app"""
+    from flask import current_app
+    app = app or current_app
+    directory = app.config.get('PARSE_CACHE_DIR') or os.path.join(app.instance_path, 'parse_cache')
+    return ParseResultCache(directory, app.config.get('PARSE_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
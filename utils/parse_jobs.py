@@ -0,0 +1,619 @@
+"""
+Background execution of advertisement parse jobs
+
+``POST /cars/parse-ad`` only stores the upload (or URL) and a ``parse_jobs``
+row, then returns the job id; the form polls the job until it is final.
+
+Each web process runs a small pool of runner threads. A runner claims a
+queued job with a conditional UPDATE, so a job runs once even with several
+gunicorn workers, and the number of running jobs of each kind across
+processes stays within its cap: uploads (OCR) at most one per CPU
+(``PARSE_JOB_WORKERS``), URL jobs, which mostly wait on the network,
+``PARSE_JOB_FETCH_WORKERS``. The parse itself
+(Tesseract, PDF rasterizing, HTTP fetch) runs in a child process, which lets
+the runner kill it when the job times out (``PARSE_JOB_TIMEOUT``) or is
+cancelled. Each runner keeps its child between jobs, so imports, the HTTP
+session and the loaded OCR models are reused; a child is replaced after
+``PARSE_JOB_WORKER_MAX_JOBS`` jobs and stopped after
+``PARSE_JOB_WORKER_IDLE`` seconds without work. Idle runners pick up queued
+jobs from the table, so jobs left behind by a restarted process are not lost.
+Children OCR the pages of a scanned PDF with the CPUs the upload cap leaves
+over (``OCR_PAGE_WORKERS``), so at full load there is still one Tesseract
+process per CPU.
+
+Uploads up to ``PARSE_UPLOAD_MEMORY_MAX_BYTES`` never touch the disk: the
+submitting process keeps the bytes and pipes them to the child, which parses
+them from memory. Only that process can run such a job; if it dies first,
+the job is failed once it is stale. Larger uploads are stored under
+``UPLOAD_FOLDER/parse_jobs`` and can be run by any process.
+"""
+import json
+import logging
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import and_, delete, func, or_, select, update
+from database import db
+from utils.http_client import configure as configure_http, settings_from_app
+from utils.parse_cache import file_key, get_cache, upload_key, url_key
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 120
+DEFAULT_FETCH_WORKERS = 8
+DEFAULT_MEMORY_MAX_BYTES = 8 * 1024 * 1024
+DEFAULT_WORKER_MAX_JOBS = 50
+DEFAULT_WORKER_IDLE = 300
+# Seconds between checks of a running job (result, deadline, cancellation)
+POLL_INTERVAL = 0.5
+# Seconds an idle runner waits before looking for queued jobs in the table
+SWEEP_INTERVAL = 5
+
+PDF_EXTENSIONS = {'pdf'}
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_runner = None
+_runner_lock = threading.Lock()
+
+# Bytes of uploads kept in memory until their job runs, by job id
+_inputs = {}
+_inputs_lock = threading.Lock()
+
+
+def worker_count(app):
+    """Concurrency cap: PARSE_JOB_WORKERS, never more than the CPU count"""
+    cpus = os.cpu_count() or 1
+    configured = app.config.get('PARSE_JOB_WORKERS') or cpus
+    return max(1, min(int(configured), cpus))
+
+
+def page_worker_count(app):
+    """PDF page OCR processes per child: the CPUs left over by the upload cap, at least 1"""
+    return max(1, (os.cpu_count() or 1) // worker_count(app))
+
+
+def fetch_worker_count(app):
+    """Concurrency cap for URL jobs: PARSE_JOB_FETCH_WORKERS (not bound to the CPU count)"""
+    return max(1, int(app.config.get('PARSE_JOB_FETCH_WORKERS') or DEFAULT_FETCH_WORKERS))
+
+
+def _parse(kind, source, path, content=None):
+    from utils.ocr_parser import AdParser
+    if kind == 'url':
+        return AdParser.parse_url(source)
+    if content is not None:
+        return AdParser.parse_file(content, source)
+    return AdParser.parse_file(path, path)
+
+
+def _child_main():
+    """
+    Child process entry point (python -m utils.parse_jobs)
+
+    Handles jobs until stdin is closed. Each job is a line of JSON {"kind",
+    "source", "path", "size", "http"} on stdin, followed by ``size`` bytes of
+    upload content for in-memory uploads; the reply is one line of JSON
+    {"ok", "data"} on stdout. The parser's own prints go to stderr.
+    """
+    from utils.ocr_parser import AdParser  # noqa: F401 (imported once, before the first job)
+
+    out = sys.stdout
+    sys.stdout = sys.stderr
+    stdin = sys.stdin.buffer
+    http_settings = None
+    for line in iter(stdin.readline, b''):
+        try:
+            args = json.loads(line)
+            content = stdin.read(args['size']) if args.get('size') is not None else None
+            if args.get('http') and args['http'] != http_settings:
+                # Reconfiguring drops the pooled session, so only do it when the settings change
+                configure_http(args['http'])
+                http_settings = args['http']
+            reply = {'ok': True, 'data': _parse(args['kind'], args['source'], args.get('path'), content)}
+        except Exception as e:
+            reply = {'ok': False, 'data': str(e)}
+        out.write(json.dumps(reply, default=str) + '\n')
+        out.flush()
+
+
+class _Worker:
+    """Child process of one runner thread, reused for consecutive jobs"""
+
+    def __init__(self, page_workers=1):
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'utils.parse_jobs'], cwd=PROJECT_ROOT,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            env={**os.environ, 'OCR_PAGE_WORKERS': str(page_workers)}
+        )
+        self.jobs = 0
+        self.last_used = time.monotonic()
+        # Reply lines; None once the child has exited
+        self.replies = queue.Queue()
+        threading.Thread(target=self._read, name='parse-job-reader', daemon=True).start()
+
+    def _read(self):
+        for line in self.process.stdout:
+            self.replies.put(line)
+        self.replies.put(None)
+
+    def send(self, request):
+        self.process.stdin.write(request)
+        self.process.stdin.flush()
+
+    def stop(self):
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+        for stream in (self.process.stdin, self.process.stdout):
+            try:
+                stream.close()
+            except OSError:
+                pass
+
+
+class JobRunner:
+    """Runner threads of one web process, each supervising one child process at a time"""
+
+    def __init__(self, app):
+        self.app = app
+        # Running jobs allowed per kind
+        self.caps = {'upload': worker_count(app), 'url': fetch_worker_count(app)}
+        self.workers = sum(self.caps.values())
+        self.page_workers = page_worker_count(app)
+        self.timeout = app.config.get('PARSE_JOB_TIMEOUT', DEFAULT_TIMEOUT)
+        self.worker_max_jobs = app.config.get('PARSE_JOB_WORKER_MAX_JOBS') or DEFAULT_WORKER_MAX_JOBS
+        self.worker_idle = app.config.get('PARSE_JOB_WORKER_IDLE', DEFAULT_WORKER_IDLE)
+        self.pid = os.getpid()
+        self._queue = queue.Queue()
+        self._threads = []
+        # Each runner thread's child process
+        self._local = threading.local()
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._loop, name=f'parse-job-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Parse job runner started with {self.workers} workers")
+
+    def submit(self, job_id):
+        self._queue.put(job_id)
+
+    def _worker(self):
+        """This thread's child process, started if needed"""
+        worker = getattr(self._local, 'worker', None)
+        if worker is None or worker.process.poll() is not None:
+            if worker is not None:
+                worker.stop()
+            worker = self._local.worker = _Worker(self.page_workers)
+        return worker
+
+    def _stop_worker(self):
+        worker = getattr(self._local, 'worker', None)
+        if worker is not None:
+            worker.stop()
+            self._local.worker = None
+
+    def _loop(self):
+        while True:
+            try:
+                job_id = self._queue.get(timeout=SWEEP_INTERVAL)
+            except queue.Empty:
+                job_id = None
+                worker = getattr(self._local, 'worker', None)
+                if worker is not None and time.monotonic() - worker.last_used > self.worker_idle:
+                    self._stop_worker()
+            try:
+                with self.app.app_context():
+                    if job_id is None:
+                        job_id = _oldest_queued()
+                    if job_id is not None:
+                        self._run(job_id)
+            except Exception as e:
+                logger.error(f"Parse job runner error: {str(e)}")
+
+    def _run(self, job_id):
+        from models.parse_job import ParseJob
+
+        kind = db.session.execute(select(ParseJob.kind).where(ParseJob.id == job_id)).scalar()
+        if kind is None:
+            return
+        claim = _claim(job_id, kind, self.caps.get(kind, self.caps['upload']))
+        if claim == 'busy':
+            # Cap reached (possibly by other processes); try again later
+            threading.Timer(POLL_INTERVAL * 2, self.submit, (job_id,)).start()
+            return
+        if claim != 'claimed':
+            return
+
+        job = db.session.get(ParseJob, job_id)
+        kind, source, path = job.kind, job.source, job.input_path
+        content = _take_input(job_id) if kind == 'upload' and not path else None
+        if kind == 'upload' and not path and content is None:
+            # Held in memory by a process that has since gone away
+            _finish(job_id, ParseJob.FAILED, None, 'Den uploadede fil er ikke længere tilgængelig')
+            db.session.remove()
+            return
+        db.session.remove()
+
+        request = json.dumps({'kind': kind, 'source': source, 'path': path,
+                              'size': len(content) if content is not None else None,
+                              'http': settings_from_app(self.app)}).encode() + b'\n'
+        if content is not None:
+            request += content
+
+        deadline = time.monotonic() + self.timeout
+        status, result, error = ParseJob.FAILED, None, None
+        worker = self._worker()
+        try:
+            try:
+                worker.send(request)
+            except OSError:
+                # The child died while idle; start a fresh one
+                self._stop_worker()
+                worker = self._worker()
+                worker.send(request)
+            while True:
+                try:
+                    output = worker.replies.get(timeout=POLL_INTERVAL)
+                except queue.Empty:
+                    if time.monotonic() > deadline:
+                        status, error = ParseJob.TIMEOUT, f'Tidsgrænsen på {self.timeout} sekunder blev overskredet'
+                        self._stop_worker()
+                        break
+                    if _status(job_id) == ParseJob.CANCELLED:
+                        status = ParseJob.CANCELLED
+                        self._stop_worker()
+                        break
+                    continue
+                try:
+                    reply = json.loads(output)
+                except (TypeError, ValueError):
+                    error = 'Parseren stoppede uventet'
+                    self._stop_worker()
+                    break
+                payload = reply['data']
+                if not reply['ok']:
+                    error = payload
+                elif 'error' in payload:
+                    # Keep the payload: it may carry help text (e.g. blocked sites)
+                    result, error = payload, payload['error']
+                else:
+                    status, result = ParseJob.DONE, payload
+                break
+        except Exception:
+            self._stop_worker()
+            raise
+        finally:
+            worker.jobs += 1
+            worker.last_used = time.monotonic()
+            if worker.jobs >= self.worker_max_jobs:
+                self._stop_worker()
+
+        if status == ParseJob.DONE:
+            _cache_result(kind, source, path, result, content)
+        if status != ParseJob.CANCELLED:
+            _finish(job_id, status, result, error)
+        _remove_input(path)
+        logger.info(f"Parse job {job_id} finished: {status}")
+
+
+def _oldest_queued():
+    """Oldest queued job any process can run (in-memory uploads only run where they were submitted)"""
+    from models.parse_job import ParseJob
+    return db.session.execute(
+        select(ParseJob.id).where(ParseJob.status == ParseJob.QUEUED,
+                                  or_(ParseJob.kind != 'upload', ParseJob.input_path.isnot(None)))
+        .order_by(ParseJob.created_at).limit(1)
+    ).scalar()
+
+
+def _status(job_id):
+    from models.parse_job import ParseJob
+    status = db.session.execute(select(ParseJob.status).where(ParseJob.id == job_id)).scalar()
+    db.session.rollback()  # Do not hold a snapshot open while polling
+    return status
+
+
+def _claim(job_id, kind, cap):
+    """
+    Move a queued job to running, unless the cap of running jobs of its kind is reached
+
+    Returns:
+        'claimed', 'busy' (still queued) or 'gone' (cancelled, claimed elsewhere or deleted)
+    """
+    from models.parse_job import ParseJob
+
+    running = select(func.count()).select_from(ParseJob.__table__) \
+        .where(ParseJob.status == ParseJob.RUNNING, ParseJob.kind == kind).scalar_subquery()
+    result = db.session.execute(
+        update(ParseJob.__table__)
+        .where(ParseJob.id == job_id, ParseJob.status == ParseJob.QUEUED, running < cap)
+        .values(status=ParseJob.RUNNING, started_at=datetime.utcnow())
+    )
+    db.session.commit()
+    if result.rowcount:
+        return 'claimed'
+    return 'busy' if _status(job_id) == ParseJob.QUEUED else 'gone'
+
+
+def _finish(job_id, status, result, error):
+    """Store the outcome, unless the job was cancelled meanwhile"""
+    from models.parse_job import ParseJob
+
+    db.session.execute(
+        update(ParseJob.__table__)
+        .where(ParseJob.id == job_id, ParseJob.status == ParseJob.RUNNING)
+        .values(status=status, result_json=json.dumps(result, default=str) if result is not None else None,
+                error=error, finished_at=datetime.utcnow())
+    )
+    db.session.commit()
+
+
+def _remove_input(path):
+    if path:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+def _hold_input(job_id, content):
+    with _inputs_lock:
+        _inputs[job_id] = content
+
+
+def _take_input(job_id):
+    """Remove and return the in-memory upload of a job (None if this process does not hold it)"""
+    with _inputs_lock:
+        return _inputs.pop(job_id, None)
+
+
+def get_runner(app=None):
+    """Runner for this process, started on first use (and again after a fork)"""
+    global _runner
+    from flask import current_app
+    app = app or current_app._get_current_object()
+    with _runner_lock:
+        if _runner is None or _runner.pid != os.getpid():
+            _runner = JobRunner(app)
+            _runner.start()
+    return _runner
+
+
+def _upload_dir(app):
+    path = os.path.join(os.path.abspath(app.config['UPLOAD_FOLDER']), 'parse_jobs')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def submit_upload(file_storage, user_id, batch_id=None):
+    """
+    Store an uploaded advertisement and queue it for parsing
+
+    A file parsed before (same bytes, same parser version) is answered from
+    the parse cache: the job is created as done and nothing is queued.
+    Files up to PARSE_UPLOAD_MEMORY_MAX_BYTES stay in memory; larger ones
+    are written to the upload folder.
+
+    Args:
+        file_storage: FileStorage from request.files
+        user_id: Owner of the job
+        batch_id: Bulk import the job belongs to, if any
+
+    Returns:
+        The ParseJob (queued, or done when cached)
+    """
+    from flask import current_app
+    from werkzeug.utils import secure_filename
+    from models.parse_job import ParseJob
+
+    job_id = uuid.uuid4().hex
+    filename = secure_filename(file_storage.filename) or 'upload'
+    job = ParseJob(id=job_id, kind='upload', source=filename[:500], user_id=user_id, batch_id=batch_id)
+
+    content = file_storage.read()
+    cached = get_cache().get(upload_key(content))
+    if cached is not None:
+        return _submit_cached(job, cached)
+
+    if len(content) <= current_app.config.get('PARSE_UPLOAD_MEMORY_MAX_BYTES', DEFAULT_MEMORY_MAX_BYTES):
+        _hold_input(job_id, content)
+        try:
+            return _submit(job)
+        except Exception:
+            _take_input(job_id)
+            raise
+
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else 'png'
+    job.input_path = os.path.join(_upload_dir(current_app), f'{job_id}.{extension}')
+    with open(job.input_path, 'wb') as f:
+        f.write(content)
+    return _submit(job)
+
+
+def submit_url(url, user_id, batch_id=None):
+    """Queue an advertisement URL for fetching and parsing (cached per URL and day)"""
+    from models.parse_job import ParseJob
+
+    job = ParseJob(id=uuid.uuid4().hex, kind='url', source=url[:500], user_id=user_id, batch_id=batch_id)
+    cached = get_cache().get(url_key(url))
+    if cached is not None:
+        return _submit_cached(job, cached)
+    return _submit(job)
+
+
+def _submit(job):
+    from models.parse_job import ParseJob
+
+    job.status = ParseJob.QUEUED
+    db.session.add(job)
+    db.session.commit()
+    get_runner().submit(job.id)
+    return job
+
+
+def _submit_cached(job, result):
+    from models.parse_job import ParseJob
+
+    now = datetime.utcnow()
+    job.status = ParseJob.DONE
+    job.result_json = json.dumps(result, default=str)
+    job.started_at = job.finished_at = now
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def _cache_result(kind, source, path, result, content=None):
+    """Remember a successful parse for repeat uploads of the same file or URL"""
+    try:
+        if kind == 'url':
+            key = url_key(source)
+        else:
+            key = upload_key(content) if content is not None else file_key(path)
+        get_cache().set(key, result)
+    except Exception as e:
+        logger.warning(f"Parse cache store failed: {str(e)}")
+
+
+def iter_finished(job_ids, timeout=None):
+    """
+    Yield jobs as they reach a final state, in the order they finish
+
+    Jobs that are already final are yielded first. Jobs still unfinished
+    after the timeout (default: twice PARSE_JOB_TIMEOUT) are not yielded.
+
+    Args:
+        job_ids: Ids of the jobs to follow
+        timeout: Seconds to wait for all of them (0: only the jobs final now)
+    """
+    from flask import current_app
+    from models.parse_job import ParseJob
+
+    if timeout is None:
+        timeout = current_app.config.get('PARSE_JOB_TIMEOUT', DEFAULT_TIMEOUT) * 2
+    deadline = time.monotonic() + timeout
+    pending = set(job_ids)
+    while pending:
+        finished = db.session.execute(
+            select(ParseJob).where(ParseJob.id.in_(pending), ParseJob.status.in_(ParseJob.FINAL_STATES))
+            .order_by(ParseJob.finished_at)
+        ).scalars().all()
+        for job in finished:
+            pending.discard(job.id)
+            yield job
+        db.session.rollback()  # Do not hold a snapshot open while waiting
+        if pending:
+            if time.monotonic() > deadline:
+                break
+            time.sleep(POLL_INTERVAL)
+
+
+def cancel(job):
+    """
+    Cancel a queued or running job
+
+    Returns:
+        True if the job was cancelled, False if it had already ended
+    """
+    from models.parse_job import ParseJob
+
+    result = db.session.execute(
+        update(ParseJob.__table__)
+        .where(ParseJob.id == job.id, ParseJob.status.in_([ParseJob.QUEUED, ParseJob.RUNNING]))
+        .values(status=ParseJob.CANCELLED, finished_at=datetime.utcnow())
+    )
+    db.session.commit()
+    if not result.rowcount:
+        return False
+    db.session.refresh(job)
+    if job.started_at is None:
+        # Never started, so no runner will clean up the upload
+        _remove_input(job.input_path)
+        _take_input(job.id)
+    return True
+
+
+def expire_stale_jobs(app):
+    """
+    Fail jobs left behind by a process that died (older than twice the timeout)
+
+    These are jobs still running, and in-memory uploads still queued, whose
+    bytes went away with the process.
+    """
+    from models.parse_job import ParseJob
+
+    timeout = app.config.get('PARSE_JOB_TIMEOUT', DEFAULT_TIMEOUT)
+    cutoff = datetime.utcnow() - timedelta(seconds=timeout * 2)
+    result = db.session.execute(
+        update(ParseJob.__table__)
+        .where(or_(
+            and_(ParseJob.status == ParseJob.RUNNING, ParseJob.started_at < cutoff),
+            and_(ParseJob.status == ParseJob.QUEUED, ParseJob.kind == 'upload',
+                 ParseJob.input_path.is_(None), ParseJob.created_at < cutoff),
+        ))
+        .values(status=ParseJob.FAILED, error='Jobbet blev afbrudt', finished_at=datetime.utcnow())
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def purge_jobs(days=7):
+    """
+    Delete finished jobs older than the given number of days
+
+    Returns:
+        Number of deleted jobs
+    """
+    from models.parse_job import ParseJob
+
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    stale = db.session.execute(
+        select(ParseJob.input_path).where(ParseJob.status.in_(ParseJob.FINAL_STATES),
+                                          ParseJob.created_at < cutoff)
+    ).scalars().all()
+    for path in stale:
+        _remove_input(path)
+    result = db.session.execute(
+        delete(ParseJob.__table__)
+        .where(ParseJob.status.in_(ParseJob.FINAL_STATES), ParseJob.created_at < cutoff)
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def init_parse_jobs(app):
+    """Create the jobs table and fail jobs orphaned by a previous run"""
+    from models.parse_job import ParseJob
+
+    with app.app_context():
+        try:
+            ParseJob.__table__.create(db.engine, checkfirst=True)
+            expired = expire_stale_jobs(app)
+            if expired:
+                logger.warning(f"Marked {expired} interrupted parse jobs as failed")
+        except Exception as e:
+            logger.error(f"Parse job setup failed: {str(e)}")
+        finally:
+            db.session.remove()
+
+    @app.cli.command('parse-jobs-purge')
+    def parse_jobs_purge():
+        """Delete finished parse jobs older than a week"""
+        print(f"Deleted {purge_jobs()} parse jobs")
+
+    @app.cli.command('parse-cache-clear')
+    def parse_cache_clear():
+        """Empty the parse result cache"""
+        print(f"Removed {get_cache().clear()} cached parse results")
+
+
+if __name__ == '__main__':
+    _child_main()
@@ -0,0 +1,45 @@
+"""
+Read-only row projections
+
+Typeahead choices and dashboard widgets only show a few columns, yet loading ORM
+objects selects all of them (a car has about 70, including long text) and
+puts every row in the session's identity map. ``fetch`` instead selects just
+the fields of a named tuple type and returns plain tuples: less SQL traffic,
+no change tracking, and a fraction of the memory per row.
+
+    cars = fetch(Car.query.filter_by(status='available'), CarOption)
+    sales = fetch(Sale.query.join(Sale.customer), SaleOption, customer_name=Customer.name)
+
+Projected rows cannot be modified or lazy-load relationships; use the ORM
+(with a utils.loaders profile) for pages that need those.
+"""
+from collections import namedtuple
+
+# Choices offered by the typeahead lookups (utils.lookup)
+CarOption = namedtuple('CarOption', 'id make model vin registration_number')
+CustomerOption = namedtuple('CustomerOption', 'id name cvr email phone')
+SaleOption = namedtuple('SaleOption', 'id sale_number customer_name')
+
+# Rows of the dashboard's recent cars list; total_cost is computed in SQL
+CarSummary = namedtuple('CarSummary', 'id make model vin mileage status updated_at total_cost')
+
+
+def fetch(query, projection, **expressions):
+    """
+    Rows of a query as projection tuples, selecting only their fields
+
+    Args:
+        query: Query on a model (filters, joins and ordering are kept)
+        projection: Named tuple type; each field is read from the model
+                    attribute of the same name
+        **expressions: SQL expressions for fields that are not plain model
+                       attributes, e.g. customer_name=Customer.name
+
+    Returns:
+        List of projection tuples
+    """
+    model = query.column_descriptions[0]['entity']
+    columns = [expressions[field] if field in expressions else getattr(model, field)
+               for field in projection._fields]
+    rows = query.with_entities(*[column.label(field) for column, field in zip(columns, projection._fields)])
+    return [projection._make(row) for row in rows]
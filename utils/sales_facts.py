@@ -0,0 +1,242 @@
+"""
+Materialized sales facts for the sales and customer reports
+
+``sales_daily_facts`` holds completed sales per day, salesperson and car make
+(count, revenue, cost, profit); ``customer_sales_totals`` holds completed sales
+per customer. Both are kept current from a session ``after_flush`` hook: every
+flush that completes, changes or deletes a sale (or changes the cost of a sold
+car) re-aggregates only the affected days and customers, in the same
+transaction. Reports therefore read a number of rows bounded by the period
+length, not by the size of the sales history.
+
+On PostgreSQL a refresh first takes a transaction-scoped advisory lock per
+affected day and customer, so two transactions completing sales on the same
+day re-aggregate one after the other and the second sees the first one's
+sales. A failed refresh fails the flush rather than leaving the facts wrong.
+"""
+import logging
+from datetime import datetime, time, timedelta
+from sqlalchemy import and_, case, cast, delete, event, func, insert, or_, select
+from sqlalchemy.orm import Session
+from database import db
+from utils.flush_hooks import keep_history
+
+logger = logging.getLogger(__name__)
+
+# Sale attributes that move a sale in or out of the facts
+SALE_FIELDS = ('status', 'completed_date', 'final_price', 'car_id', 'salesperson_id', 'customer_id')
+
+# Car attributes that feed the make dimension or Car.total_cost()
+CAR_FIELDS = ('make', 'purchase_price', 'discount', 'import_country', 'purchase_currency',
+              'transport_cost', 'transport_surcharge', 'customs_cost', 'invoice_fee',
+              'preparation_cost', 'other_costs')
+
+# Fact table columns, in the order the aggregate selects produce them
+DAILY_COLUMNS = ['day', 'salesperson_id', 'make', 'sale_count', 'revenue', 'cost', 'profit']
+CUSTOMER_COLUMNS = ['customer_id', 'purchase_count', 'total_revenue', 'last_purchase_date']
+
+# First keys of the advisory locks taken per fact day and per customer
+DAY_LOCK = 7301
+CUSTOMER_LOCK = 7302
+
+
+def _tables():
+    from models.sales_fact import SalesDailyFact, CustomerSalesTotal
+    return SalesDailyFact.__table__, CustomerSalesTotal.__table__
+
+
+def _day_range(day):
+    """Half-open datetime range covering one calendar day (index friendly)"""
+    from models.sale import Sale
+    start = datetime.combine(day, time.min)
+    return and_(Sale.completed_date >= start, Sale.completed_date < start + timedelta(days=1))
+
+
+def _daily_select(days=None):
+    """Aggregate completed sales per day, salesperson and make"""
+    from models.car import Car
+    from models.sale import Sale
+
+    day = func.date(Sale.completed_date)
+    priced = Sale.final_price.isnot(None)
+    cost = case((priced, Car.total_cost()), else_=0)
+    query = select(
+        day,
+        Sale.salesperson_id,
+        Car.make,
+        func.count(Sale.id),
+        func.coalesce(func.sum(Sale.final_price), 0),
+        func.coalesce(func.sum(cost), 0),
+        func.coalesce(func.sum(case((priced, cast(Sale.final_price, db.Float) - Car.total_cost()), else_=0)), 0),
+    ).join(Car, Sale.car_id == Car.id).where(
+        Sale.status == 'completed',
+        Sale.completed_date.isnot(None)
+    )
+    if days is not None:
+        query = query.where(or_(*[_day_range(d) for d in days]))
+    return query.group_by(day, Sale.salesperson_id, Car.make)
+
+
+def _customer_select(customer_ids=None):
+    """Aggregate completed sales per customer"""
+    from models.sale import Sale
+
+    query = select(
+        Sale.customer_id,
+        func.count(Sale.id),
+        func.coalesce(func.sum(Sale.final_price), 0),
+        func.max(Sale.completed_date),
+    ).where(Sale.status == 'completed')
+    if customer_ids is not None:
+        query = query.where(Sale.customer_id.in_(customer_ids))
+    return query.group_by(Sale.customer_id)
+
+
+def _lock(connection, days, customer_ids):
+    """
+    Wait for other transactions refreshing the same days or customers
+
+    Each refresh deletes and re-aggregates its rows, so without the lock a
+    concurrent transaction, which cannot see this one's uncommitted sales,
+    would insert the same keys again. The locks are held until commit and
+    taken in a fixed order; SQLite needs none, as it runs one writer at a time.
+    """
+    if connection.dialect.name != 'postgresql':
+        return
+    keys = [(DAY_LOCK, day.toordinal()) for day in sorted(days)]
+    keys += [(CUSTOMER_LOCK, customer_id) for customer_id in sorted(customer_ids)]
+    for namespace, key in keys:
+        connection.execute(select(func.pg_advisory_xact_lock(namespace, key)))
+
+
+def _refresh(connection, days, customer_ids):
+    """Re-aggregate the given days and customers from the sales table"""
+    daily, customers = _tables()
+    if days:
+        days = sorted(days)
+        connection.execute(delete(daily).where(daily.c.day.in_(days)))
+        connection.execute(insert(daily).from_select(DAILY_COLUMNS, _daily_select(days)))
+    if customer_ids:
+        customer_ids = sorted(customer_ids)
+        connection.execute(delete(customers).where(customers.c.customer_id.in_(customer_ids)))
+        connection.execute(insert(customers).from_select(CUSTOMER_COLUMNS, _customer_select(customer_ids)))
+
+
+def _values(obj, fields):
+    """(committed, current) attribute values of an instance"""
+    attrs = db.inspect(obj).attrs
+    old, new = {}, {}
+    for field in fields:
+        history = attrs[field].history
+        new[field] = getattr(obj, field)
+        old[field] = history.deleted[0] if history.deleted else new[field]
+    return old, new
+
+
+def _day(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _add_sale_state(state, days, customer_ids):
+    if state['status'] == 'completed':
+        if state['completed_date']:
+            days.add(_day(state['completed_date']))
+        if state['customer_id']:
+            customer_ids.add(state['customer_id'])
+
+
+def _after_flush(session, flush_context):
+    """Re-aggregate the facts touched by flushed sales and sold cars"""
+    from models.car import Car
+    from models.sale import Sale
+
+    days, customer_ids, car_ids = set(), set(), set()
+    for obj in session.new:
+        if isinstance(obj, Sale):
+            _add_sale_state(_values(obj, SALE_FIELDS)[1], days, customer_ids)
+    for obj in session.deleted:
+        if isinstance(obj, Sale):
+            _add_sale_state(_values(obj, SALE_FIELDS)[0], days, customer_ids)
+    for obj in session.dirty:
+        if obj in session.deleted:
+            continue
+        if isinstance(obj, Sale):
+            old, new = _values(obj, SALE_FIELDS)
+            if old != new:
+                _add_sale_state(old, days, customer_ids)
+                _add_sale_state(new, days, customer_ids)
+        elif isinstance(obj, Car):
+            old, new = _values(obj, CAR_FIELDS)
+            if old != new:
+                car_ids.add(obj.id)
+
+    if not (days or customer_ids or car_ids):
+        return
+
+    try:
+        connection = session.connection()
+        if car_ids:
+            # A sold car's cost or make changed: its sale days need recounting
+            rows = connection.execute(
+                select(Sale.completed_date).where(
+                    Sale.car_id.in_(car_ids),
+                    Sale.status == 'completed',
+                    Sale.completed_date.isnot(None)
+                )
+            )
+            days.update(_day(completed) for completed, in rows)
+        _lock(connection, days, customer_ids)
+        _refresh(connection, days, customer_ids)
+    except Exception as e:
+        # The facts must not drift: fail the flush, and with it the sale change
+        logger.error(f"Sales fact update failed: {str(e)}")
+        raise
+
+
+def rebuild_sales_facts():
+    """
+    Recompute both fact tables from all completed sales
+
+    Returns:
+        Tuple of (daily fact rows, customer total rows)
+    """
+    daily, customers = _tables()
+    with db.engine.begin() as connection:
+        connection.execute(delete(daily))
+        connection.execute(insert(daily).from_select(DAILY_COLUMNS, _daily_select()))
+        connection.execute(delete(customers))
+        connection.execute(insert(customers).from_select(CUSTOMER_COLUMNS, _customer_select()))
+        counts = (
+            connection.execute(select(func.count()).select_from(daily)).scalar(),
+            connection.execute(select(func.count()).select_from(customers)).scalar(),
+        )
+    logger.info(f"Sales facts rebuilt: {counts[0]} daily rows, {counts[1]} customer rows")
+    return counts
+
+
+def init_sales_facts(app):
+    """Create the fact tables, fill them on first run and register the session hook"""
+    with app.app_context():
+        try:
+            daily, customers = _tables()
+            daily.create(db.engine, checkfirst=True)
+            customers.create(db.engine, checkfirst=True)
+            empty = db.session.execute(select(daily.c.id).limit(1)).first() is None
+            db.session.remove()
+            if empty and db.inspect(db.engine).has_table('sales'):
+                rebuild_sales_facts()
+        except Exception as e:
+            logger.error(f"Sales fact setup failed: {str(e)}")
+
+    if not event.contains(Session, 'after_flush', _after_flush):
+        from models.car import Car
+        from models.sale import Sale
+        event.listen(Session, 'after_flush', _after_flush)
+        keep_history(Sale, SALE_FIELDS)
+        keep_history(Car, CAR_FIELDS)
+
+    @app.cli.command('sales-facts-rebuild')
+    def sales_facts_rebuild():
+        """Recompute the sales report fact tables"""
+        daily_rows, customer_rows = rebuild_sales_facts()
+        print(f"Wrote {daily_rows} daily and {customer_rows} customer fact rows")
@@ -0,0 +1,356 @@
+"""
+Full-text search index for cars, customers, invoices, communications and documents
+
+Uses an FTS5 virtual table on SQLite and a tsvector column with a GIN index on
+PostgreSQL. Index rows are written in the same transaction as the change that
+produced them (from a session ``after_flush`` hook), so the index is always
+consistent with committed data.
+"""
+import logging
+import re
+from markupsafe import Markup, escape
+from sqlalchemy import bindparam, event, text
+from sqlalchemy.orm import Session
+from database import db
+from utils.flush_hooks import in_savepoint
+
+logger = logging.getLogger(__name__)
+
+TABLE_NAME = 'search_index'
+
+# Highlight markers; swapped for <mark> after HTML-escaping the snippet
+_HL_START = '\x02'
+_HL_END = '\x03'
+
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+def _join(*parts):
+    """Join non-empty values into one whitespace separated string"""
+    return ' '.join(str(p) for p in parts if p)
+
+
+def _car_document(car):
+    # Index the VIN serial (last 6) as its own token so tail lookups hit the index
+    vin_serial = car.vin[-6:] if car.vin else None
+    return (
+        _join(car.make, car.model, car.year),
+        _join(car.vin, vin_serial, car.registration_number, car.color, car.fuel_type,
+              car.import_country, car.supplier, car.dealer_name, car.dealer_location)
+    )
+
+
+# Shortest digit run of a phone number that is indexed as its own token
+PHONE_MIN_DIGITS = 4
+
+
+def _phone_tokens(value):
+    """
+    Every digit suffix of a phone number, longest first
+
+    The index prefix-matches tokens, and any digit run of the number is a
+    prefix of one of its suffixes, so typing part of the number (e.g. the
+    local "1234" of "+45 12 34 56 78") finds it without a substring scan.
+    """
+    digits = re.sub(r'\D', '', value) if value else ''
+    return _join(*[digits[i:] for i in range(len(digits) - PHONE_MIN_DIGITS + 1)])
+
+
+def _customer_document(customer):
+    return (
+        _join(customer.name, customer.company_name),
+        _join(customer.contact_person, customer.email, customer.phone, _phone_tokens(customer.phone),
+              customer.secondary_phone, _phone_tokens(customer.secondary_phone), customer.cvr,
+              customer.address, customer.postal_code, customer.city)
+    )
+
+
+def _invoice_document(invoice):
+    return (
+        _join(invoice.invoice_number, invoice.customer_name),
+        _join(invoice.customer_email, invoice.customer_phone, invoice.customer_cvr,
+              invoice.customer_city, invoice.notes)
+    )
+
+
+def _communication_document(communication):
+    return (
+        _join(communication.subject) or communication.communication_type,
+        _join(communication.content)
+    )
+
+
+def _document_document(document):
+    return (
+        _join(document.name),
+        _join(document.filename, document.document_type, document.description)
+    )
+
+
+def _indexed_models():
+    """Map indexed model classes to (entity_type, document builder)"""
+    from models.car import Car
+    from models.customer import Customer
+    from models.invoice import Invoice
+    from models.document import Document, Communication
+    return {
+        Car: ('car', _car_document),
+        Customer: ('customer', _customer_document),
+        Invoice: ('invoice', _invoice_document),
+        Communication: ('communication', _communication_document),
+        Document: ('document', _document_document),
+    }
+
+
+def _dialect(bind):
+    return bind.dialect.name
+
+
+def is_supported(bind=None):
+    """Check if the database backend supports the search index"""
+    bind = bind or db.engine
+    return _dialect(bind) in ('sqlite', 'postgresql')
+
+
+def create_schema(connection):
+    """Create the search index table for the connected backend if missing"""
+    dialect = _dialect(connection)
+    if dialect == 'sqlite':
+        connection.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE_NAME} USING fts5("
+            "entity_type UNINDEXED, entity_id UNINDEXED, title, body, "
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        ))
+    elif dialect == 'postgresql':
+        connection.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {TABLE_NAME} ("
+            "entity_type VARCHAR(20) NOT NULL, "
+            "entity_id INTEGER NOT NULL, "
+            "title TEXT, "
+            "body TEXT, "
+            "document TSVECTOR, "
+            "PRIMARY KEY (entity_type, entity_id))"
+        ))
+        connection.execute(text(
+            f"CREATE INDEX IF NOT EXISTS ix_{TABLE_NAME}_document "
+            f"ON {TABLE_NAME} USING GIN (document)"
+        ))
+
+
+def _delete_rows(connection, entity_type, entity_ids):
+    if not entity_ids:
+        return
+    connection.execute(
+        text(f"DELETE FROM {TABLE_NAME} WHERE entity_type = :entity_type AND entity_id = :entity_id"),
+        [{'entity_type': entity_type, 'entity_id': entity_id} for entity_id in entity_ids]
+    )
+
+
+def _upsert_rows(connection, rows):
+    """Write (entity_type, entity_id, title, body) rows to the index"""
+    if not rows:
+        return
+    params = [{'entity_type': t, 'entity_id': i, 'title': title, 'body': body}
+              for t, i, title, body in rows]
+    if _dialect(connection) == 'sqlite':
+        connection.execute(
+            text(f"DELETE FROM {TABLE_NAME} WHERE entity_type = :entity_type AND entity_id = :entity_id"),
+            [{'entity_type': p['entity_type'], 'entity_id': p['entity_id']} for p in params]
+        )
+        connection.execute(
+            text(f"INSERT INTO {TABLE_NAME} (entity_type, entity_id, title, body) "
+                 "VALUES (:entity_type, :entity_id, :title, :body)"),
+            params
+        )
+    else:
+        connection.execute(
+            text(f"INSERT INTO {TABLE_NAME} (entity_type, entity_id, title, body, document) "
+                 "VALUES (:entity_type, :entity_id, :title, :body, "
+                 "setweight(to_tsvector('simple', coalesce(:title, '')), 'A') || "
+                 "setweight(to_tsvector('simple', coalesce(:body, '')), 'B')) "
+                 "ON CONFLICT (entity_type, entity_id) DO UPDATE SET "
+                 "title = EXCLUDED.title, body = EXCLUDED.body, document = EXCLUDED.document"),
+            params
+        )
+
+
+def _after_flush(session, flush_context):
+    """Mirror flushed changes of indexed models into the search index"""
+    bind = session.get_bind()
+    if not is_supported(bind):
+        return
+
+    models = _indexed_models()
+    upserts = []
+    deletes = {}
+    for obj in list(session.new) + list(session.dirty):
+        spec = models.get(type(obj))
+        if spec and obj.id is not None:
+            entity_type, build = spec
+            title, body = build(obj)
+            upserts.append((entity_type, obj.id, title, body))
+    for obj in session.deleted:
+        spec = models.get(type(obj))
+        if spec and obj.id is not None:
+            deletes.setdefault(spec[0], []).append(obj.id)
+
+    if not upserts and not deletes:
+        return
+
+    def write(connection):
+        _upsert_rows(connection, upserts)
+        for entity_type, entity_ids in deletes.items():
+            _delete_rows(connection, entity_type, entity_ids)
+
+    in_savepoint(session, 'Search index update', write)
+
+
+def rebuild_index(batch_size=500):
+    """
+    Rebuild the whole search index from the database
+
+    Args:
+        batch_size: Number of rows loaded per model and batch
+
+    Returns:
+        Number of indexed rows
+    """
+    total = 0
+    with db.engine.begin() as connection:
+        create_schema(connection)
+        connection.execute(text(f"DELETE FROM {TABLE_NAME}"))
+        for model, (entity_type, build) in _indexed_models().items():
+            last_id = 0
+            while True:
+                batch = model.query.filter(model.id > last_id).order_by(model.id).limit(batch_size).all()
+                if not batch:
+                    break
+                _upsert_rows(connection, [(entity_type, obj.id) + build(obj) for obj in batch])
+                total += len(batch)
+                last_id = batch[-1].id
+    logger.info(f"Search index rebuilt with {total} rows")
+    return total
+
+
+def _query_tokens(query):
+    return TOKEN_PATTERN.findall(query or '')[:10]
+
+
+def _match_clause(dialect, tokens):
+    """Build the backend match expression and its bind parameters (prefix matching)"""
+    if dialect == 'sqlite':
+        fts_query = ' '.join('"{}"*'.format(t.replace('"', '')) for t in tokens)
+        return f"{TABLE_NAME} MATCH :q", {'q': fts_query}
+    ts_query = ' & '.join(f'{t}:*' for t in tokens)
+    return "document @@ to_tsquery('simple', :q)", {'q': ts_query}
+
+
+def matching_ids(entity_type, query):
+    """
+    Select statement of entity ids matching a query, for use in ``Model.id.in_()``
+
+    Returns None when the query is empty or the backend has no search index,
+    so callers can fall back to their own filtering.
+    """
+    tokens = _query_tokens(query)
+    if not tokens or not is_supported():
+        return None
+    where, params = _match_clause(_dialect(db.engine), tokens)
+    params['entity_type'] = entity_type
+    # Unique bind names, so several of these can be used in one statement
+    return text(
+        f"SELECT entity_id FROM {TABLE_NAME} WHERE {where} AND entity_type = :entity_type"
+    ).bindparams(*[bindparam(name, value, unique=True) for name, value in params.items()]).columns(
+        entity_id=db.Integer)
+
+
+def _highlight(value):
+    """HTML-escape an indexed snippet and turn the match markers into <mark> tags"""
+    if not value:
+        return Markup('')
+    escaped = str(escape(value))
+    return Markup(escaped.replace(_HL_START, '<mark>').replace(_HL_END, '</mark>'))
+
+
+def search(query, entity_types=None, limit=25):
+    """
+    Ranked full-text search across all indexed entities
+
+    Args:
+        query: Free-text search string (each word is prefix-matched)
+        entity_types: Optional list of entity types to restrict the search to
+        limit: Maximum number of hits
+
+    Returns:
+        List of dicts with entity_type, entity_id, title, snippet (highlighted Markup) and rank
+    """
+    tokens = _query_tokens(query)
+    if not tokens or not is_supported():
+        return []
+
+    dialect = _dialect(db.engine)
+    where, params = _match_clause(dialect, tokens)
+    params['limit'] = limit
+
+    type_filter = ''
+    if entity_types:
+        names = [f'type_{i}' for i in range(len(entity_types))]
+        type_filter = ' AND entity_type IN ({})'.format(', '.join(f':{n}' for n in names))
+        params.update(dict(zip(names, entity_types)))
+
+    if dialect == 'sqlite':
+        sql = (
+            f"SELECT entity_type, entity_id, "
+            f"highlight({TABLE_NAME}, 2, :hl_start, :hl_end) AS title, "
+            f"snippet({TABLE_NAME}, 3, :hl_start, :hl_end, '…', 12) AS snippet, "
+            f"bm25({TABLE_NAME}, 0.0, 0.0, 10.0, 1.0) AS rank "
+            f"FROM {TABLE_NAME} WHERE {where}{type_filter} "
+            f"ORDER BY rank LIMIT :limit"
+        )
+        params.update(hl_start=_HL_START, hl_end=_HL_END)
+    else:
+        sql = (
+            f"SELECT entity_type, entity_id, "
+            f"ts_headline('simple', coalesce(title, ''), to_tsquery('simple', :q), :hl_options) AS title, "
+            f"ts_headline('simple', coalesce(body, ''), to_tsquery('simple', :q), :hl_options) AS snippet, "
+            f"ts_rank(document, to_tsquery('simple', :q)) AS rank "
+            f"FROM {TABLE_NAME} WHERE {where}{type_filter} "
+            f"ORDER BY rank DESC LIMIT :limit"
+        )
+        params['hl_options'] = f'StartSel={_HL_START}, StopSel={_HL_END}, MaxWords=20, MinWords=5'
+
+    try:
+        rows = db.session.execute(text(sql), params).all()
+    except Exception as e:
+        logger.warning(f"Search query failed: {str(e)}")
+        return []
+
+    return [{
+        'entity_type': row.entity_type,
+        'entity_id': int(row.entity_id),
+        'title': _highlight(row.title),
+        'snippet': _highlight(row.snippet),
+        'rank': row.rank
+    } for row in rows]
+
+
+def init_search(app):
+    """Create the index schema and register the session hook that keeps it current"""
+    with app.app_context():
+        if not is_supported():
+            logger.warning("Search index not supported on this database backend")
+            return
+        try:
+            with db.engine.begin() as connection:
+                create_schema(connection)
+        except Exception as e:
+            logger.error(f"Search index setup failed: {str(e)}")
+            return
+
+    if not event.contains(Session, 'after_flush', _after_flush):
+        event.listen(Session, 'after_flush', _after_flush)
+
+    @app.cli.command('search-reindex')
+    def search_reindex():
+        """Rebuild the full-text search index"""
+        print(f"Indexed {rebuild_index()} rows")